@@ -1,6 +1,8 @@
 """Base Adapter."""
 
 from abc import ABC, abstractmethod
+from collections.abc import Callable
+from functools import partial
 from pathlib import Path
 from typing import Any, Generic, Optional, TypeVar
 
@@ -22,24 +24,62 @@ class BaseAdapter(Generic[InterfaceT], ABC):
     def __init__(self, _impl: Optional[InterfaceT]) -> None:
         """Init the adapter from the specified implementation."""
         self._impl: Optional[InterfaceT] = _impl
+        self._loader: Optional[Callable[[], Optional[InterfaceT]]] = None
 
     @classmethod
     @abstractmethod
     def from_file(cls, filepath: Optional[Path]) -> "BaseAdapter":
         """Load and return a new object from file."""
 
+    @classmethod
+    def lazy(cls: type[BaseAdapterT], loader: Callable[[], Optional[InterfaceT]]) -> BaseAdapterT:
+        """Return a new object, calling loader to get the implementation only when needed.
+
+        The loader must be picklable, so that the object can be sent to the subprocesses
+        without loading the implementation.
+        """
+        obj = cls(None)
+        obj._loader = loader  # pylint: disable=protected-access
+        return obj
+
+    @classmethod
+    def from_file_lazy(cls: type[BaseAdapterT], filepath: Optional[Path]) -> BaseAdapterT:
+        """Return a new object to be loaded from file only when needed."""
+        return cls.lazy(partial(_impl_from_file, cls, filepath))
+
     @property
     def _ensure_impl(self) -> InterfaceT:
         """Return the inner implementation, or raise an error if it doesn't exist."""
-        if self._impl is None:
+        impl = self._get_impl()
+        if impl is None:
             raise AdapterError("The implementation doesn't exist")
+        return impl
+
+    def _get_impl(self) -> Optional[InterfaceT]:
+        """Return the inner implementation, loading it if needed."""
+        loader = self._loader
+        if loader is not None:
+            # in case of concurrent calls, the implementation may be loaded more than once
+            self._impl = loader()
+            self._loader = None
         return self._impl
 
+    @property
+    def loaded(self) -> bool:
+        """Return True if the implementation has been loaded, or it wasn't lazy."""
+        return self._loader is None
+
     def exists(self) -> bool:
         """Return True if the wrapped object exists, False otherwise."""
-        return self._impl is not None
+        return self._get_impl() is not None
 
     @property
     def instance(self) -> Any:
         """Return the wrapped instance, or None if it doesn't exist."""
-        return self._impl.instance if self._impl is not None else None
+        impl = self._get_impl()
+        return impl.instance if impl is not None else None
+
+
+def _impl_from_file(adapter_class: type[BaseAdapter], filepath: Optional[Path]) -> Any:
+    """Load and return the implementation of the given adapter class."""
+    return adapter_class.from_file(filepath)._get_impl()  # pylint: disable=protected-access
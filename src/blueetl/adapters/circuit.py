@@ -1,17 +1,34 @@
 """Adapters for Circuit."""
 
-from collections.abc import Mapping
+import logging
+import threading
+from collections.abc import Callable, Iterator, Mapping
+from contextlib import contextmanager
 from pathlib import Path
-from typing import Optional
+from typing import Any, Optional
+
+import numpy as np
+import pandas as pd
 
 from blueetl.adapters.base import BaseAdapter
 from blueetl.adapters.interfaces.circuit import CircuitInterface, NodePopulationInterface
 from blueetl.adapters.node_sets import NodeSetsAdapter
+from blueetl.utils import timed
+
+L = logging.getLogger(__name__)
+
+# key of the cached nodes: (population, node_set, node_sets_file)
+NodesKey = tuple[Optional[str], Optional[str], Optional[Path]]
 
 
 class CircuitAdapter(BaseAdapter[CircuitInterface]):
     """Circuit Adapter."""
 
+    def __init__(self, _impl: Optional[CircuitInterface]) -> None:
+        """Init the adapter from the specified implementation."""
+        super().__init__(_impl)
+        self._checksum: Optional[str] = None
+
     @classmethod
     def from_file(cls, filepath: Optional[Path]) -> "CircuitAdapter":
         """Load and return a new object from file."""
@@ -26,9 +43,52 @@ class CircuitAdapter(BaseAdapter[CircuitInterface]):
         impl = CircuitImpl(Circuit(str(filepath)))
         return cls(impl)
 
+    @classmethod
+    def lazy(
+        cls, loader: Callable[[], Optional[CircuitInterface]], checksum: Optional[str] = None
+    ) -> "CircuitAdapter":
+        """Return a new object, calling loader to get the implementation only when needed.
+
+        Args:
+            loader: picklable function returning the implementation.
+            checksum: checksum of the circuit, if already known.
+                It's returned by ``checksum`` without loading the implementation.
+        """
+        obj = super().lazy(loader)
+        if checksum is not None:
+            obj._checksum = checksum  # pylint: disable=protected-access
+        return obj
+
+    @classmethod
+    def from_file_lazy(
+        cls, filepath: Optional[Path], checksum: Optional[str] = None
+    ) -> "CircuitAdapter":
+        """Return a new object to be loaded from file only when needed.
+
+        Args:
+            filepath: path to the circuit config.
+            checksum: checksum of the circuit, if already known.
+        """
+        obj = super().from_file_lazy(filepath)
+        if checksum is not None:
+            obj._checksum = checksum  # pylint: disable=protected-access
+        return obj
+
+    def __getstate__(self) -> dict:
+        """Get the object state when the object is pickled."""
+        # the checksum and the nodes are useful only in the process where they are cached
+        return {k: v for k, v in self.__dict__.items() if k not in _TRANSIENT_ATTRIBUTES}
+
+    def __setstate__(self, state: dict) -> None:
+        """Set the object state when the object is unpickled."""
+        self.__dict__.update(state)
+        self._checksum = None
+
     def checksum(self) -> str:
         """Return a checksum of the relevant keys in the circuit configuration."""
-        return self._ensure_impl.checksum()
+        if self._checksum is None:
+            self._checksum = self._ensure_impl.checksum()
+        return self._checksum
 
     @property
     def nodes(self) -> Mapping[Optional[str], NodePopulationInterface]:
@@ -44,3 +104,151 @@ class CircuitAdapter(BaseAdapter[CircuitInterface]):
     def node_sets(self) -> NodeSetsAdapter:
         """Returns the NodeSets file used by the circuit."""
         return NodeSetsAdapter(self._ensure_impl.node_sets)
+
+    def get_cells(
+        self,
+        population: Optional[str],
+        node_set: Optional[str],
+        node_sets_file: Optional[Path],
+        properties: list[str],
+    ) -> pd.DataFrame:
+        """Return the given properties of the cells in the population and node_set.
+
+        The cells are cached for each (population, node_set, node_sets_file), and they are loaded
+        again only when some of the requested properties haven't been loaded yet. In that case,
+        the properties already loaded are loaded again as well, to be available for later calls.
+
+        If node_set is None or empty string, all the cells of the population are returned.
+        In case of concurrent calls, the same cells may be loaded more than once.
+        """
+        cache: dict[NodesKey, pd.DataFrame] = self.__dict__.setdefault("_cells_cache", {})
+        key = (population, node_set or None, node_sets_file)
+        cells = cache.get(key)
+        if cells is None or not set(properties).issubset(cells.columns):
+            all_properties = sorted(set(properties).union([] if cells is None else cells.columns))
+            msg = f"Loading nodes using {population=}, {node_set=}, {node_sets_file=}"
+            with timed(L.info, msg):
+                group = self._resolve_node_set(node_set, node_sets_file)
+                cells = self.nodes[population].get(group=group, properties=all_properties)
+            cache[key] = cells
+        return cells[properties]
+
+    def get_node_ids(
+        self,
+        population: Optional[str],
+        node_set: Optional[str],
+        node_sets_file: Optional[Path],
+    ) -> np.ndarray:
+        """Return the node ids in the population and node_set.
+
+        The node ids are cached for each (population, node_set, node_sets_file),
+        so the returned array must not be modified.
+
+        If node_set is None or empty string, all the node ids of the population are returned.
+        """
+        cache: dict[NodesKey, np.ndarray] = self.__dict__.setdefault("_node_ids_cache", {})
+        key = (population, node_set or None, node_sets_file)
+        node_ids = cache.get(key)
+        if node_ids is None:
+            msg = f"Loading node ids using {population=}, {node_set=}, {node_sets_file=}"
+            with timed(L.info, msg):
+                group = self._resolve_node_set(node_set, node_sets_file)
+                node_ids = cache[key] = np.asarray(self.nodes[population].ids(group=group))
+        return node_ids
+
+    def clear_nodes_cache(self) -> None:
+        """Remove the cached cells and node ids from memory."""
+        self.__dict__.pop("_cells_cache", None)
+        self.__dict__.pop("_node_ids_cache", None)
+
+    def _resolve_node_set(self, node_set: Optional[str], node_sets_file: Optional[Path]) -> Any:
+        """Return the group to be selected, resolving the node_set in the given file if needed."""
+        if node_set and node_sets_file:
+            node_sets = NodeSetsAdapter.from_file(self.node_sets_file)
+            node_sets |= NodeSetsAdapter.from_file(node_sets_file)
+            return node_sets.instance[node_set]
+        return node_set or None
+
+
+# attributes not pickled, because they are useful only in the current process
+_TRANSIENT_ATTRIBUTES = frozenset(["_checksum", "_cells_cache", "_node_ids_cache"])
+
+
+class CircuitRegistry:
+    """Registry of the circuits shared by all the simulations and analyses while it's active.
+
+    The circuits are identified by the path to the circuit config and by its fingerprint,
+    so the same circuit is loaded, hashed, and queried only once, while a circuit config
+    modified on disk is considered a different circuit.
+
+    Without an active registry, a new circuit is created each time it's requested.
+    """
+
+    _active: Optional["CircuitRegistry"] = None
+
+    def __init__(self) -> None:
+        """Initialize the object."""
+        self._lock = threading.Lock()
+        self._circuits: dict[tuple[str, tuple[int, int]], CircuitAdapter] = {}
+
+    @classmethod
+    def active(cls) -> Optional["CircuitRegistry"]:
+        """Return the active registry, or None if no registry is active."""
+        return cls._active
+
+    @contextmanager
+    def activate(self) -> Iterator["CircuitRegistry"]:
+        """Activate the registry in the context, restoring the previous active registry on exit."""
+        previous = CircuitRegistry._active
+        CircuitRegistry._active = self
+        try:
+            yield self
+        finally:
+            CircuitRegistry._active = previous
+
+    @classmethod
+    def get(cls, path: Path, factory: Callable[[], CircuitAdapter]) -> CircuitAdapter:
+        """Return the circuit registered for the given config, or register a new one.
+
+        Args:
+            path: path to the circuit config.
+            factory: function called to create the circuit, if it's not registered yet.
+                The circuit isn't registered if the config cannot be accessed,
+                or if no registry is active.
+        """
+        registry = cls._active
+        if registry is None:
+            return factory()
+        return registry.get_or_register(path, factory)
+
+    def get_or_register(self, path: Path, factory: Callable[[], CircuitAdapter]) -> CircuitAdapter:
+        """Return the circuit registered for the given config, or register a new one.
+
+        The circuit isn't registered if the config cannot be accessed.
+        """
+        try:
+            stat = path.stat()
+        except OSError:
+            return factory()
+        key = (str(path.resolve()), (stat.st_mtime_ns, stat.st_size))
+        with self._lock:
+            circuit = self._circuits.get(key)
+        if circuit is None:
+            # the factory is called without holding the lock, since it may be slow
+            circuit = factory()
+            with self._lock:
+                circuit = self._circuits.setdefault(key, circuit)
+        return circuit
+
+    def clear_nodes_cache(self) -> None:
+        """Remove the cached nodes of the registered circuits from memory."""
+        with self._lock:
+            circuits = list(self._circuits.values())
+        for circuit in circuits:
+            circuit.clear_nodes_cache()
+
+    def clear(self) -> None:
+        """Remove all the circuits from the registry, and their cached nodes from memory."""
+        self.clear_nodes_cache()
+        with self._lock:
+            self._circuits = {}
@@ -3,6 +3,7 @@
 from collections import UserDict
 from collections.abc import Mapping
 from functools import cached_property
+from pathlib import Path
 from typing import Optional, Union
 
 import pandas as pd
@@ -74,12 +75,16 @@ class SimulationImpl(SimulationInterface[Simulation]):
 
     def is_complete(self) -> bool:
         """Return True if the simulation is complete, False otherwise."""
+        # check the existence of spikes without loading them, because it can be slow
+        return self.spikes_file is not None
+
+    @property
+    def spikes_file(self) -> Optional[Path]:
+        """Return the path to the spikes file, or None if it doesn't exist."""
         try:
-            # check the existence of spikes without loading them, because it can be slow
-            PathHelpers.spike_report_path(self._simulation.config)
-            return True
+            return Path(PathHelpers.spike_report_path(self._simulation.config))
         except BluePyError:
-            return False
+            return None
 
     @cached_property
     def circuit(self) -> CircuitInterface:
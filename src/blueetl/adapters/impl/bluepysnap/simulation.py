@@ -1,11 +1,16 @@
 """Bluepysnap simulation implementation."""
 
+from collections import UserDict
 from collections.abc import Mapping
 from functools import cached_property
 from pathlib import Path
 from typing import Optional
 
+import numpy as np
+import pandas as pd
 from bluepysnap import Simulation
+from bluepysnap.exceptions import BluepySnapError
+from bluepysnap.frame_report import PopulationFrameReport
 
 from blueetl.adapters.impl.bluepysnap.circuit import CircuitImpl
 from blueetl.adapters.interfaces.circuit import CircuitInterface
@@ -15,6 +20,112 @@ from blueetl.adapters.interfaces.simulation import (
     SimulationInterface,
 )
 
+# tolerance used by libsonata when selecting the frames in the interval [t_start, t_stop]
+TIME_EPSILON = 1e-6
+
+
+class PopulationReportImpl(PopulationReportInterface):
+    """Bluepysnap report implementation."""
+
+    def __init__(self, report: PopulationFrameReport) -> None:
+        """Init the population report with the given report."""
+        self._report = report
+
+    def get(self, group=None, t_start=None, t_stop=None, t_step=None) -> pd.DataFrame:
+        """Return the report for the specified group and interval."""
+        return self._report.get(group=group, t_start=t_start, t_stop=t_stop, t_step=t_step)
+
+    def get_windows(
+        self, group, windows: list[tuple[float, float, Optional[float]]]
+    ) -> list[pd.DataFrame]:
+        """Return the report for the specified group and for each interval.
+
+        The overlapping intervals are merged, and each merged interval is read only once.
+        Then the frames of each interval are sliced from the data in memory, selecting the
+        same frames that would be returned by ``get``.
+
+        Args:
+            group: group of ids to be selected.
+            windows: list of tuples (t_start, t_stop, t_step).
+
+        Returns:
+            list of DataFrames, one for each interval.
+        """
+        dt = self._report.frame_report.dt
+        result: dict[int, pd.DataFrame] = {}
+        for positions, t_start, t_stop in _merge_windows(windows, gap=dt):
+            try:
+                df = self.get(group=group, t_start=t_start, t_stop=t_stop)
+            except BluepySnapError:
+                # read each interval separately, to raise the same error when needed
+                df = None
+            for pos in positions:
+                win_start, win_stop, win_step = windows[pos]
+                frames = None if df is None else _slice_frames(df, windows[pos], dt=dt)
+                if frames is None:
+                    frames = self.get(group, t_start=win_start, t_stop=win_stop, t_step=win_step)
+                result[pos] = frames
+        return [result[pos] for pos in range(len(windows))]
+
+
+def _slice_frames(
+    df: pd.DataFrame, window: tuple[float, float, Optional[float]], dt: float
+) -> Optional[pd.DataFrame]:
+    """Return the frames of the window selected from df, or None if they cannot be selected.
+
+    The selected frames are the same that would be returned by reading only the given window.
+    """
+    win_start, win_stop, win_step = window
+    stride = round(win_step / dt) if win_step is not None else 1
+    if stride < 1:
+        return None
+    # the times are sorted, so the selected frames are contiguous
+    times = df.index.to_numpy()
+    first = np.searchsorted(times, win_start - TIME_EPSILON, side="left")
+    last = np.searchsorted(times, win_stop + TIME_EPSILON, side="right")
+    if first >= last:
+        return None
+    return df.iloc[first:last:stride]
+
+
+def _merge_windows(
+    windows: list[tuple[float, float, Optional[float]]], gap: float
+) -> list[tuple[list[int], float, float]]:
+    """Merge the overlapping intervals, and the intervals separated by less than gap.
+
+    Returns:
+        list of tuples (positions, t_start, t_stop), where positions are the indices of the
+        original intervals included in the merged interval [t_start, t_stop].
+    """
+    merged: list[tuple[list[int], float, float]] = []
+    for pos in sorted(range(len(windows)), key=lambda i: windows[i][0]):
+        t_start, t_stop, _ = windows[pos]
+        if merged and t_start <= merged[-1][2] + gap:
+            positions, merged_start, merged_stop = merged[-1]
+            merged[-1] = ([*positions, pos], merged_start, max(merged_stop, t_stop))
+        else:
+            merged.append(([pos], t_start, t_stop))
+    return merged
+
+
+class ReportCollection(UserDict):
+    """Collection of reports as: name -> population -> report."""
+
+    def __init__(self, simulation: Simulation) -> None:
+        """Init the report collection with the specified simulation."""
+        super().__init__()
+        self._simulation = simulation
+
+    def __getitem__(self, name) -> Mapping[Optional[str], PopulationReportInterface]:
+        """Return the report for the specified name, wrapped in a dict as: population -> report."""
+        if name not in self.data:
+            report = self._simulation.reports[name]
+            self.data[name] = {
+                population: PopulationReportImpl(report[population])
+                for population in report.population_names
+            }
+        return self.data[name]
+
 
 class SimulationImpl(SimulationInterface[Simulation]):
     """Bluepysnap simulation implementation."""
@@ -24,8 +135,19 @@ class SimulationImpl(SimulationInterface[Simulation]):
 
         Used to ignore a simulation before the simulation campaign is complete.
         """
+        return self.spikes_file.exists()
+
+    @property
+    def spikes_file(self) -> Path:
+        """Return the path to the spikes file, that may not exist yet."""
         config = self._simulation.spikes.config
-        return Path(config.output_dir, config.spikes_file).exists()
+        return Path(config.output_dir, config.spikes_file)
+
+    @property
+    def circuit_config_path(self) -> Optional[Path]:
+        """Return the path to the config of the circuit, or None if it cannot be determined."""
+        path = self._simulation.to_libsonata.network
+        return Path(path) if path else None
 
     @cached_property
     def circuit(self) -> CircuitInterface:
@@ -37,7 +159,7 @@ class SimulationImpl(SimulationInterface[Simulation]):
         """Return the spikes report as a dict: population -> report."""
         return self._simulation.spikes
 
-    @property
+    @cached_property
     def reports(self) -> Mapping[str, Mapping[Optional[str], PopulationReportInterface]]:
         """Return the reports as a dict: name -> population -> report."""
-        return self._simulation.reports
+        return ReportCollection(simulation=self._simulation)
@@ -2,6 +2,7 @@
 
 from abc import ABC, abstractmethod
 from collections.abc import Mapping
+from pathlib import Path
 from typing import Generic, Optional, TypeVar
 
 import pandas as pd
@@ -27,6 +28,26 @@ class PopulationReportInterface(ABC):
     def get(self, group=None, t_start=None, t_stop=None, t_step=None) -> pd.DataFrame:
         """Return the report for the specified group and interval."""
 
+    def get_windows(
+        self, group, windows: list[tuple[float, float, Optional[float]]]
+    ) -> list[pd.DataFrame]:
+        """Return the report for the specified group and for each interval.
+
+        The result must be the same as calling ``get`` for each interval, but the
+        implementations may read the data more efficiently.
+
+        Args:
+            group: group of ids to be selected.
+            windows: list of tuples (t_start, t_stop, t_step).
+
+        Returns:
+            list of DataFrames, one for each interval.
+        """
+        return [
+            self.get(group=group, t_start=t_start, t_stop=t_stop, t_step=t_step)
+            for t_start, t_stop, t_step in windows
+        ]
+
 
 class SimulationInterface(Generic[SimulationT], CachedPropertyMixIn, ABC):
     """Simulation Interface."""
@@ -44,6 +65,16 @@ class SimulationInterface(Generic[SimulationT], CachedPropertyMixIn, ABC):
     def is_complete(self) -> bool:
         """Return True if the simulation is complete, False otherwise."""
 
+    @property
+    @abstractmethod
+    def spikes_file(self) -> Optional[Path]:
+        """Return the path to the spikes file, or None if it cannot be determined."""
+
+    @property
+    def circuit_config_path(self) -> Optional[Path]:
+        """Return the path to the config of the circuit, or None if it cannot be determined."""
+        return None
+
     @property
     @abstractmethod
     def circuit(self) -> CircuitInterface:
@@ -1,11 +1,13 @@
 """Adapters for Simulation."""
 
 from collections.abc import Mapping
+from functools import partial
 from pathlib import Path
 from typing import Optional
 
 from blueetl.adapters.base import BaseAdapter
-from blueetl.adapters.circuit import CircuitAdapter
+from blueetl.adapters.circuit import CircuitAdapter, CircuitRegistry
+from blueetl.adapters.interfaces.circuit import CircuitInterface
 from blueetl.adapters.interfaces.simulation import (
     PopulationReportInterface,
     PopulationSpikesReportInterface,
@@ -34,10 +36,36 @@ class SimulationAdapter(BaseAdapter[SimulationInterface]):
         """Return True if the simulation is complete, False otherwise."""
         return self.exists() and self._ensure_impl.is_complete()
 
+    @property
+    def spikes_file(self) -> Optional[Path]:
+        """Return the path to the spikes file, or None if it cannot be determined."""
+        return self._ensure_impl.spikes_file
+
+    @property
+    def circuit_config_path(self) -> Optional[Path]:
+        """Return the path to the config of the circuit, or None if it cannot be determined."""
+        return self._ensure_impl.circuit_config_path
+
     @property
     def circuit(self) -> CircuitAdapter:
-        """Return the circuit used for the simulation."""
-        return CircuitAdapter(self._ensure_impl.circuit)
+        """Return the circuit used for the simulation.
+
+        If the path to the circuit config is known and a CircuitRegistry is active, the circuit
+        is shared with the other simulations using the same circuit config, in any analysis.
+        """
+        impl = self._ensure_impl
+        path = impl.circuit_config_path
+        if path is None:
+            return CircuitAdapter(impl.circuit)
+        return CircuitRegistry.get(path, lambda: CircuitAdapter(impl.circuit))
+
+    def lazy_circuit(self, checksum: Optional[str] = None) -> CircuitAdapter:
+        """Return the circuit used for the simulation, loading the simulation only when needed.
+
+        Args:
+            checksum: checksum of the circuit, if already known.
+        """
+        return CircuitAdapter.lazy(partial(_circuit_impl, self), checksum=checksum)
 
     @property
     def spikes(self) -> Mapping[Optional[str], PopulationSpikesReportInterface]:
@@ -48,3 +76,8 @@ class SimulationAdapter(BaseAdapter[SimulationInterface]):
     def reports(self) -> Mapping[str, Mapping[Optional[str], PopulationReportInterface]]:
         """Return the reports as a dict: name -> population -> report."""
         return self._ensure_impl.reports
+
+
+def _circuit_impl(simulation: SimulationAdapter) -> CircuitInterface:
+    """Return the implementation of the circuit used for the given simulation."""
+    return simulation._ensure_impl.circuit  # pylint: disable=protected-access
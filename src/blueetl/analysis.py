@@ -2,6 +2,9 @@
 
 import gc
 import logging
+from collections.abc import Callable, Iterator
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from contextlib import contextmanager
 from copy import deepcopy
 from pathlib import Path
 from typing import Any, NamedTuple, Optional
@@ -9,13 +12,17 @@ from typing import Any, NamedTuple, Optional
 import numpy as np
 import pandas as pd
 
+from blueetl.adapters.circuit import CircuitRegistry
 from blueetl.cache import CacheManager
 from blueetl.campaign.config import SimulationCampaign
 from blueetl.config.analysis import init_multi_analysis_configuration
 from blueetl.config.analysis_model import MultiAnalysisConfig, SingleAnalysisConfig
+from blueetl.constants import CIRCUIT, LEVEL_SEP
 from blueetl.features import FeaturesCollection
+from blueetl.parallel import WorkerPool
 from blueetl.repository import Repository
 from blueetl.resolver import AttrResolver, Resolver
+from blueetl.store.base import CHECKSUM_STAT
 from blueetl.types import StrOrPath
 from blueetl.utils import load_yaml, setup_logging
 
@@ -49,6 +56,10 @@ class Analyzer:
         simulations_config: SimulationCampaign,
         resolver: Resolver,
         clear_cache: bool = False,
+        lazy_features: bool = False,
+        features_memory_budget: Optional[int] = None,
+        checksum_mode: str = CHECKSUM_STAT,
+        simulation_probe_workers: int = 1,
     ) -> "Analyzer":
         """Initialize the Analyzer from the given configuration.
 
@@ -57,11 +68,16 @@ class Analyzer:
             simulations_config: simulation campaign configuration.
             resolver: resolver instance.
             clear_cache: if True, remove any existing cache.
+            lazy_features: if True, load the cached features only when accessed.
+            features_memory_budget: maximum number of bytes used by the lazy features in memory.
+            checksum_mode: mode used to calculate the checksums of the cached files.
+            simulation_probe_workers: number of threads used to load and check the simulations.
         """
         cache_manager = CacheManager(
             analysis_config=analysis_config,
             simulations_config=simulations_config,
             clear_cache=clear_cache,
+            checksum_mode=checksum_mode,
         )
         repo = Repository(
             simulations_config=simulations_config,
@@ -69,11 +85,14 @@ class Analyzer:
             cache_manager=cache_manager,
             simulations_filter=analysis_config.simulations_filter,
             resolver=resolver,
+            simulation_probe_workers=simulation_probe_workers,
         )
         features = FeaturesCollection(
             features_configs=analysis_config.features,
             repo=repo,
             cache_manager=cache_manager,
+            lazy=lazy_features,
+            memory_budget=features_memory_budget,
         )
         return cls(
             analysis_config=analysis_config,
@@ -93,7 +112,8 @@ class Analyzer:
         """Invalidate and unlock the cache.
 
         After calling this method, the DataFrames already extracted can still be accessed,
-        but it's not possible to extract new data or calculate new features.
+        but it's not possible to extract new data or calculate new features,
+        or to load the lazy features not loaded yet.
         """
         self.repo.cache_manager.close()
         self.features.cache_manager.close()
@@ -119,8 +139,15 @@ class Analyzer:
         return self._features
 
     def extract_repo(self) -> None:
-        """Extract all the repositories dataframes."""
+        """Extract all the repositories dataframes.
+
+        The nodes cached in the circuits are needed only for the extraction, so they are removed
+        from memory at the end, unless the circuits are shared with other analyses.
+        """
         self.repo.extract()
+        if CircuitRegistry.active() is None:
+            for circuit in self.repo.simulations.df[CIRCUIT]:
+                circuit.clear_nodes_cache()
 
     def calculate_features(self) -> None:
         """Calculate all the features defined in the configuration."""
@@ -170,6 +197,39 @@ class Analyzer:
         return key, df
 
 
+def _run_with_dependencies(
+    funcs: dict[str, Callable[[], None]], dependencies: dict[str, set[str]]
+) -> None:
+    """Call the functions in concurrent threads, each one after its dependencies are completed.
+
+    Args:
+        funcs: dict of functions to be called, by name.
+        dependencies: dict of names of the functions that must be completed before each function.
+            Any name not present in funcs is ignored.
+
+    Raises:
+        RuntimeError: if the dependencies are circular.
+    """
+    pending = dict(funcs)
+    completed: set[str] = set()
+    running: dict[Future, str] = {}
+    with ThreadPoolExecutor(max_workers=max(len(funcs), 1)) as executor:
+        while pending or running:
+            for name in list(pending):
+                if (dependencies.get(name, set()) & set(funcs)) - {name} <= completed:
+                    L.info("Starting analysis %s", name)
+                    running[executor.submit(pending.pop(name))] = name
+            if not running:
+                raise RuntimeError(f"Circular dependencies between analyses: {sorted(pending)}")
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                name = running.pop(future)
+                # raise any exception, the executor waits for the running functions on exit
+                future.result()
+                L.info("Completed analysis %s", name)
+                completed.add(name)
+
+
 class MultiAnalyzer:
     """MultiAnalyzer class."""
 
@@ -187,6 +247,8 @@ class MultiAnalyzer:
         assert isinstance(global_config, MultiAnalysisConfig)
         self._global_config = global_config
         self._analyzers = self._init_analyzers() if analyzers is None else analyzers
+        self._pool = self._init_pool() if global_config.persistent_workers else None
+        self._circuit_registry = CircuitRegistry()
 
     @classmethod
     def from_config(
@@ -218,10 +280,23 @@ class MultiAnalyzer:
                 simulations_config=simulations_config,
                 resolver=resolver,
                 clear_cache=self.global_config.clear_cache,
+                lazy_features=self.global_config.lazy_features,
+                features_memory_budget=self.global_config.features_memory_budget,
+                checksum_mode=self.global_config.checksum_mode,
+                simulation_probe_workers=self.global_config.simulation_probe_workers,
             )
             for name, analysis_config in self.global_config.analysis.items()
         }
 
+    def _init_pool(self) -> WorkerPool:
+        """Return a new pool of subprocesses, importing the modules of the features functions."""
+        modules = [
+            features_config.function.rpartition(".")[0]
+            for analysis_config in self.global_config.analysis.values()
+            for features_config in analysis_config.features
+        ]
+        return WorkerPool(modules=modules)
+
     @classmethod
     def from_file(cls, path: StrOrPath, clear_cache: Optional[bool] = None) -> "MultiAnalyzer":
         """Return a new instance loaded using the given configuration file."""
@@ -248,11 +323,12 @@ class MultiAnalyzer:
 
     def __getstate__(self) -> dict:
         """Get the object state when the object is pickled."""
-        return {"_global_config": self.global_config, "_analyzers": None}
+        return {"_global_config": self.global_config, "_analyzers": None, "_pool": None}
 
     def __setstate__(self, state: dict) -> None:
         """Set the object state when the object is unpickled."""
         self.__dict__.update(state)
+        self._circuit_registry = CircuitRegistry()
 
     def __getattr__(self, name: str) -> Analyzer:
         """Return an analyzer instance by name.
@@ -280,23 +356,78 @@ class MultiAnalyzer:
         self.close()
 
     def close(self) -> None:
-        """Invalidate and unlock the cache.
+        """Invalidate and unlock the cache, and shut down the subprocesses.
 
         After calling this method, the DataFrames already extracted can still be accessed,
         but it's not possible to extract new data or calculate new features.
         """
         for a in self.analyzers.values():
             a.close()
+        if self._pool is not None:
+            self._pool.close()
+        # release the circuits and the nodes shared by the analyses
+        self._circuit_registry.clear()
+
+    def _dependencies(self) -> dict[str, set[str]]:
+        """Return the names of the analyses referenced by the windows of each analysis."""
+        # example of reference: spikes.extraction.windows.w1#checksum
+        return {
+            name: {
+                win.partition(LEVEL_SEP)[0]
+                for win in analysis_config.extraction.windows.values()
+                if isinstance(win, str)
+            }
+            for name, analysis_config in self.global_config.analysis.items()
+        }
+
+    def _run_analyzers(self, method: str) -> None:
+        """Call the given method of all the analyzers, concurrently if enabled."""
+        funcs = {name: getattr(a, method) for name, a in self.analyzers.items()}
+        if not self.global_config.concurrent_analyses:
+            for func in funcs.values():
+                func()
+            return
+        # the analyzers referenced by other analyzers must be completed first, because the
+        # referenced dataframes would be extracted otherwise in more than one thread
+        _run_with_dependencies(funcs, dependencies=self._dependencies())
+
+    @contextmanager
+    def _workers(self) -> Iterator[None]:
+        """Return a context where the subprocesses are reused, if needed.
+
+        If persistent workers are enabled, the subprocesses are reused until the object is closed.
+        Otherwise, if the analyses are executed concurrently, the subprocesses are shared by all
+        the analyses and shut down only on exit, because shutting them down at the end of each
+        parallel call would terminate the tasks of the other analyses still running.
+        """
+        if self._pool is not None and not self._pool.closed:
+            with self._pool.activate():
+                yield
+        elif self.global_config.concurrent_analyses:
+            pool = self._init_pool()
+            try:
+                with pool.activate():
+                    yield
+            finally:
+                pool.close()
+        else:
+            yield
 
     def extract_repo(self) -> None:
-        """Extract all the repositories dataframes for all the analysis."""
-        for a in self.analyzers.values():
-            a.extract_repo()
+        """Extract all the repositories dataframes for all the analysis.
+
+        The circuits are shared by all the analyses, and their cached nodes are removed from
+        memory when all the analyses have been extracted.
+        """
+        with self._workers(), self._circuit_registry.activate():
+            self._run_analyzers("extract_repo")
+        self._circuit_registry.clear_nodes_cache()
 
     def calculate_features(self) -> None:
         """Calculate all the features defined in the configuration for all the analysis."""
-        for a in self.analyzers.values():
-            a.calculate_features()
+        with self._workers(), self._circuit_registry.activate():
+            self._run_analyzers("calculate_features")
+        self._circuit_registry.clear_nodes_cache()
 
     def apply_filter(self, simulations_filter: Optional[dict[str, Any]] = None) -> "MultiAnalyzer":
         """Return a new object where the in memory filter is applied to repo and features.
@@ -8,16 +8,17 @@ from copy import deepcopy
 from dataclasses import dataclass
 from functools import wraps
 from pathlib import Path
-from typing import Generic, Optional, TypeVar
+from typing import Any, Generic, Optional, TypeVar
 
 import pandas as pd
 from blueetl_core.utils import is_subfilter
 
 from blueetl.campaign.config import SimulationCampaign
 from blueetl.config.analysis_model import FeaturesConfig, SingleAnalysisConfig
-from blueetl.store.base import BaseStore
+from blueetl.constants import SIMULATION_ID
+from blueetl.store.base import CHECKSUM_STAT, BaseStore, concat_partitions
 from blueetl.store.parquet import ParquetStore
-from blueetl.utils import dump_yaml, load_yaml
+from blueetl.utils import checksum_json, dump_yaml, load_yaml
 
 L = logging.getLogger(__name__)
 
@@ -96,7 +97,13 @@ class LockManager:
 
 
 class CacheManager:
-    """Cache Manager."""
+    """Cache Manager.
+
+    The repo dataframes in ``PARTITIONED_REPO`` are stored in one partition for each simulation,
+    so that the partitions can be reused even when the other simulations are extracted again.
+    """
+
+    PARTITIONED_REPO = frozenset({"report"})
 
     def __init__(
         self,
@@ -104,6 +111,8 @@ class CacheManager:
         simulations_config: SimulationCampaign,
         store_class: type[BaseStore] = ParquetStore,
         clear_cache: bool = False,
+        features_partition_cols: Optional[list[str]] = None,
+        checksum_mode: str = CHECKSUM_STAT,
     ) -> None:
         """Initialize the object.
 
@@ -112,6 +121,11 @@ class CacheManager:
             simulations_config: simulations campaign configuration.
             store_class: class to be used to load and dump the cached dataframes.
             clear_cache: if True, remove any existing cache.
+            features_partition_cols: columns used to partition the cached features, when
+                supported by store_class. If None, the features are partitioned by simulation_id.
+                For example, [simulation_id, window] can be used to partition also by window.
+            checksum_mode: mode used by the stores to calculate the checksums of the cached files.
+                The files already cached are verified using the mode used to write them.
         """
         assert analysis_config.output is not None
         self._output_dir = Path(analysis_config.output)
@@ -127,13 +141,22 @@ class CacheManager:
         self._lock_manager.lock()
 
         self.readonly = False
-        self._version = 1
-        self._repo_store = store_class(repo_dir)
-        self._features_store = store_class(features_dir)
+        self._version = 3
+        self._repo_store = store_class(repo_dir, checksum_mode=checksum_mode)
+        if issubclass(store_class, ParquetStore):
+            self._features_store: BaseStore = store_class(
+                features_dir,
+                checksum_mode=checksum_mode,
+                partition_cols=features_partition_cols or [SIMULATION_ID],
+            )
+        else:
+            self._features_store = store_class(features_dir, checksum_mode=checksum_mode)
 
         self._cached_analysis_config_path = config_dir / "analysis_config.cached.yaml"
         self._cached_simulations_config_path = config_dir / "simulations_config.cached.yaml"
         self._cached_checksums_path = config_dir / "checksums.cached.yaml"
+        self._simulations_status_path = config_dir / "simulations_status.cached.json"
+        self._dynamic_offsets_path = config_dir / "dynamic_offsets.cached.json"
 
         self._analysis_configs = CoupledCache[SingleAnalysisConfig](
             cached=self._load_cached_analysis_config(),
@@ -156,6 +179,16 @@ class CacheManager:
         """Return True if the cache manager is locking the cache, False otherwise."""
         return self._lock_manager.locked
 
+    @property
+    def simulations_status_path(self) -> Path:
+        """Return the path to the file containing the cached status of the simulations."""
+        return self._simulations_status_path
+
+    @property
+    def dynamic_offsets_path(self) -> Path:
+        """Return the path to the file containing the cached dynamic offsets of the windows."""
+        return self._dynamic_offsets_path
+
     def close(self) -> None:
         """Close the cache manager and unlock the lock directory.
 
@@ -207,6 +240,7 @@ class CacheManager:
                     "windows": None,
                     "report": None,
                 },
+                "partitions": {},
                 "features": {},
             }
         return checksums
@@ -329,6 +363,51 @@ class CacheManager:
 
         return is_valid
 
+    @staticmethod
+    def _partition_name(name: str, simulation_id: int) -> str:
+        """Return the name of the partition of a repo dataframe, relative to the store."""
+        return f"{name}/{SIMULATION_ID}={simulation_id}/part"
+
+    def _repo_checksum(self, name: str) -> Optional[str]:
+        """Return the checksum of a repo dataframe, or None if it doesn't exist.
+
+        The checksum of a partitioned dataframe is calculated from the checksums of the partitions.
+        """
+        if name in self.PARTITIONED_REPO:
+            partitions = self._cached_checksums["partitions"].get(name)
+            return checksum_json(partitions) if partitions else None
+        return self._repo_store.checksum(name)
+
+    def _check_cached_partition_files(self) -> dict[str, set[int]]:
+        """Determine the cached partitions to be deleted b/c the checksum is different.
+
+        Returns:
+            dict of simulation ids to be deleted, by repository name.
+        """
+        to_be_deleted: dict[str, set[int]] = {}
+        for name, partitions in self._cached_checksums["partitions"].items():
+            for simulation_id, partition in partitions.items():
+                partition_name = self._partition_name(name, simulation_id)
+                if not self._repo_store.verify(partition_name, partition["checksum"]):
+                    to_be_deleted.setdefault(name, set()).add(simulation_id)
+        return to_be_deleted
+
+    def _delete_cached_partition_files(self, to_be_deleted: dict[str, set[int]]) -> None:
+        """Delete the given partitions.
+
+        Args:
+            to_be_deleted: dict of simulation ids to be deleted, by repository name.
+        """
+        for name, simulation_ids in to_be_deleted.items():
+            if not simulation_ids:
+                continue
+            L.info("Deleting %s cached partitions of repo %s", len(simulation_ids), name)
+            for simulation_id in simulation_ids:
+                path = self._repo_store.path(self._partition_name(name, simulation_id))
+                path.unlink(missing_ok=True)
+                shutil.rmtree(path.parent, ignore_errors=True)
+                del self._cached_checksums["partitions"][name][simulation_id]
+
     def _check_cached_repo_files(self) -> set[str]:
         """Determine the cached repo files to be deleted b/c the checksum is None or different.
 
@@ -337,13 +416,20 @@ class CacheManager:
         """
         to_be_deleted = set()
         for name, file_checksum in self._cached_checksums["repo"].items():
-            if not file_checksum or file_checksum != self._repo_store.checksum(name):
+            if name in self.PARTITIONED_REPO:
+                is_valid = bool(file_checksum) and file_checksum == self._repo_checksum(name)
+            else:
+                is_valid = self._repo_store.verify(name, file_checksum)
+            if not is_valid:
                 to_be_deleted.add(name)
         return to_be_deleted
 
     def _delete_cached_repo_files(self, to_be_deleted: set[str]) -> None:
         """Delete the given repository files.
 
+        The partitions of the partitioned dataframes are not deleted, because they are checked
+        separately, and they can be reused when the dataframes are extracted again.
+
         Args:
             to_be_deleted: set of repository names to be deleted.
         """
@@ -361,7 +447,7 @@ class CacheManager:
         to_be_deleted = set()
         for config_checksum, checksums_by_name in self._cached_checksums["features"].items():
             for name, file_checksum in checksums_by_name.items():
-                if not file_checksum or file_checksum != self._features_store.checksum(name):
+                if not self._features_store.verify(name, file_checksum):
                     to_be_deleted.add(config_checksum)
                     break
         return to_be_deleted
@@ -384,6 +470,8 @@ class CacheManager:
         """Initialize the cache."""
         L.info("Initialize cache")
         self._check_config_cache()
+        partitions_to_be_deleted = self._check_cached_partition_files()
+        self._delete_cached_partition_files(partitions_to_be_deleted)
         repo_to_be_deleted = self._check_cached_repo_files()
         features_to_be_deleted = self._check_cached_features_files()
         self._delete_cached_repo_files(repo_to_be_deleted)
@@ -397,36 +485,119 @@ class CacheManager:
         """Return whether a specific repo dataframe is present in the cache."""
         # the checksums have been checked in _initialize_cache/_delete_cached_repo_files,
         # so they are not calculate again here
-        return bool(
-            self._cached_checksums["repo"].get(name) and self._repo_store.path(name).is_file()
-        )
+        if not self._cached_checksums["repo"].get(name):
+            return False
+        if name in self.PARTITIONED_REPO:
+            return all(
+                self._repo_store.path(self._partition_name(name, simulation_id)).is_file()
+                for simulation_id in self._cached_checksums["partitions"][name]
+            )
+        return self._repo_store.path(name).is_file()
 
     @_raise_if(locked=False)
-    def load_repo(self, name: str) -> Optional[pd.DataFrame]:
+    def load_repo(
+        self, name: str, query: Optional[dict[str, Any]] = None
+    ) -> Optional[pd.DataFrame]:
         """Load a specific repo dataframe from the cache.
 
         Args:
             name: name of the repo dataframe.
+            query: optional query dict, passed to the store to read only the selected rows.
 
         Returns:
             The loaded dataframe, or None if it's not cached.
         """
-        is_cached = self.is_repo_cached(name)
-        return self._repo_store.load(name) if is_cached else None
+        if not self.is_repo_cached(name):
+            return None
+        if name in self.PARTITIONED_REPO:
+            partitions = self.load_repo_partitions(name, query=query)
+            return concat_partitions(list(partitions.values()), ignore_index=True)
+        return self._repo_store.load(name, filters=query)
+
+    @_raise_if(locked=False)
+    def load_repo_partitions(
+        self,
+        name: str,
+        partition_keys: Optional[dict[int, str]] = None,
+        query: Optional[dict[str, Any]] = None,
+    ) -> dict[int, pd.DataFrame]:
+        """Load the cached partitions of a partitioned repo dataframe.
+
+        Args:
+            name: name of the repo dataframe.
+            partition_keys: if specified, load only the partitions of the given simulation ids,
+                and only if they have been extracted using the same keys.
+            query: optional query dict. The partitions of the simulations not selected by the
+                query are skipped, and the query is passed to the store to filter the rows.
+
+        Returns:
+            dict of dataframes by simulation_id, sorted by simulation_id.
+        """
+        partitions = self._cached_checksums["partitions"].get(name, {})
+        simulation_ids = sorted(partitions)
+        if query and SIMULATION_ID in query:
+            ids_df = pd.DataFrame({SIMULATION_ID: simulation_ids})
+            simulation_ids = ids_df.etl.q({SIMULATION_ID: query[SIMULATION_ID]})[
+                SIMULATION_ID
+            ].to_list()
+        result = {}
+        for simulation_id in simulation_ids:
+            if partition_keys is None or partitions[simulation_id]["key"] == partition_keys.get(
+                simulation_id
+            ):
+                partition_name = self._partition_name(name, simulation_id)
+                df = self._repo_store.load(partition_name, filters=query)
+                if df is not None:
+                    result[simulation_id] = df
+        return result
 
     @_raise_if(readonly=True)
     @_raise_if(locked=False)
-    def dump_repo(self, df: pd.DataFrame, name: str) -> None:
+    def dump_repo(
+        self, df: pd.DataFrame, name: str, partition_keys: Optional[dict[int, str]] = None
+    ) -> None:
         """Write a specific repo dataframe to the cache.
 
         Args:
             df: dataframe to be saved.
             name: name of the repo dataframe.
+            partition_keys: dict of keys by simulation_id, required for partitioned dataframes.
+                The partitions already cached with the same keys are not written again,
+                while the partitions of any other simulation are deleted.
         """
-        self._repo_store.dump(df, name)
-        self._cached_checksums["repo"][name] = self._repo_store.checksum(name)
+        if name in self.PARTITIONED_REPO:
+            assert partition_keys is not None, f"Partition keys are required for {name}"
+            self._dump_repo_partitions(df, name, partition_keys)
+        else:
+            self._repo_store.dump(df, name)
+        self._cached_checksums["repo"][name] = self._repo_checksum(name)
         self._dump_cached_checksums()
 
+    def _dump_repo_partitions(
+        self, df: pd.DataFrame, name: str, partition_keys: dict[int, str]
+    ) -> None:
+        """Write the changed partitions of a repo dataframe, and delete the obsolete partitions."""
+        partitions = self._cached_checksums["partitions"].setdefault(name, {})
+        self._delete_cached_partition_files({name: set(partitions).difference(partition_keys)})
+        indices = df.groupby(SIMULATION_ID).indices
+        written = 0
+        for simulation_id, key in partition_keys.items():
+            if partitions.get(simulation_id, {}).get("key") == key:
+                continue
+            partition_name = self._partition_name(name, simulation_id)
+            partition_df = df.iloc[indices.get(simulation_id, slice(0, 0))].reset_index(drop=True)
+            # ensure that the result is the same when the partitions are concatenated
+            for column in partition_df.select_dtypes("category"):
+                partition_df[column] = partition_df[column].cat.remove_unused_categories()
+            self._repo_store.path(partition_name).parent.mkdir(parents=True, exist_ok=True)
+            self._repo_store.dump(partition_df, partition_name)
+            partitions[simulation_id] = {
+                "key": key,
+                "checksum": self._repo_store.checksum(partition_name),
+            }
+            written += 1
+        L.info("Written %s partitions of %s out of %s", written, name, len(partition_keys))
+
     @_raise_if(locked=False)
     def get_cached_features_checksums(
         self, features_config: FeaturesConfig
@@ -437,13 +608,16 @@ class CacheManager:
         return cached
 
     @_raise_if(locked=False)
-    def load_features(self, features_config: FeaturesConfig) -> Optional[dict[str, pd.DataFrame]]:
+    def load_features(
+        self, features_config: FeaturesConfig, query: Optional[dict[str, Any]] = None
+    ) -> Optional[dict[str, pd.DataFrame]]:
         """Load features dataframes from the cache.
 
         The cache key is determined by the hash of features_config.
 
         Args:
             features_config: configuration dict of the features to be loaded.
+            query: optional query dict, passed to the store to read only the selected rows.
 
         Returns:
             Dict of dataframes, or None if they are not cached.
@@ -454,10 +628,29 @@ class CacheManager:
         # so they are not calculate again here
         for name, file_checksum in cached_checksums.items():
             assert file_checksum is not None
-            features[name] = self._features_store.load(name)
+            features[name] = self.load_feature(name, query=query)
             assert features[name] is not None
         return features or None
 
+    @_raise_if(locked=False)
+    def load_feature(
+        self,
+        name: str,
+        query: Optional[dict[str, Any]] = None,
+        columns: Optional[list[str]] = None,
+    ) -> Optional[pd.DataFrame]:
+        """Load a single features dataframe from the cache.
+
+        Args:
+            name: name of the features dataframe, as returned by get_cached_features_checksums.
+            query: optional query dict, passed to the store to read only the selected rows.
+            columns: optional list of columns to be loaded. The index is always loaded.
+
+        Returns:
+            The dataframe, or None if it's not cached.
+        """
+        return self._features_store.load(name, filters=query, columns=columns)
+
     @_raise_if(readonly=True)
     @_raise_if(locked=False)
     def dump_features(
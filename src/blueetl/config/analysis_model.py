@@ -2,7 +2,7 @@
 
 import json
 from pathlib import Path
-from typing import Annotated, Any, Optional, TypeVar, Union
+from typing import Annotated, Any, Literal, Optional, TypeVar, Union
 
 from pydantic import BaseModel as PydanticBaseModel
 from pydantic import Field
@@ -51,6 +51,14 @@ class ReportConfig(BaseModel):
 
     type: str
     name: str = ""
+    storage: str = "long"
+
+    @model_validator(mode="after")
+    def validate_values(self):
+        """Validate the values after loading them."""
+        if self.storage == "wide" and self.type not in ("soma", "compartment"):
+            raise ValueError("storage=wide is supported only for soma and compartment reports")
+        return self
 
 
 class WindowConfig(BaseModel):
@@ -178,6 +186,12 @@ class MultiAnalysisConfig(BaseModel):
     simulation_campaign: Path
     output: Path
     clear_cache: Annotated[bool, Field(exclude=True)] = False  # do not consider in the checksum
+    lazy_features: Annotated[bool, Field(exclude=True)] = False
+    features_memory_budget: Annotated[Optional[int], Field(exclude=True)] = None
+    checksum_mode: Annotated[Literal["full", "stat", "footer"], Field(exclude=True)] = "stat"
+    persistent_workers: Annotated[bool, Field(exclude=True)] = False
+    concurrent_analyses: Annotated[bool, Field(exclude=True)] = False
+    simulation_probe_workers: Annotated[int, Field(exclude=True, ge=1)] = 1
     simulations_filter: dict[str, Any] = {}
     simulations_filter_in_memory: dict[str, Any] = {}
     analysis: dict[str, SingleAnalysisConfig]
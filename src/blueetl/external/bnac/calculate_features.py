@@ -13,18 +13,55 @@ L = logging.getLogger(__name__)
 FIRST = "first"
 
 
+def _get_spikes_by_trial(df):
+    """Return a df with index (trial, gid, neuron_class_index) and columns (count, first, times).
+
+    The result is the same as grouping by the index columns and aggregating the spike times,
+    but the rows are sorted only once, and the groups are aggregated with vectorized operations.
+    The times of each group are returned as lists, ignoring nan, in the original order.
+    The rows with nan in any of the index columns are ignored, as in groupby.
+    """
+    keys = [TRIAL, GID, NEURON_CLASS_INDEX]
+    if len(df) > 0 and df[keys].isna().to_numpy().any():
+        df = df.dropna(subset=keys)
+    if len(df) == 0:
+        return df.groupby(keys)[TIME].agg(
+            **{COUNT: "count", FIRST: "min", TIMES: lambda x: [i for i in x if not np.isnan(i)]}
+        )
+    key_arrays = [df[k].to_numpy() for k in keys]
+    # stable sort, so that the times of each group are in the original order
+    order = np.lexsort(key_arrays[::-1])
+    key_arrays = [arr[order] for arr in key_arrays]
+    times = df[TIME].to_numpy()[order]
+    # positions where any key changes, i.e. the start of each group
+    changed = np.zeros(len(times), dtype=bool)
+    changed[0] = True
+    for arr in key_arrays:
+        changed[1:] |= arr[1:] != arr[:-1]
+    starts = np.flatnonzero(changed)
+    is_valid = ~np.isnan(times)
+    counts = np.add.reduceat(is_valid, starts).astype(np.int64)
+    # fmin ignores nan, and returns nan only if all the values are nan
+    first = np.fmin.reduceat(times, starts)
+    # the valid times of each group are contiguous in the flat list of valid times
+    valid_times = times[is_valid].tolist()
+    offsets = np.concatenate([[0], np.cumsum(counts)]).tolist()
+    return pd.DataFrame(
+        {
+            COUNT: counts,
+            FIRST: first,
+            TIMES: [valid_times[start:stop] for start, stop in zip(offsets[:-1], offsets[1:])],
+        },
+        index=pd.MultiIndex.from_arrays([arr[starts] for arr in key_arrays], names=keys),
+    )
+
+
 def _get_initial_spiking_stats(repo, key, df, params):
     # pylint: disable=unused-argument
     duration = repo.windows.get_duration(key.window)
 
     # df with index (trial, gid) and columns (count, times)
-    spikes_by_trial = df.groupby([TRIAL, GID, NEURON_CLASS_INDEX])[TIME].agg(
-        **{
-            COUNT: "count",
-            FIRST: "min",
-            TIMES: lambda x: [i for i in x if not np.isnan(i)],  # slow
-        }
-    )
+    spikes_by_trial = _get_spikes_by_trial(df)
     # first spike for each trial and gid, averaged across all trials where the neuron was present
     first_spike_time_means_cort_zeroed = (
         spikes_by_trial[FIRST]
@@ -72,9 +109,7 @@ def _get_histogram_features(repo, key, df, params):
     # all the spike times are concatenated regardless of the trial
     times = df[TIME].to_numpy()
     hist, _ = np.histogram(times, range=[t_start, t_stop], bins=int(duration))
-    num_target_cells = len(
-        repo.neurons.df.etl.q(circuit_id=key.circuit_id, neuron_class=key.neuron_class)
-    )
+    num_target_cells = repo.neurons.get_count(key.circuit_id, key.neuron_class)
     hist = hist / (num_target_cells * number_of_trials)
     min_hist = np.min(hist)
     max_hist = np.max(hist)
@@ -1,13 +1,26 @@
 """Features extractor."""
 
 import logging
+from collections import OrderedDict
+from copy import deepcopy
+from operator import itemgetter
+from pathlib import Path
+from typing import Any, Callable, Optional
 
+import numpy as np
 import pandas as pd
+import pyarrow as pa
+from blueetl_core.utils import smart_concat
 
 from blueetl.extract.base import BaseExtractor
+from blueetl.store.base import INDEX_PREFIX, INDEX_SEP, index_to_columns
+from blueetl.utils import ensure_dtypes
 
 L = logging.getLogger(__name__)
 
+# function called as loader(query, columns) to read a features dataframe from the cache
+FeatureLoader = Callable[[Optional[dict[str, Any]], Optional[list[str]]], pd.DataFrame]
+
 
 class Feature(BaseExtractor):
     """Features extractor class."""
@@ -16,3 +29,304 @@ class Feature(BaseExtractor):
     def _validate(cls, df: pd.DataFrame) -> None:
         # no validation is needed for features
         pass
+
+
+class FeaturesLRU:
+    """Keep in memory the most recently used lazy features, within an optional memory budget."""
+
+    def __init__(self, memory_budget: Optional[int] = None) -> None:
+        """Initialize the object.
+
+        Args:
+            memory_budget: maximum number of bytes used by the loaded dataframes, or None for
+                no limit. The most recently used dataframe is never evicted, even when it's
+                bigger than the budget.
+        """
+        self._memory_budget = memory_budget
+        self._sizes: OrderedDict[LazyFeature, int] = OrderedDict()
+
+    @property
+    def memory_budget(self) -> Optional[int]:
+        """Return the memory budget in bytes, or None for no limit."""
+        return self._memory_budget
+
+    @property
+    def memory_usage(self) -> int:
+        """Return the number of bytes used by the tracked dataframes."""
+        return sum(self._sizes.values())
+
+    def __len__(self) -> int:
+        """Return the number of tracked features."""
+        return len(self._sizes)
+
+    def touch(self, feature: "LazyFeature") -> None:
+        """Mark the given loaded feature as the most recently used."""
+        if feature in self._sizes:
+            self._sizes.move_to_end(feature)
+
+    def add(self, feature: "LazyFeature", size: int) -> None:
+        """Track a feature just loaded, and evict the least recently used ones if needed."""
+        self._sizes[feature] = size
+        self._sizes.move_to_end(feature)
+        if self._memory_budget is None:
+            return
+        total = self.memory_usage
+        while total > self._memory_budget and len(self._sizes) > 1:
+            evicted, evicted_size = self._sizes.popitem(last=False)
+            L.debug("Evicting features %s from memory (%s bytes)", evicted.name, evicted_size)
+            evicted.unload()
+            total -= evicted_size
+
+    def discard(self, feature: "LazyFeature") -> None:
+        """Stop tracking the given feature."""
+        self._sizes.pop(feature, None)
+
+
+def _table_to_pandas(table: pa.Table) -> pd.DataFrame:
+    """Convert a table written with the index converted to columns, without copying the data twice.
+
+    It's equivalent to ``columns_to_index(table.to_pandas())``, but the index is built before
+    converting the other columns, so that the converted DataFrame doesn't need to be copied.
+    """
+    columns = [col for col in table.column_names if col.startswith(INDEX_PREFIX)]
+    names = [col.split(INDEX_SEP, 2)[2] or None for col in columns]
+    levels = [table.column(col).to_pandas() for col in columns]
+    index = pd.MultiIndex.from_arrays(levels) if len(levels) > 1 else pd.Index(levels[0])
+    df = table.drop_columns(columns).to_pandas()
+    # the names are set explicitly, because any unnamed level would get the name of the column
+    df.index = index.set_names(names)
+    return df
+
+
+class FeaturesSink:
+    """Concatenate the partial DataFrames of a feature, spilling the concatenated chunks to disk.
+
+    The partial DataFrames are concatenated in chunks of at least ``chunk_rows`` rows, and each
+    chunk is appended to an Arrow IPC file, so that only the last chunk is kept in memory while
+    the partial DataFrames are received. The final DataFrame is converted from the memory-mapped
+    file, without keeping at the same time in memory all the partial DataFrames and the result.
+
+    The partial DataFrames can be appended in any order, and they are concatenated in the order
+    of their keys. The rows written to disk are reordered slicing the memory-mapped file.
+
+    The chunks that cannot be converted back from Arrow to the same DataFrame, for example because
+    they contain lists or categories, or because their schema is different from the schema of the
+    first chunk, are kept in memory instead, as any chunk following them.
+    """
+
+    def __init__(self, path: Path, chunk_rows: int) -> None:
+        """Initialize the object.
+
+        Args:
+            path: path to the Arrow IPC file to be written.
+            chunk_rows: minimum number of rows in each chunk written to disk.
+        """
+        self._path = path
+        self._chunk_rows = chunk_rows
+        self._buffer: list[tuple[Any, pd.DataFrame]] = []
+        self._buffer_rows = 0
+        # partial DataFrames kept in memory, and keys and lengths of the ones written to disk
+        self._chunks: list[tuple[Any, pd.DataFrame]] = []
+        self._segments: list[tuple[Any, int]] = []
+        self._empty_chunks: list[pd.DataFrame] = []
+        self._count = 0
+        self._sink: Optional[pa.OSFile] = None
+        self._writer: Optional[pa.ipc.RecordBatchFileWriter] = None
+        self._schema: Optional[pa.Schema] = None
+        self._spill = True
+
+    def append(self, df: pd.DataFrame, key: Any = None) -> None:
+        """Append a partial DataFrame.
+
+        Args:
+            df: partial DataFrame.
+            key: sort key of the partial DataFrame. If None, the number of partial DataFrames
+                already appended is used, so the keys should be specified for all or for none
+                of the partial DataFrames.
+        """
+        self._buffer.append((self._count if key is None else key, df))
+        self._buffer_rows += len(df)
+        self._count += 1
+        if self._buffer_rows >= self._chunk_rows:
+            self._flush()
+
+    def _flush(self, spill: bool = True) -> None:
+        """Concatenate the buffered DataFrames, and write the chunk to disk if possible.
+
+        Args:
+            spill: if False, keep the buffered DataFrames in memory.
+        """
+        if not self._buffer:
+            return
+        if spill and self._spill:
+            chunk = smart_concat([df for _, df in self._buffer])
+            if chunk.empty:
+                # the empty chunks are ignored by smart_concat, unless all the chunks are empty
+                self._empty_chunks.append(chunk)
+            elif self._write(chunk):
+                self._segments.extend((key, len(df)) for key, df in self._buffer)
+            else:
+                # keep all the following chunks in memory, because they would likely fail too
+                self._spill = False
+                self._chunks.extend(self._buffer)
+        else:
+            self._chunks.extend(self._buffer)
+        self._buffer, self._buffer_rows = [], 0
+
+    def _write(self, chunk: pd.DataFrame) -> bool:
+        """Append the chunk to the Arrow IPC file, and return True if successful."""
+        converted = index_to_columns(chunk)
+        if converted is chunk:
+            # the unnamed RangeIndex of each chunk would be lost
+            return False
+        try:
+            table = pa.Table.from_pandas(converted, preserve_index=False)
+        except pa.ArrowException as ex:
+            L.debug("Keeping features in memory: %s", ex)
+            return False
+        if any(pa.types.is_nested(t) or pa.types.is_dictionary(t) for t in table.schema.types):
+            # lists would be converted back to arrays, and categories may differ across chunks
+            return False
+        if self._schema is None:
+            self._schema = table.schema
+            self._sink = pa.OSFile(str(self._path), "wb")
+            self._writer = pa.ipc.new_file(self._sink, self._schema)
+        elif not table.schema.equals(self._schema):
+            return False
+        assert self._writer is not None
+        self._writer.write_table(table)
+        return True
+
+    def _read(self) -> pa.Table:
+        """Close the Arrow IPC file, and return the table sorted by the keys of the segments."""
+        assert self._writer is not None and self._sink is not None
+        self._writer.close()
+        self._sink.close()
+        self._writer = self._sink = None
+        # the memory map is released when all the Arrow buffers are garbage collected
+        table = pa.ipc.open_file(pa.memory_map(str(self._path))).read_all()
+        offsets = np.cumsum([0] + [rows for _, rows in self._segments])
+        order = sorted(range(len(self._segments)), key=lambda i: self._segments[i][0])
+        if order != list(range(len(order))):
+            # zero-copy slices of the memory-mapped table
+            table = pa.concat_tables([table.slice(offsets[i], self._segments[i][1]) for i in order])
+            self._segments = [self._segments[i] for i in order]
+        return table
+
+    def to_pandas(self) -> pd.DataFrame:
+        """Return the concatenation of all the partial DataFrames, sorted by key."""
+        # the last chunk doesn't need to be written, because it would be read immediately
+        self._flush(spill=False)
+        chunks = sorted(self._chunks, key=itemgetter(0))
+        if self._writer is not None:
+            df = _table_to_pandas(self._read())
+            segments = self._segments
+            if not chunks or segments[-1][0] <= chunks[0][0]:
+                chunks.insert(0, (segments[0][0], df))
+            else:
+                # interleave the rows read from disk with the partial DataFrames in memory
+                offsets = np.cumsum([0] + [rows for _, rows in segments])
+                chunks.extend(
+                    (key, df.iloc[offsets[i] : offsets[i + 1]])
+                    for i, (key, _) in enumerate(segments)
+                )
+                chunks.sort(key=itemgetter(0))
+        result = [df for _, df in chunks] or self._empty_chunks
+        self._chunks, self._segments, self._empty_chunks = [], [], []
+        return ensure_dtypes(smart_concat(result))
+
+
+class LazyFeature:
+    """Handle of cached features, loaded from the cache on first access to the dataframe.
+
+    It can be used in place of Feature when the features don't need to be written to the cache.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        loader: FeatureLoader,
+        config: Optional[dict[str, Any]] = None,
+        lru: Optional[FeaturesLRU] = None,
+    ) -> None:
+        """Initialize the object.
+
+        Args:
+            name: name of the features.
+            loader: function called as ``loader(query, columns)`` to read the dataframe.
+            config: optional config assigned to attrs["config"] of the loaded dataframe.
+            lru: optional FeaturesLRU instance used to evict the dataframe from memory.
+        """
+        self._name = name
+        self._loader = loader
+        self._config = config
+        self._lru = lru
+        self._feature: Optional[Feature] = None
+        self._cached = True
+        self._filtered = False
+
+    @property
+    def name(self) -> str:
+        """Return the name of the features."""
+        return self._name
+
+    @property
+    def config(self) -> Optional[dict[str, Any]]:
+        """Return the config assigned to attrs["config"] of the loaded dataframe."""
+        return self._config
+
+    @property
+    def loaded(self) -> bool:
+        """Return True if the dataframe is loaded in memory."""
+        return self._feature is not None
+
+    @property
+    def feature(self) -> Feature:
+        """Return the wrapped Feature, loading it if needed."""
+        if self._feature is None:
+            L.debug("Loading features %s", self._name)
+            self._feature = self._to_feature(self._loader(None, None))
+            if self._lru is not None:
+                self._lru.add(self, int(self._feature.df.memory_usage(deep=True).sum()))
+        elif self._lru is not None:
+            self._lru.touch(self)
+        return self._feature
+
+    @property
+    def df(self) -> pd.DataFrame:
+        """Return the wrapped dataframe, loading it if needed."""
+        return self.feature.df
+
+    def load(
+        self, query: Optional[dict[str, Any]] = None, columns: Optional[list[str]] = None
+    ) -> pd.DataFrame:
+        """Return a subset of the dataframe, without keeping it in memory.
+
+        If the whole dataframe is already loaded, the subset is selected from memory,
+        otherwise only the selected rows and columns are read from the cache.
+
+        Args:
+            query: optional filter dictionary, passed to ``etl.q``.
+            columns: optional list of columns to be returned. The index is always returned.
+        """
+        if self._feature is not None:
+            df = self.df.etl.q(query) if query else self.df
+            return df if columns is None else df[columns]
+        return self._to_feature(self._loader(query, columns)).df
+
+    def unload(self) -> None:
+        """Remove the dataframe from memory. It will be loaded again when needed."""
+        self._feature = None
+        if self._lru is not None:
+            self._lru.discard(self)
+
+    def to_pandas(self) -> pd.DataFrame:
+        """Return a dataframe that can be serialized and stored to disk."""
+        return self.feature.to_pandas()
+
+    def _to_feature(self, df: pd.DataFrame) -> Feature:
+        feature = Feature.from_pandas(df, cached=True)
+        if self._config is not None:
+            # make a copy of the config accessible from the features dataframe attrs
+            feature.df.attrs["config"] = deepcopy(self._config)
+        return feature
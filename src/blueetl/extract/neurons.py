@@ -1,25 +1,21 @@
 """Neurons extractor."""
 
 import logging
-from pathlib import Path
-from typing import Optional
+from functools import cached_property, partial
 
 import numpy as np
 import pandas as pd
 
 from blueetl.adapters.circuit import CircuitAdapter as Circuit
-from blueetl.adapters.node_sets import NodeSetsAdapter as NodeSets
 from blueetl.config.analysis_model import NeuronClassConfig
 from blueetl.constants import CIRCUIT, CIRCUIT_ID, GID, NEURON_CLASS, NEURON_CLASS_INDEX
 from blueetl.extract.base import BaseExtractor
 from blueetl.extract.simulations import Simulations
-from blueetl.utils import ensure_list, timed
+from blueetl.parallel import run_tasks
+from blueetl.utils import ensure_list
 
 L = logging.getLogger(__name__)
 
-# cached node_ids for each (population, node_set, node_sets_file)
-CellsCache = dict[tuple[Optional[str], Optional[str], Optional[Path]], pd.DataFrame]
-
 
 def _get_property_names(neuron_classes: dict[str, NeuronClassConfig]) -> list[str]:
     """Return the list of properties to be retrieved from the cells DataFrame."""
@@ -30,46 +26,14 @@ def _get_property_names(neuron_classes: dict[str, NeuronClassConfig]) -> list[st
     return sorted(properties_set)
 
 
-def _load_cells(
-    circuit: Circuit,
-    property_names: list[str],
-    cells_cache: CellsCache,
-    population: Optional[str],
-    node_set: Optional[str],
-    node_sets_file: Optional[Path],
-) -> pd.DataFrame:
-    """Load and return the cells for the given population and node_set.
-
-    Data are retrieved from the circuit or from the cache.
-
-    If node_set is None or empty string, all the cells of the population are loaded.
-    """
-    node_set = node_set or None
-    key = (population, node_set, node_sets_file)
-    if key not in cells_cache:
-        msg = f"Loading nodes using {population=}, {node_set=}, {node_sets_file=}"
-        with timed(L.info, msg):
-            if node_set and node_sets_file:
-                node_sets = NodeSets.from_file(circuit.node_sets_file)
-                node_sets |= NodeSets.from_file(node_sets_file)
-                node_set = node_sets.instance[node_set]
-            _cells = circuit.nodes[population].get(group=node_set, properties=property_names)
-            cells_cache[key] = _cells
-    return cells_cache[key]
-
-
 def _filter_gids_by_neuron_class(
     circuit: Circuit,
     property_names: list[str],
-    cells_cache: CellsCache,
-    name: str,
     config: NeuronClassConfig,
 ) -> np.ndarray:
-    """Return the array of node_ids filtered by neuron class."""
-    cells = _load_cells(
-        circuit=circuit,
-        property_names=property_names,
-        cells_cache=cells_cache,
+    """Return the array of node_ids filtered by neuron class, before applying the limit."""
+    cells = circuit.get_cells(
+        properties=property_names,
         population=config.population,
         node_set=config.node_set,
         node_sets_file=config.node_sets_file,
@@ -77,6 +41,15 @@ def _filter_gids_by_neuron_class(
     gids = cells.etl.q(config.query).index.to_numpy()
     if config.node_id is not None:
         gids = np.intersect1d(gids, config.node_id)
+    return gids
+
+
+def _limit_gids(name: str, gids: np.ndarray, config: NeuronClassConfig) -> np.ndarray:
+    """Return the sorted array of node_ids, randomly selected if a limit is configured.
+
+    It uses the global random state, so it should be called in the main process,
+    always in the same order, to obtain reproducible results when the seed is set.
+    """
     neuron_count = len(gids)
     if config.limit and neuron_count > config.limit:
         gids = np.random.choice(gids, size=config.limit, replace=False)
@@ -95,6 +68,22 @@ def _filter_gids_by_neuron_class(
     return gids
 
 
+def _is_sorted(df: pd.DataFrame, columns: list[str]) -> bool:
+    """Return True if the dataframe is sorted by the given columns, as in sort_values."""
+    # rows not distinguished yet by the previous columns
+    undecided = np.ones(max(len(df) - 1, 0), dtype=bool)
+    for column in columns:
+        values = df[column]
+        if isinstance(values.dtype, pd.CategoricalDtype):
+            values = values.cat.codes
+        values = values.to_numpy()
+        prev, curr = values[:-1], values[1:]
+        if np.any(undecided & (prev > curr)):
+            return False
+        undecided &= prev == curr
+    return True
+
+
 class Neurons(BaseExtractor):
     """Neurons extractor class."""
 
@@ -104,17 +93,23 @@ class Neurons(BaseExtractor):
         """Initialize the extractor."""
         super().__init__(df, cached=cached, filtered=filtered)
         # ensure that the neurons are sorted
-        self._df: pd.DataFrame = self._df.sort_values(self.COLUMNS, ignore_index=True)
+        if not _is_sorted(self._df, self.COLUMNS):
+            self._df = self._df.sort_values(self.COLUMNS, ignore_index=True)
+        elif not self._df.index.equals(pd.RangeIndex(len(self._df))):
+            self._df = self._df.reset_index(drop=True)
 
     @staticmethod
     def _get_gids(
         circuit: Circuit, neuron_classes: dict[str, NeuronClassConfig]
     ) -> dict[str, np.ndarray]:
-        """Return a dict containing name: node_ids for each neuron class."""
-        cells_cache: CellsCache = {}
+        """Return a dict containing name: node_ids for each neuron class, without limits.
+
+        The cells are loaded only once for each (population, node_set, node_sets_file),
+        and they are cached in the circuit to be reused by any analysis using the same circuit.
+        """
         property_names = _get_property_names(neuron_classes=neuron_classes)
         return {
-            name: _filter_gids_by_neuron_class(circuit, property_names, cells_cache, name, config)
+            name: _filter_gids_by_neuron_class(circuit, property_names, config)
             for name, config in neuron_classes.items()
         }
 
@@ -132,16 +127,62 @@ class Neurons(BaseExtractor):
             Neurons: new instance.
         """
         grouped = simulations.df.groupby([CIRCUIT_ID])[CIRCUIT].first()
-        records: list[tuple[int, str, int, int]] = []
-        for circuit_id, circuit in grouped.items():
-            gids_by_class = cls._get_gids(circuit, neuron_classes=neuron_classes)
-            records.extend(
-                (circuit_id, neuron_class, gid, neuron_class_index)
-                for neuron_class, gids in gids_by_class.items()
-                for neuron_class_index, gid in enumerate(gids)
-            )
-        df = pd.DataFrame.from_records(records, columns=cls.COLUMNS)
-        return cls(df, cached=False, filtered=False)
+        funcs = [partial(cls._get_gids, circuit, neuron_classes) for circuit in grouped]
+        if len(funcs) > 1:
+            # load the cells of different circuits in subprocesses
+            results = run_tasks(funcs)
+        else:
+            results = [f() for f in funcs]
+        gids_by_circuit = {
+            circuit_id: {
+                # the limit is applied in the main process to keep the selection reproducible
+                name: _limit_gids(name, gids, neuron_classes[name])
+                for name, gids in all_gids_by_class.items()
+            }
+            for circuit_id, all_gids_by_class in zip(grouped.index, results)
+        }
+        return cls(cls._build_dataframe(gids_by_circuit), cached=False, filtered=False)
+
+    @classmethod
+    def _build_dataframe(cls, gids_by_circuit: dict[int, dict[str, np.ndarray]]) -> pd.DataFrame:
+        """Return the sorted neurons dataframe, built column-wise from the arrays of gids.
+
+        Args:
+            gids_by_circuit: dict circuit_id -> neuron_class -> sorted array of gids.
+        """
+        # only the neuron classes with some gids are used as categories, sorted by name
+        categories = sorted(
+            {
+                name
+                for gids_by_class in gids_by_circuit.values()
+                for name, gids in gids_by_class.items()
+                if len(gids)
+            }
+        )
+        codes = {name: code for code, name in enumerate(categories)}
+        keys = [
+            (circuit_id, name, gids)
+            for circuit_id, gids_by_class in sorted(gids_by_circuit.items())
+            for name, gids in sorted(gids_by_class.items())
+            if len(gids)
+        ]
+        sizes = np.array([len(gids) for _, _, gids in keys], dtype=np.int64)
+        starts = np.cumsum(sizes) - sizes
+        circuit_ids = np.array([circuit_id for circuit_id, _, _ in keys], dtype=np.int64)
+        class_codes = np.array([codes[name] for _, name, _ in keys], dtype=np.int64)
+        gids = [np.asarray(gids, dtype=np.int64) for _, _, gids in keys]
+        return pd.DataFrame(
+            {
+                CIRCUIT_ID: np.repeat(circuit_ids, sizes),
+                NEURON_CLASS: pd.Categorical.from_codes(
+                    np.repeat(class_codes, sizes), categories=categories
+                ),
+                GID: np.concatenate(gids) if gids else np.array([], dtype=np.int64),
+                # incremental index of the gids in each neuron class
+                NEURON_CLASS_INDEX: np.arange(sizes.sum()) - np.repeat(starts, sizes),
+            },
+            columns=cls.COLUMNS,
+        )
 
     def count_by_neuron_class(self, observed: bool = True) -> pd.Series:
         """Return the number of gids for each circuit and neuron class.
@@ -151,3 +192,31 @@ class Neurons(BaseExtractor):
                 If False: show all values for categorical groupers.
         """
         return self.df.groupby([CIRCUIT_ID, NEURON_CLASS], observed=observed)[GID].count()
+
+    @cached_property
+    def neuron_class_offsets(self) -> dict[tuple[int, str], tuple[int, int]]:
+        """Return a dict (circuit_id, neuron_class) -> (offset, count) of the rows in the df.
+
+        Since the neurons are sorted by circuit and neuron class, the rows of each neuron class
+        are contiguous, and they can be selected with a slice instead of filtering the df.
+        """
+        counts = self.count_by_neuron_class()
+        offsets = np.cumsum(counts.to_numpy()) - counts.to_numpy()
+        return {
+            (int(circuit_id), str(neuron_class)): (int(offset), int(count))
+            for (circuit_id, neuron_class), offset, count in zip(counts.index, offsets, counts)
+        }
+
+    def get_count(self, circuit_id: int, neuron_class: str) -> int:
+        """Return the number of gids in the given circuit and neuron class."""
+        return self.neuron_class_offsets.get((circuit_id, neuron_class), (0, 0))[1]
+
+    def get_gids(self, circuit_id: int, neuron_class: str) -> np.ndarray:
+        """Return the sorted array of gids in the given circuit and neuron class.
+
+        The returned array is a read-only view of the gids in the df, so it must not be modified.
+        """
+        offset, count = self.neuron_class_offsets.get((circuit_id, neuron_class), (0, 0))
+        gids = self.df[GID].to_numpy()[offset : offset + count]
+        gids.flags.writeable = False
+        return gids
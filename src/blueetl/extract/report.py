@@ -1,25 +1,78 @@
 """Generic Report extractor."""
 
+import hashlib
 import logging
 from abc import ABCMeta, abstractmethod
 from dataclasses import dataclass
+from operator import itemgetter
 from typing import NamedTuple, Optional, TypeVar
 
+import numpy as np
 import pandas as pd
 from blueetl_core.utils import smart_concat
 
+from blueetl.adapters.interfaces.simulation import PopulationReportInterface
 from blueetl.adapters.simulation import SimulationAdapter as Simulation
-from blueetl.constants import CIRCUIT_ID, GID, NEURON_CLASS, POPULATION, SIMULATION, SIMULATION_ID
+from blueetl.constants import (
+    CIRCUIT_ID,
+    DTYPES,
+    GID,
+    NEURON_CLASS,
+    POPULATION,
+    SECTION,
+    SIMULATION,
+    SIMULATION_ID,
+    SIMULATION_PATH,
+    TIME,
+    TRIAL,
+    VALUE,
+    WINDOW,
+)
 from blueetl.extract.base import BaseExtractor
 from blueetl.extract.neuron_classes import NeuronClasses
 from blueetl.extract.neurons import Neurons
 from blueetl.extract.simulations import Simulations
 from blueetl.extract.windows import Windows
 from blueetl.parallel import merge_filter
+from blueetl.utils import checksum_json, ensure_dtypes
 
 L = logging.getLogger(__name__)
 ReportExtractorT = TypeVar("ReportExtractorT", bound="ReportExtractor")
 
+# storage formats of the report dataframes
+STORAGE_LONG = "long"
+STORAGE_WIDE = "wide"
+# columns identifying each block of values, when the report is stored in wide format
+BLOCK_COLUMNS = [WINDOW, TRIAL, SIMULATION_ID, CIRCUIT_ID, NEURON_CLASS]
+# names of the columns containing the arrays of each block, when stored in wide format
+WIDE_COLUMNS = {TIME: "times", GID: "gids", SECTION: "sections", VALUE: "values"}
+# version of the schema of the extracted partitions, to be incremented whenever BLOCK_COLUMNS,
+# WIDE_COLUMNS, or any other change to the partitions would make the cached ones incompatible
+PARTITION_SCHEMA_VERSION = 1
+
+
+def _object_array(values: list[np.ndarray]) -> np.ndarray:
+    """Return a 1-dimensional array of objects containing the given arrays."""
+    result = np.empty(len(values), dtype=object)
+    for n, value in enumerate(values):
+        result[n] = value
+    return result
+
+
+def _concatenate(arrays: list[np.ndarray], dtype=None) -> np.ndarray:
+    """Concatenate the given arrays, and cast the result to dtype if specified."""
+    result = np.concatenate(arrays) if arrays else np.array([], dtype=dtype)
+    return result if dtype is None else result.astype(dtype, copy=False)
+
+
+def _checksum_by_group(df: pd.DataFrame, column: str) -> dict[int, str]:
+    """Return a dict with the checksum of the rows of each group, using the given column."""
+    row_hashes = pd.util.hash_pandas_object(df, index=False).to_numpy()
+    return {
+        group: hashlib.blake2b(row_hashes[positions].tobytes()).hexdigest()
+        for group, positions in df.groupby(column, observed=True).indices.items()
+    }
+
 
 @dataclass
 class WindowSlice:
@@ -34,7 +87,68 @@ class WindowSlice:
 
 
 class ReportExtractor(BaseExtractor, metaclass=ABCMeta):
-    """Report extractor class."""
+    """Report extractor class.
+
+    The reports supporting the wide format can wrap a DataFrame in long or wide format.
+    The format is determined by the columns of the DataFrame, and the DataFrame in long format
+    is built from the DataFrame in wide format only when it's accessed.
+    """
+
+    # columns identifying the elements of the report, when it can be stored in wide format
+    _element_columns: list[str] = []
+
+    def __init__(self, df: pd.DataFrame, cached: bool, filtered: bool) -> None:
+        """Initialize the extractor.
+
+        Args:
+            df: Pandas DataFrame containing the extracted data, in long or wide format.
+            cached: True if the data have been extracted from the cache, False otherwise.
+            filtered: True if the data have been filtered using a custom query, False otherwise.
+        """
+        self._wide_df: Optional[pd.DataFrame] = None
+        if WIDE_COLUMNS[VALUE] not in df.columns:
+            super().__init__(df, cached=cached, filtered=filtered)
+            return
+        self._cached = cached
+        self._filtered = filtered
+        self._validate_wide(df)
+        self._wide_df = ensure_dtypes(df, {name: DTYPES[name] for name in BLOCK_COLUMNS})
+        self._long_df: Optional[pd.DataFrame] = None
+
+    @classmethod
+    def _validate_wide(cls, df: pd.DataFrame) -> None:
+        """Validate the dataframe in wide format."""
+        if not cls._element_columns:
+            raise ValueError(f"The wide format is not supported by {cls.__name__}")
+        cls._validate_data(df)
+        actual = set(df.columns)
+        expected = set(cls.wide_columns())
+        if actual != expected:
+            raise ValueError(f"Invalid columns in wide format: {actual ^ expected}")
+
+    @property
+    def storage(self) -> str:
+        """Return the format of the wrapped dataframe, "long" or "wide"."""
+        return STORAGE_LONG if self._wide_df is None else STORAGE_WIDE
+
+    @property
+    def df(self) -> pd.DataFrame:
+        """Return the internally wrapped dataframe, in long format."""
+        if self._wide_df is None:
+            return self._df
+        if self._long_df is None:
+            L.info("Converting %s from wide to long format", self.__class__.__name__)
+            self._long_df = ensure_dtypes(self.to_long(self._wide_df))
+        return self._long_df
+
+    @property
+    def wide_df(self) -> Optional[pd.DataFrame]:
+        """Return the dataframe in wide format, or None if the report is stored in long format."""
+        return self._wide_df
+
+    def to_pandas(self) -> pd.DataFrame:
+        """Return a dataframe that can be serialized and stored to disk, in the same format."""
+        return self.df if self._wide_df is None else self._wide_df
 
     @staticmethod
     def calculate_window_slice(rec) -> WindowSlice:
@@ -52,6 +166,92 @@ class ReportExtractor(BaseExtractor, metaclass=ABCMeta):
             trial=rec.trial,
         )
 
+    @classmethod
+    def _load_windows(
+        cls,
+        report: PopulationReportInterface,
+        gids,
+        windows_df: pd.DataFrame,
+    ) -> pd.DataFrame:
+        """Return a DataFrame in wide format with the values of the report in each window.
+
+        All the windows are read with a single call to ``report.get_windows``, and each window
+        slice (i.e. each trial of each window) is stored in a separate row, containing the arrays
+        of times, elements, and values.
+
+        Args:
+            report: report of a node population.
+            gids: array of gids to be selected.
+            windows_df: windows dataframe.
+
+        Returns:
+            pd.DataFrame: dataframe with the columns window and trial, and the columns in wide
+                format corresponding to time, to the elements of the report, and to value.
+        """
+        slices = [cls.calculate_window_slice(rec) for rec in windows_df.itertuples()]
+        frames = report.get_windows(
+            group=gids, windows=[(win.t_start, win.t_stop, win.t_step) for win in slices]
+        )
+        arrays = {
+            WIDE_COLUMNS[TIME]: [frame.index.to_numpy() for frame in frames],
+            **{
+                WIDE_COLUMNS[name]: [
+                    frame.columns.get_level_values(level).to_numpy() for frame in frames
+                ]
+                for level, name in enumerate(cls._element_columns)
+            },
+            # the values are ordered by column, and then by time, as when unstacking the frame
+            WIDE_COLUMNS[VALUE]: [frame.to_numpy().T.ravel() for frame in frames],
+        }
+        df = pd.DataFrame(
+            {WINDOW: [win.name for win in slices], TRIAL: [win.trial for win in slices]}
+        )
+        for name, values in arrays.items():
+            # assign arrays of objects, to prevent pandas from converting the arrays
+            df[name] = _object_array(values)
+        return df
+
+    @classmethod
+    def wide_columns(cls) -> list[str]:
+        """Return the columns of the DataFrame when the report is stored in wide format."""
+        return [
+            *BLOCK_COLUMNS,
+            *(WIDE_COLUMNS[name] for name in [TIME, *cls._element_columns, VALUE]),
+        ]
+
+    @classmethod
+    def to_long(cls, df: pd.DataFrame) -> pd.DataFrame:
+        """Convert a DataFrame of blocks from wide format to long format.
+
+        Each block is expanded to one row for each time and element, in the same order used
+        when the report is stored in long format.
+
+        Args:
+            df: DataFrame in wide format, possibly containing only a subset of the blocks.
+
+        Returns:
+            pd.DataFrame: DataFrame in long format.
+        """
+        times = df[WIDE_COLUMNS[TIME]].to_list()
+        elements = {name: df[WIDE_COLUMNS[name]].to_list() for name in cls._element_columns}
+        n_times = np.array([len(arr) for arr in times], dtype=np.int64)
+        n_elements = np.array(
+            [len(arr) for arr in elements[cls._element_columns[0]]], dtype=np.int64
+        )
+        data = {
+            name: _concatenate(
+                [np.repeat(arr, n) for arr, n in zip(arrays, n_times)], dtype=DTYPES.get(name)
+            )
+            for name, arrays in elements.items()
+        }
+        data[TIME] = _concatenate(
+            [np.tile(arr, n) for arr, n in zip(times, n_elements)], dtype=DTYPES[TIME]
+        )
+        data[VALUE] = _concatenate(df[WIDE_COLUMNS[VALUE]].to_list())
+        # repeat the block columns preserving their dtypes, categories included
+        blocks = df[BLOCK_COLUMNS].iloc[np.repeat(np.arange(len(df)), n_times * n_elements)]
+        return pd.concat([pd.DataFrame(data), blocks.reset_index(drop=True)], axis=1)
+
     @classmethod
     @abstractmethod
     def _load_values(
@@ -75,6 +275,53 @@ class ReportExtractor(BaseExtractor, metaclass=ABCMeta):
             pd.DataFrame: dataframe with the needed columns.
         """
 
+    @classmethod
+    def partition_keys(
+        cls,
+        simulations: Simulations,
+        neurons: Neurons,
+        windows: Windows,
+        neuron_classes: NeuronClasses,
+        name: str,
+        storage: str = STORAGE_LONG,
+    ) -> dict[int, str]:
+        """Return a dict of checksums of the data used to extract each simulation.
+
+        If the checksum of a simulation is unchanged, the data previously extracted from the same
+        simulation can be reused, because it would be identical to the data extracted again.
+
+        Args:
+            simulations: Simulations extractor.
+            neurons: Neurons extractor.
+            windows: Windows extractor.
+            neuron_classes: NeuronClasses extractor.
+            name: name of the report in the simulation configuration.
+            storage: format of the extracted DataFrame, "long" or "wide".
+                The partitions extracted in a different format are not reused.
+
+        Returns:
+            dict of checksums by simulation_id.
+        """
+        populations_df = neuron_classes.df[[CIRCUIT_ID, NEURON_CLASS, POPULATION]]
+        neurons_checksums = _checksum_by_group(neurons.df, CIRCUIT_ID)
+        populations_checksums = _checksum_by_group(populations_df, CIRCUIT_ID)
+        windows_checksums = _checksum_by_group(windows.df, SIMULATION_ID)
+        return {
+            int(rec.simulation_id): checksum_json(
+                [
+                    cls.__name__,
+                    PARTITION_SCHEMA_VERSION,
+                    name,
+                    storage,
+                    str(rec.simulation_path),
+                    neurons_checksums.get(rec.circuit_id),
+                    populations_checksums.get(rec.circuit_id),
+                    windows_checksums.get(rec.simulation_id),
+                ]
+            )
+            for _, rec in simulations.df[[SIMULATION_ID, CIRCUIT_ID, SIMULATION_PATH]].etl.iter()
+        }
+
     @classmethod
     def from_simulations(
         cls: type[ReportExtractorT],
@@ -83,6 +330,8 @@ class ReportExtractor(BaseExtractor, metaclass=ABCMeta):
         windows: Windows,
         neuron_classes: NeuronClasses,
         name: str,
+        partitions: Optional[dict[int, pd.DataFrame]] = None,
+        storage: str = STORAGE_LONG,
     ) -> ReportExtractorT:
         """Return a new instance from the given simulations, neurons, and windows.
 
@@ -92,10 +341,19 @@ class ReportExtractor(BaseExtractor, metaclass=ABCMeta):
             windows: Windows extractor.
             neuron_classes: NeuronClasses extractor.
             name: name of the report in the simulation configuration.
+            partitions: optional dict of DataFrames already extracted, by simulation_id.
+                The corresponding simulations are not extracted again, and the DataFrames
+                are included in the result.
+            storage: format of the extracted DataFrame, "long" or "wide".
+                The partitions must be in the same format.
 
         Returns:
             New instance.
         """
+        if storage not in (STORAGE_LONG, STORAGE_WIDE):
+            raise ValueError(f"Invalid storage: {storage}")
+        if storage == STORAGE_WIDE and not cls._element_columns:
+            raise ValueError(f"The wide format is not supported by {cls.__name__}")
 
         def _func(key: NamedTuple, df_list: list[pd.DataFrame]) -> tuple[NamedTuple, pd.DataFrame]:
             # executed in a subprocess
@@ -116,13 +374,29 @@ class ReportExtractor(BaseExtractor, metaclass=ABCMeta):
                 )
                 result_df[[SIMULATION_ID, *inner_key._fields]] = [simulation_id, *inner_key]
                 df_list.append(result_df)
-            return smart_concat(df_list, ignore_index=True)
+            df = smart_concat(df_list, ignore_index=True)
+            if cls._element_columns:
+                df = cls.to_long(df) if storage == STORAGE_LONG else df[cls.wide_columns()]
+            return df
 
-        all_df = merge_filter(
-            df_list=[simulations.df, neurons.df, windows.df],
-            groupby=[SIMULATION_ID, CIRCUIT_ID],
-            func=_func,
-            parallel=True,
-        )
-        df = smart_concat(all_df, ignore_index=True)
+        partitions = partitions or {}
+        simulations_df = simulations.df
+        if partitions:
+            L.info("Reusing %s simulations already extracted", len(partitions))
+            simulations_df = simulations_df[~simulations_df[SIMULATION_ID].isin(list(partitions))]
+        all_df = []
+        if len(simulations_df) > 0:
+            results = merge_filter(
+                df_list=[simulations_df, neurons.df, windows.df],
+                groupby=[SIMULATION_ID, CIRCUIT_ID],
+                func=_func,
+                parallel=True,
+                ordered=False,
+            )
+            # restore the order of the simulations, since the results are received as completed
+            all_df = [df for _, df in sorted(results, key=itemgetter(0))]
+        df = smart_concat([*partitions.values(), *all_df], ignore_index=True)
+        if partitions and np.any(np.diff(df[SIMULATION_ID].to_numpy()) < 0):
+            # ensure the same order as if all the simulations were extracted again
+            df = df.sort_values(SIMULATION_ID, kind="stable", ignore_index=True)
         return cls(df, cached=False, filtered=False)
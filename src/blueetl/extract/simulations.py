@@ -1,17 +1,22 @@
 """Simulations extractor."""
 
+import json
 import logging
+from concurrent.futures import ThreadPoolExecutor
 from enum import Enum
+from functools import partial
 from pathlib import Path
 from typing import Any, Optional, cast
 
 import pandas as pd
 
 from blueetl.adapters.circuit import CircuitAdapter as Circuit
+from blueetl.adapters.circuit import CircuitRegistry
 from blueetl.adapters.simulation import SimulationAdapter as Simulation
 from blueetl.campaign.config import SimulationCampaign
 from blueetl.constants import CIRCUIT, CIRCUIT_ID, SIMULATION, SIMULATION_ID, SIMULATION_PATH
 from blueetl.extract.base import BaseExtractor
+from blueetl.utils import mtime_ns, unlocked_cached_property
 
 L = logging.getLogger(__name__)
 
@@ -31,6 +36,181 @@ class InconsistentSimulations(Exception):
     """Error raised when the extracted simulations have some inconsistencies."""
 
 
+def _optional_path(path: Optional[str]) -> Optional[Path]:
+    """Return the given path as a Path object, or None."""
+    return None if path is None else Path(path)
+
+
+class SimulationStatusCache:
+    """Status of the complete simulations, stored to file to avoid loading them again.
+
+    For each simulation path, the checksum of the circuit is stored together with the paths to the
+    spikes file and to the circuit config, and with the modification times of the simulation config,
+    of the spikes file, and of the circuit config.
+    An entry is valid only if the modification times haven't changed.
+
+    Only the complete simulations are stored, because the incomplete simulations may be completed
+    later, while the missing simulations can be checked quickly.
+    """
+
+    _version = 2
+
+    def __init__(self, path: Path) -> None:
+        """Initialize the object, loading the existing entries from file if possible.
+
+        Args:
+            path: path to the JSON file.
+        """
+        self._path = path
+        self._entries: dict[str, dict[str, Any]] = {}
+        self._modified = False
+        if path.exists():
+            try:
+                data = json.loads(path.read_text(encoding="utf-8"))
+            except ValueError:
+                L.warning("Ignoring invalid simulations status file %s", path)
+            else:
+                if data.get("version") == self._version:
+                    self._entries = data["simulations"]
+
+    def get(self, simulation_path: str) -> Optional[str]:
+        """Return the checksum of the circuit if the simulation is cached and unchanged."""
+        entry = self._entries.get(simulation_path)
+        if (
+            entry is None
+            or entry["config_mtime"] != mtime_ns(Path(simulation_path))
+            or entry["spikes_mtime"] != mtime_ns(Path(entry["spikes_file"]))
+            or entry["circuit_mtime"] != mtime_ns(_optional_path(entry["circuit_config"]))
+        ):
+            return None
+        return entry["circuit_hash"]
+
+    def get_circuit_config(self, simulation_path: str) -> Optional[Path]:
+        """Return the path to the circuit config if the simulation is cached and it's known."""
+        entry = self._entries.get(simulation_path)
+        return None if entry is None else _optional_path(entry["circuit_config"])
+
+    def set(self, simulation_path: str, simulation: Simulation, circuit_hash: str) -> None:
+        """Store the status of a complete simulation."""
+        spikes_file = simulation.spikes_file
+        config_mtime = mtime_ns(Path(simulation_path))
+        spikes_mtime = mtime_ns(spikes_file)
+        circuit_config = simulation.circuit_config_path
+        circuit_mtime = mtime_ns(circuit_config)
+        if config_mtime is None or spikes_mtime is None:
+            return
+        if circuit_config is not None and circuit_mtime is None:
+            return
+        self._entries[simulation_path] = {
+            "config_mtime": config_mtime,
+            "spikes_file": str(spikes_file),
+            "spikes_mtime": spikes_mtime,
+            "circuit_config": None if circuit_config is None else str(circuit_config),
+            "circuit_mtime": circuit_mtime,
+            "circuit_hash": circuit_hash,
+        }
+        self._modified = True
+
+    def dump(self) -> None:
+        """Write the entries to file, if they have been modified."""
+        if not self._modified:
+            return
+        data = {"version": self._version, "simulations": self._entries}
+        tmp_path = self._path.with_name(f"{self._path.name}.tmp")
+        tmp_path.write_text(json.dumps(data), encoding="utf-8")
+        tmp_path.replace(self._path)
+        self._modified = False
+
+
+class _SimulationProbe:
+    """Simulation to be loaded from file, caching the results of the checks on the file system.
+
+    The checks are executed lazily when the properties are accessed, or in advance with prefetch.
+    If the status of the simulation is cached, the Simulation and Circuit objects are loaded
+    only when they are used.
+    """
+
+    def __init__(
+        self,
+        simulation_path: str,
+        simulation: Optional[Simulation] = None,
+        status_cache: Optional[SimulationStatusCache] = None,
+    ) -> None:
+        """Initialize the object.
+
+        Args:
+            simulation_path: path to the simulation config.
+            simulation: Simulation object, if already loaded.
+            status_cache: optional cache of the status of the simulations.
+        """
+        self._simulation_path = simulation_path
+        self._simulation = simulation
+        self._status_cache = status_cache
+
+    @unlocked_cached_property
+    def cached_circuit_hash(self) -> Optional[str]:
+        """Return the cached checksum of the circuit, if the simulation is cached and complete."""
+        if self._simulation is None and self._status_cache is not None:
+            return self._status_cache.get(self._simulation_path)
+        return None
+
+    @unlocked_cached_property
+    def simulation(self) -> Simulation:
+        """Return the Simulation object, loading it if needed."""
+        if self._simulation is not None:
+            return self._simulation
+        if self.cached_circuit_hash is not None:
+            return Simulation.from_file_lazy(Path(self._simulation_path))
+        return Simulation.from_file(Path(self._simulation_path))
+
+    @unlocked_cached_property
+    def exists(self) -> bool:
+        """Return True if the simulation exists."""
+        return self.cached_circuit_hash is not None or self.simulation.exists()
+
+    @unlocked_cached_property
+    def circuit_hash(self) -> str:
+        """Return the checksum of the circuit used by the simulation."""
+        if self.cached_circuit_hash is not None:
+            return self.cached_circuit_hash
+        return self.simulation.circuit.checksum()
+
+    @unlocked_cached_property
+    def is_complete(self) -> bool:
+        """Return True if the simulation is complete."""
+        return self.cached_circuit_hash is not None or self.simulation.is_complete()
+
+    @property
+    def circuit(self) -> Circuit:
+        """Return the Circuit object used by the simulation."""
+        if self.cached_circuit_hash is not None:
+            assert self._status_cache is not None
+            path = self._status_cache.get_circuit_config(self._simulation_path)
+            if path is None:
+                return self.simulation.lazy_circuit(checksum=self.cached_circuit_hash)
+            # the circuit is shared with the other simulations, without loading the simulation
+            return CircuitRegistry.get(
+                path, partial(Circuit.from_file_lazy, path, checksum=self.cached_circuit_hash)
+            )
+        return self.simulation.circuit
+
+    def prefetch(self) -> "_SimulationProbe":
+        """Execute in advance all the checks needed to build the record, and return self."""
+        if self.exists:
+            _ = self.circuit_hash, self.is_complete
+        return self
+
+    def update_status_cache(self) -> None:
+        """Store the status of the simulation, if it's complete and not already cached."""
+        if (
+            self._status_cache is not None
+            and self.cached_circuit_hash is None
+            and self.exists
+            and self.is_complete
+        ):
+            self._status_cache.set(self._simulation_path, self.simulation, self.circuit_hash)
+
+
 class Simulations(BaseExtractor):
     """Simulations extractor class."""
 
@@ -43,6 +223,7 @@ class Simulations(BaseExtractor):
         cls,
         simulation_id: int,
         rec: dict[str, Any],
+        probe: _SimulationProbe,
         circuit_hashes: dict[str, int],
         circuits: dict[int, Circuit],
     ) -> dict[str, Any]:
@@ -60,19 +241,19 @@ class Simulations(BaseExtractor):
         ), "Simulation and Circuit must be both initialized, or both not initialized"
         circuit_hash = None
         status = SimulationStatus.MISSING
-        simulation = simulation or Simulation.from_file(Path(simulation_path))
-        if simulation.exists():
+        simulation = probe.simulation
+        if probe.exists:
             # consider the simulation only if it wasn't manually deleted
             status = SimulationStatus.INCOMPLETE
-            circuit_hash = simulation.circuit.checksum()
+            circuit_hash = probe.circuit_hash
             # if circuit_hash is not new, use the previous circuit_id
             circuit_id = circuit_hashes.setdefault(circuit_hash, circuit_id)
-            circuit = circuit or circuits.setdefault(circuit_id, simulation.circuit)
+            circuit = circuit or circuits.setdefault(circuit_id, probe.circuit)
             # double-check the circuit config hash in case it was cached
             if circuit_hash != circuit.checksum():
                 L.error("Inconsistent circuit hash and id, you may need to delete the cache")
                 raise InconsistentSimulations("Inconsistent hash and id")
-            if simulation.is_complete():
+            if probe.is_complete:
                 status = SimulationStatus.COMPLETE
         sim_repr = f"{simulation_id=}, {circuit_id=}, {circuit_hash=}, {simulation_path=}"
         L.debug("Processing simulation: %s", sim_repr)
@@ -86,30 +267,53 @@ class Simulations(BaseExtractor):
         }
 
     @classmethod
-    def _from_paths(cls, simulation_paths: pd.DataFrame) -> pd.DataFrame:
+    def _from_paths(
+        cls,
+        simulation_paths: pd.DataFrame,
+        probe_workers: int = 1,
+        status_cache: Optional[SimulationStatusCache] = None,
+    ) -> pd.DataFrame:
         """Return a dataframe of simulations from a list of simulation paths.
 
         Args:
             simulation_paths: DataFrame containing the simulation paths.
                 Any additional columns besides (simulation_path, simulation_id, circuit_id)
                 are returned unchanged in the resulting DataFrame.
+            probe_workers: number of threads used to load and check the simulations in advance.
+                The ids are always assigned in the same order, so they don't depend on it.
+            status_cache: optional cache of the status of the simulations, updated at the end.
 
         Returns:
             DataFrame of simulations.
         """
         circuit_hashes: dict[str, int] = {}  # map circuit_hash -> circuit_id
         circuits: dict[int, Circuit] = {}  # map circuit_id -> circuit
+        recs = [rec for _, rec in simulation_paths.etl.iterdict()]
+        probes = [
+            _SimulationProbe(rec[SIMULATION_PATH], rec.get(SIMULATION), status_cache=status_cache)
+            for rec in recs
+        ]
+        if probe_workers > 1 and len(probes) > 1:
+            L.info("Loading %s simulations with %s threads", len(probes), probe_workers)
+            with ThreadPoolExecutor(max_workers=probe_workers) as executor:
+                # overlap the access to the file system, since it's the slowest part
+                probes = list(executor.map(_SimulationProbe.prefetch, probes))
         records = []
-        for simulation_id, (_, rec) in enumerate(simulation_paths.etl.iterdict()):
+        for simulation_id, (rec, probe) in enumerate(zip(recs, probes)):
             record = cls._build_record(
                 simulation_id=simulation_id,
                 rec=rec,
+                probe=probe,
                 circuit_hashes=circuit_hashes,
                 circuits=circuits,
             )
             # rec must be first for lower precedence in case of collisions
             records.append({**rec, **record})
         assert len(set(circuit_hashes.values())) == len(circuit_hashes), "Inconsistent circuit ids"
+        if status_cache is not None:
+            for probe in probes:
+                probe.update_status_cache()
+            status_cache.dump()
         return pd.DataFrame(records)
 
     @classmethod
@@ -157,10 +361,22 @@ class Simulations(BaseExtractor):
         return df
 
     @classmethod
-    def from_config(cls, config: SimulationCampaign, query: Optional[dict] = None) -> "Simulations":
+    def from_config(
+        cls,
+        config: SimulationCampaign,
+        query: Optional[dict] = None,
+        probe_workers: int = 1,
+        status_cache: Optional[SimulationStatusCache] = None,
+    ) -> "Simulations":
         """Extract simulations from the given simulation campaign."""
         df = config.get()
-        return cls.from_pandas(df=df, query=query, cached=False)
+        return cls.from_pandas(
+            df=df,
+            query=query,
+            cached=False,
+            probe_workers=probe_workers,
+            status_cache=status_cache,
+        )
 
     @classmethod
     def from_pandas(
@@ -168,10 +384,12 @@ class Simulations(BaseExtractor):
         df: pd.DataFrame,
         query: Optional[dict] = None,
         cached: bool = True,
+        probe_workers: int = 1,
+        status_cache: Optional[SimulationStatusCache] = None,
     ) -> "Simulations":
         """Extract simulations from a dataframe containing valid simulation ids and circuit ids."""
         original_len = len(df)
-        df = cls._from_paths(df)
+        df = cls._from_paths(df, probe_workers=probe_workers, status_cache=status_cache)
         df = cls._filter_simulations_df(df, query, cached=cached)
         filtered = len(df) != original_len
         return cls(df, cached=cached, filtered=filtered)
@@ -1,32 +1,195 @@
 """Spikes extractor."""
 
 import logging
+from collections.abc import Iterator
 from typing import Optional
 
+import numpy as np
 import pandas as pd
-from blueetl_core.utils import smart_concat
 
+from blueetl.adapters.interfaces.simulation import PopulationSpikesReportInterface
 from blueetl.adapters.simulation import SimulationAdapter as Simulation
-from blueetl.constants import CIRCUIT_ID, GID, NEURON_CLASS, SIMULATION_ID, TIME, TRIAL, WINDOW
+from blueetl.constants import (
+    CIRCUIT_ID,
+    GID,
+    NEURON_CLASS,
+    OFFSET,
+    SIMULATION_ID,
+    T_START,
+    T_STOP,
+    TIME,
+    TRIAL,
+    WINDOW,
+)
 from blueetl.extract.report import ReportExtractor
 
 L = logging.getLogger(__name__)
 
 
+def _select_spikes(
+    times: np.ndarray, t_start: np.ndarray, t_stop: np.ndarray
+) -> tuple[np.ndarray, np.ndarray]:
+    """Return the spikes contained in each interval [t_start, t_stop).
+
+    The spike times are sorted only once, and the slice of spikes contained in each interval
+    is found with a binary search, so that the cost doesn't depend on the number of intervals
+    multiplied by the number of spikes.
+
+    Args:
+        times: array of spike times.
+        t_start: array of absolute start times, one for each interval.
+        t_stop: array of absolute stop times, one for each interval.
+
+    Returns:
+        tuple (win_idx, positions), where win_idx contains the index of the interval, and
+        positions the index in times of each selected spike. The selected spikes are ordered
+        by interval, and then by their original position.
+    """
+    is_sorted = len(times) < 2 or bool(np.all(times[1:] >= times[:-1]))
+    order = None if is_sorted else np.argsort(times, kind="stable")
+    sorted_times = times if order is None else times[order]
+    starts = np.searchsorted(sorted_times, t_start, side="left")
+    stops = np.searchsorted(sorted_times, t_stop, side="left")
+    counts = np.maximum(stops - starts, 0)
+    win_idx = np.repeat(np.arange(len(starts)), counts)
+    positions = np.arange(counts.sum()) + np.repeat(starts - (np.cumsum(counts) - counts), counts)
+    if order is not None:
+        positions = order[positions]
+        # restore the original order of the spikes inside each interval,
+        # while win_idx is unchanged because it's already sorted
+        positions = positions[np.lexsort((positions, win_idx))]
+    return win_idx, positions
+
+
+def _iter_chunks(
+    t_start: np.ndarray, t_stop: np.ndarray, chunk_duration: Optional[float]
+) -> Iterator[tuple[float, float]]:
+    """Yield the sorted intervals [t_start, t_stop) covering the union of the given intervals.
+
+    Overlapping or contiguous intervals are merged, and the merged intervals are split in chunks
+    not longer than chunk_duration, if specified. Negative times are ignored.
+    """
+    merged: list[list[float]] = []
+    for start, stop in sorted(zip(t_start.tolist(), t_stop.tolist())):
+        start = max(start, 0.0)
+        if stop <= start:
+            continue
+        if merged and start <= merged[-1][1]:
+            merged[-1][1] = max(merged[-1][1], stop)
+        else:
+            merged.append([start, stop])
+    for start, stop in merged:
+        step = chunk_duration or stop - start
+        while start < stop:
+            yield start, min(start + step, stop)
+            start += step
+
+
+def _read_spikes_in_chunks(
+    report: PopulationSpikesReportInterface,
+    gids,
+    t_start: np.ndarray,
+    t_stop: np.ndarray,
+    chunk_duration: Optional[float],
+) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Read the spikes in chunks, and select the spikes contained in each interval.
+
+    Each chunk is assigned to the intervals before reading the next one, so that the memory
+    needed doesn't depend on the total duration of the simulation.
+
+    Args:
+        report: spikes report of the population.
+        gids: array of gids to be selected.
+        t_start: array of absolute start times, one for each interval.
+        t_stop: array of absolute stop times, one for each interval.
+        chunk_duration: maximum duration of the spikes read at once, or None.
+
+    Returns:
+        tuple (times, gids, win_idx) of the selected spikes, sorted by interval and then by
+        the order of the spikes across the chunks.
+    """
+    # initialize with empty arrays, in case there aren't any chunks
+    selected = [
+        (np.array([], dtype=np.float64), np.array([], dtype=np.int64), np.array([], dtype=np.int64))
+    ]
+    for chunk_start, chunk_stop in _iter_chunks(t_start, t_stop, chunk_duration):
+        spikes = report.get(gids, t_start=chunk_start, t_stop=chunk_stop)
+        selected.append(_select_chunk_spikes(spikes, chunk_stop, t_start=t_start, t_stop=t_stop))
+    times, ids, win_idx = (np.concatenate(arrays) for arrays in zip(*selected))
+    # sort by interval, preserving the order of the spikes across the chunks
+    order = np.argsort(win_idx, kind="stable")
+    return times[order], ids[order], win_idx[order]
+
+
+def _select_chunk_spikes(
+    spikes: pd.Series, chunk_stop: float, t_start: np.ndarray, t_stop: np.ndarray
+) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Return the tuple (times, gids, win_idx) of the spikes of a chunk contained in each interval.
+
+    Args:
+        spikes: spikes read from the report in the interval [chunk_start, chunk_stop].
+        chunk_stop: stop time of the chunk, excluded.
+        t_start: array of absolute start times, one for each interval.
+        t_stop: array of absolute stop times, one for each interval.
+    """
+    # in snap the index is named `times`, and the values `ids`
+    times = spikes.index.to_numpy()
+    gids = spikes.to_numpy()
+    # t_stop is inclusive in the adapters, so exclude the spikes of the next chunk
+    mask = times < chunk_stop
+    times, gids = times[mask], gids[mask]
+    win_idx, positions = _select_spikes(times, t_start=t_start, t_stop=t_stop)
+    return times[positions], gids[positions], win_idx
+
+
 class Spikes(ReportExtractor):
     """Spikes extractor class."""
 
     COLUMNS = [SIMULATION_ID, CIRCUIT_ID, NEURON_CLASS, WINDOW, TRIAL, TIME, GID]
+    # maximum duration of the spikes read at once from the report, or None to read each
+    # interval covered by the windows in a single call
+    CHUNK_DURATION: Optional[float] = 1000.0
+
+    @staticmethod
+    def _build_dataframe(
+        times: np.ndarray, gids: np.ndarray, win_idx: np.ndarray, windows_df: pd.DataFrame
+    ) -> pd.DataFrame:
+        """Return the DataFrame of spikes assigned to the windows referenced by win_idx."""
+        return pd.DataFrame(
+            {
+                TIME: times - windows_df[OFFSET].to_numpy()[win_idx],
+                GID: gids,
+                WINDOW: windows_df[WINDOW].to_numpy()[win_idx],
+                TRIAL: windows_df[TRIAL].to_numpy()[win_idx],
+            }
+        )
 
     @classmethod
-    def _assign_window(cls, df: pd.DataFrame, rec) -> pd.DataFrame:
-        win = cls.calculate_window_slice(rec)
-        df = df[(df[TIME] >= win.t_start) & (df[TIME] < win.t_stop)].copy()
-        df[WINDOW] = win.name
-        df[TRIAL] = win.trial
-        # make the spike times relative to the offset
-        df[TIME] -= win.offset
-        return df
+    def _assign_windows(
+        cls, times: np.ndarray, gids: np.ndarray, windows_df: pd.DataFrame
+    ) -> pd.DataFrame:
+        """Assign the spikes to all the windows and trials in a single pass.
+
+        The resulting rows are ordered by window/trial as in windows_df, and then by the original
+        position of the spikes, to be consistent with filtering each window separately.
+        Overlapping windows are supported, and the same spike can be assigned to multiple windows.
+
+        Args:
+            times: array of spike times.
+            gids: array of gids, with the same length of times.
+            windows_df: windows dataframe with columns [window, trial, offset, t_start, t_stop].
+
+        Returns:
+            pd.DataFrame: dataframe with columns [time, gid, window, trial].
+        """
+        offset = windows_df[OFFSET].to_numpy()
+        # t_start and t_stop are relative to offset
+        win_idx, positions = _select_spikes(
+            times,
+            t_start=offset + windows_df[T_START].to_numpy(),
+            t_stop=offset + windows_df[T_STOP].to_numpy(),
+        )
+        return cls._build_dataframe(times[positions], gids[positions], win_idx, windows_df)
 
     @classmethod
     def _load_values(
@@ -39,6 +202,11 @@ class Spikes(ReportExtractor):
     ) -> pd.DataFrame:
         """Filter and aggregate the spikes in bins according to the given windows.
 
+        Only the spikes in the intervals covered by the windows are read from the report,
+        in chunks of at most CHUNK_DURATION, and each chunk is assigned to the windows
+        before reading the next one. In this way, the memory needed doesn't depend on the
+        total duration of the simulation, but only on the duration of the windows.
+
         Args:
             simulation: simulation containing the SpikeReport of times and gids.
             population: node population name.
@@ -49,9 +217,13 @@ class Spikes(ReportExtractor):
         Returns:
             pd.DataFrame: dataframe with columns [window, time, gid]
         """
-        df = simulation.spikes[population].get(gids).reset_index()
-        # in snap the columns are named `times` and `ids`
-        df.columns.array[0:2] = [TIME, GID]
-        df = smart_concat(cls._assign_window(df, rec) for rec in windows_df.itertuples())
-        df = df.reset_index(drop=True)
-        return df
+        offset = windows_df[OFFSET].to_numpy()
+        # t_start and t_stop are relative to offset
+        times, gids, win_idx = _read_spikes_in_chunks(
+            simulation.spikes[population],
+            gids,
+            t_start=offset + windows_df[T_START].to_numpy(),
+            t_stop=offset + windows_df[T_STOP].to_numpy(),
+            chunk_duration=cls.CHUNK_DURATION,
+        )
+        return cls._build_dataframe(times, gids, win_idx, windows_df)
@@ -1,14 +1,15 @@
 """Windows extractor."""
 
+import json
 import logging
+from functools import cached_property, partial
 from pathlib import Path
-from typing import Any, Optional, Union
+from typing import Any, NamedTuple, Optional, Union
 
 import numpy as np
 import pandas as pd
 
 from blueetl.adapters.circuit import CircuitAdapter as Circuit
-from blueetl.adapters.node_sets import NodeSetsAdapter as NodeSets
 from blueetl.adapters.simulation import SimulationAdapter as Simulation
 from blueetl.config.analysis_model import TrialStepsConfig, WindowConfig
 from blueetl.constants import (
@@ -27,11 +28,125 @@ from blueetl.constants import (
 )
 from blueetl.extract.base import BaseExtractor
 from blueetl.extract.simulations import Simulations
+from blueetl.parallel import run_tasks
 from blueetl.resolver import Resolver
-from blueetl.utils import import_by_string, timed
+from blueetl.utils import checksum_json, import_by_string, mtime_ns, timed
 
 L = logging.getLogger(__name__)
 
+# tolerance used by libsonata when selecting the spikes in the interval [t_start, t_stop]
+TIME_EPSILON = 1e-6
+
+
+# key of the node ids used to calculate the dynamic offsets:
+# (circuit_id, population, node_set, node_sets_file, limit, (simulation_id, window) or None)
+GidsKey = tuple[
+    int, Optional[str], Optional[str], Optional[Path], Optional[int], Optional[tuple[int, str]]
+]
+
+
+class DynamicOffsetsCache:
+    """Dynamic offsets of the windows, stored to file to avoid calculating them again.
+
+    For each simulation path, the offsets are stored by checksum of the parameters used to
+    calculate them, i.e. the trial steps config, the initial offset, and the step offsets.
+    In this way, the offsets aren't calculated again when only other parameters of the windows
+    are changed, as the bounds.
+
+    The path and the modification time of the spikes file are stored for each simulation,
+    and the offsets are valid only if the modification time hasn't changed.
+    """
+
+    _version = 2
+
+    def __init__(self, path: Path) -> None:
+        """Initialize the object, loading the existing entries from file if possible.
+
+        Args:
+            path: path to the JSON file.
+        """
+        self._path = path
+        self._entries: dict[str, dict[str, Any]] = {}
+        self._modified = False
+        if path.exists():
+            try:
+                data = json.loads(path.read_text(encoding="utf-8"))
+            except ValueError:
+                L.warning("Ignoring invalid dynamic offsets file %s", path)
+            else:
+                if data.get("version") == self._version:
+                    self._entries = data["simulations"]
+
+    def get(self, simulation_path: str, checksum: str) -> Optional[float]:
+        """Return the cached dynamic offset, or None if not available or not valid anymore."""
+        entry = self._entries.get(simulation_path)
+        if entry is None or entry["spikes_mtime"] != mtime_ns(entry["spikes_file"]):
+            return None
+        return entry["offsets"].get(checksum)
+
+    def set(
+        self, simulation_path: str, spikes_file: Optional[Path], checksum: str, offset: float
+    ) -> None:
+        """Store the dynamic offset calculated for the given simulation and parameters."""
+        spikes_mtime = mtime_ns(spikes_file)
+        if spikes_mtime is None:
+            return
+        entry = self._entries.get(simulation_path)
+        if entry is None or entry["spikes_mtime"] != spikes_mtime:
+            # any offset calculated with a different spikes file is discarded
+            entry = self._entries[simulation_path] = {
+                "spikes_file": str(spikes_file),
+                "spikes_mtime": spikes_mtime,
+                "offsets": {},
+            }
+        entry["offsets"][checksum] = offset
+        self._modified = True
+
+    def dump(self) -> None:
+        """Write the entries to file, if they have been modified."""
+        if not self._modified:
+            return
+        data = {"version": self._version, "simulations": self._entries}
+        tmp_path = self._path.with_name(f"{self._path.name}.tmp")
+        tmp_path.write_text(json.dumps(data), encoding="utf-8")
+        tmp_path.replace(self._path)
+        self._modified = False
+
+
+class _DynamicOffsetTask(NamedTuple):
+    """Parameters needed to calculate the dynamic offset of a window in a simulation."""
+
+    gids_key: GidsKey
+    initial_offset: float
+    step_offsets: list[float]
+    trial_steps_config: TrialStepsConfig
+
+    def intervals(self) -> list[tuple[float, float]]:
+        """Return the absolute intervals of spikes needed to calculate the offset."""
+        t_start, t_stop = self.trial_steps_config.bounds
+        offsets = [self.initial_offset + step_offset for step_offset in self.step_offsets]
+        return [(offset + t_start, offset + t_stop) for offset in offsets]
+
+
+def _get_step_offsets(win: WindowConfig) -> list[float]:
+    """Return the offsets of the trials, relative to the initial offset of the window."""
+    if win.trial_steps_list:
+        return win.trial_steps_list
+    return [win.trial_steps_value * i for i in range(win.n_trials or 1)]
+
+
+def _dynamic_offset_checksum(
+    win: WindowConfig, step_offsets: list[float], trial_steps_config: TrialStepsConfig
+) -> str:
+    """Return the checksum of the parameters used to calculate the dynamic offset."""
+    return checksum_json(
+        {
+            "trial_steps": trial_steps_config.dict(mode="json"),
+            "initial_offset": win.initial_offset,
+            "step_offsets": step_offsets,
+        }
+    )
+
 
 def _load_dynamic_gids(
     circuit: Circuit,
@@ -40,14 +155,13 @@ def _load_dynamic_gids(
     node_sets_file: Optional[Path],
     limit: Optional[int],
 ) -> np.ndarray:
-    """Return the node ids to consider."""
-    node_set = node_set or None
-    with timed(L.info, "Loading nodes from circuit for dynamic offset"):
-        if node_set and node_sets_file:
-            node_sets = NodeSets.from_file(circuit.node_sets_file)
-            node_sets |= NodeSets.from_file(node_sets_file)
-            node_set = node_sets.instance[node_set]
-        gids = circuit.nodes[population].ids(group=node_set)
+    """Return the node ids to consider.
+
+    The node ids are cached in the circuit, and they must not be modified.
+    """
+    gids = circuit.get_node_ids(
+        population=population, node_set=node_set, node_sets_file=node_sets_file
+    )
     neuron_count = len(gids)
     if limit and neuron_count > limit:
         gids = np.random.choice(gids, size=limit, replace=False)
@@ -55,59 +169,195 @@ def _load_dynamic_gids(
     return gids
 
 
+def _merge_intervals(intervals: list[tuple[float, float]], gap: float) -> list[tuple[float, float]]:
+    """Return the sorted union of the given closed intervals, merging also the close ones.
+
+    Args:
+        intervals: list of intervals (t_start, t_stop).
+        gap: intervals separated by no more than gap are merged.
+    """
+    merged: list[tuple[float, float]] = []
+    for t_start, t_stop in sorted(intervals):
+        if merged and t_start <= merged[-1][1] + gap:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], t_stop))
+        else:
+            merged.append((t_start, t_stop))
+    return merged
+
+
 def _load_dynamic_spikes(
     simulation: Simulation,
     population: Optional[str],
     gids: np.ndarray,
-    offset: float,
-    t_start: float,
-    t_stop: float,
+    intervals: list[tuple[float, float]],
 ) -> np.ndarray:
-    """Return the spikes extracted for the given parameters."""
-    spikes = (
-        simulation.spikes[population]
-        .get(gids, t_start=offset + t_start, t_stop=offset + t_stop)
-        .index.to_numpy()
-    )
-    spikes -= offset
-    L.info("Selected %s spikes", len(spikes))
-    return spikes
+    """Return the sorted times of the spikes contained in any of the given closed intervals.
 
+    The overlapping intervals are merged, so the same spikes are never read more than once.
+    The intervals closer than the tolerance used when reading are merged as well, because
+    they would share some spikes.
+    """
+    report = simulation.spikes[population]
+    parts = [
+        report.get(gids, t_start=t_start, t_stop=t_stop).index.to_numpy()
+        for t_start, t_stop in _merge_intervals(intervals, gap=2 * TIME_EPSILON)
+    ]
+    times = np.concatenate(parts) if parts else np.array([], dtype=np.float64)
+    times.sort(kind="stable")
+    L.info("Selected %s spikes", len(times))
+    return times
 
-def _calculate_dynamic_offset(
-    simulation: Simulation,
-    circuit: Circuit,
-    initial_offset: float,
-    step_offsets: list[float],
-    trial_steps_config: TrialStepsConfig,
-) -> float:
-    """Calculate the dynamic offset according to NSETM-2281."""
-    # circuit is passed explicitly instead of loading it from simulation.circuit
-    # to take advantage of any data already loaded and cached
-    gids = _load_dynamic_gids(
-        circuit=circuit,
-        population=trial_steps_config.population,
-        node_set=trial_steps_config.node_set,
-        node_sets_file=trial_steps_config.node_sets_file,
-        limit=trial_steps_config.limit,
-    )
+
+def _calculate_dynamic_offset(times: np.ndarray, task: _DynamicOffsetTask) -> float:
+    """Calculate the dynamic offset of a window, selecting the spikes of each trial from times."""
     spikes_list = []
-    t_start, t_stop = trial_steps_config.bounds
-    for step_offset in step_offsets:
-        spikes = _load_dynamic_spikes(
+    for step_offset, (t_start, t_stop) in zip(task.step_offsets, task.intervals()):
+        offset = task.initial_offset + step_offset
+        # select the same spikes that would be read from the interval
+        first = np.searchsorted(times, t_start - TIME_EPSILON, side="left")
+        last = np.searchsorted(times, t_stop + TIME_EPSILON, side="right")
+        spikes_list.append(times[first:last] - offset)
+    config = task.trial_steps_config
+    func = import_by_string(config.function)
+    result = func(spikes_list, config.dict())
+    if not np.issubdtype(type(result), np.number):
+        raise ValueError(f"The function {config.function} must return a number")
+    return float(result)
+
+
+def _calculate_dynamic_offsets(
+    simulation: Simulation,
+    gids_by_key: dict[GidsKey, np.ndarray],
+    tasks: list[_DynamicOffsetTask],
+) -> list[float]:
+    """Calculate the dynamic offsets of the windows of a simulation according to NSETM-2281.
+
+    The spikes are read only once for all the tasks using the same node ids, and then they are
+    selected in memory for each task and step offset.
+    """
+    times_by_key = {
+        key: _load_dynamic_spikes(
             simulation=simulation,
-            population=trial_steps_config.population,
-            gids=gids,
-            offset=initial_offset + step_offset,
-            t_start=t_start,
-            t_stop=t_stop,
+            population=key[1],
+            gids=gids_by_key[key],
+            intervals=[i for task in tasks if task.gids_key == key for i in task.intervals()],
         )
-        spikes_list.append(spikes)
-    func = import_by_string(trial_steps_config.function)
-    result = func(spikes_list, trial_steps_config.dict())
-    if not np.issubdtype(type(result), np.number):
-        raise ValueError(f"The function {trial_steps_config.function} must return a number")
-    return result
+        for key in dict.fromkeys(task.gids_key for task in tasks)
+    }
+    return [_calculate_dynamic_offset(times_by_key[task.gids_key], task) for task in tasks]
+
+
+class _DynamicOffsetsCalculator:
+    """Calculator of the dynamic offsets of the windows in all the simulations.
+
+    The windows are added one by one, and the offsets not found in the cache are calculated
+    together at the end, in parallel for each simulation.
+
+    The node ids are loaded in the main process, so that the random selection is reproducible
+    when the seed is set. Without limit, they are loaded only once for each circuit and trial steps
+    config. With limit, they are selected randomly for each simulation and window, in the same
+    order as the windows are added, and the offsets aren't cached because they depend on the
+    random selection.
+    """
+
+    def __init__(self, offsets_cache: Optional[DynamicOffsetsCache]) -> None:
+        """Initialize the object.
+
+        Args:
+            offsets_cache: optional cache of the dynamic offsets, updated at the end.
+        """
+        self._offsets_cache = offsets_cache
+        self._dynamic_offsets: dict[tuple[int, str], float] = {}
+        self._gids_by_key: dict[GidsKey, np.ndarray] = {}
+        # simulation_id -> list of (window, cache key, task)
+        self._pending: dict[
+            int, list[tuple[str, Optional[tuple[str, str]], _DynamicOffsetTask]]
+        ] = {}
+        self._simulations: dict[int, Simulation] = {}
+
+    def add(self, rec: Any, window: str, win: WindowConfig, config: TrialStepsConfig) -> None:
+        """Add a window of a simulation, using the cached offset if available.
+
+        Args:
+            rec: row from simulations DataFrame.
+            window: name of the window.
+            win: window configuration.
+            config: trial steps configuration of the window.
+        """
+        step_offsets = _get_step_offsets(win)
+        cache_key = None
+        if self._offsets_cache is not None and not config.limit:
+            cache_key = (rec.simulation_path, _dynamic_offset_checksum(win, step_offsets, config))
+            cached_offset = self._offsets_cache.get(*cache_key)
+            if cached_offset is not None:
+                self._dynamic_offsets[rec.simulation_id, window] = cached_offset
+                return
+        gids_key = (
+            rec.circuit_id,
+            config.population,
+            config.node_set or None,
+            config.node_sets_file,
+            config.limit,
+            (rec.simulation_id, window) if config.limit else None,
+        )
+        if gids_key not in self._gids_by_key:
+            with timed(L.info, "Loading nodes from circuit for dynamic offset"):
+                self._gids_by_key[gids_key] = _load_dynamic_gids(
+                    circuit=rec.circuit,
+                    population=config.population,
+                    node_set=config.node_set,
+                    node_sets_file=config.node_sets_file,
+                    limit=config.limit,
+                )
+        task = _DynamicOffsetTask(gids_key, win.initial_offset, step_offsets, config)
+        self._pending.setdefault(rec.simulation_id, []).append((window, cache_key, task))
+        self._simulations[rec.simulation_id] = rec.simulation
+
+    def calculate(self) -> dict[tuple[int, str], float]:
+        """Calculate the offsets not cached, and return all the offsets by (simulation_id, window).
+
+        The cache is updated and written to file, if needed.
+        """
+        funcs = [
+            partial(
+                _calculate_dynamic_offsets,
+                simulation=self._simulations[simulation_id],
+                gids_by_key={task.gids_key: self._gids_by_key[task.gids_key] for *_, task in items},
+                tasks=[task for *_, task in items],
+            )
+            for simulation_id, items in self._pending.items()
+        ]
+        if len(funcs) > 1:
+            # read the spikes of different simulations in subprocesses
+            results = run_tasks(funcs)
+        else:
+            results = [f() for f in funcs]
+        for (simulation_id, items), offsets in zip(self._pending.items(), results):
+            for (window, cache_key, _), dynamic_offset in zip(items, offsets):
+                self._dynamic_offsets[simulation_id, window] = dynamic_offset
+                if self._offsets_cache is not None and cache_key is not None:
+                    self._offsets_cache.set(
+                        cache_key[0],
+                        spikes_file=self._simulations[simulation_id].spikes_file,
+                        checksum=cache_key[1],
+                        offset=dynamic_offset,
+                    )
+        if self._offsets_cache is not None:
+            self._offsets_cache.dump()
+        return self._dynamic_offsets
+
+
+class WindowIndex(NamedTuple):
+    """Metadata of a window, and offsets of its trials in each simulation."""
+
+    t_start: float
+    t_stop: float
+    duration: float
+    n_trials: int
+    # sorted array of the simulation ids
+    simulation_ids: np.ndarray
+    # 2D array of the offsets by position of the simulation id and by trial, or nan if undefined
+    offsets: np.ndarray
 
 
 class Windows(BaseExtractor):
@@ -166,26 +416,13 @@ class Windows(BaseExtractor):
         name: str,
         rec: Any,  # row from simulations DataFrame
         win: WindowConfig,
-        trial_steps_config: Optional[TrialStepsConfig],
+        dynamic_offset: float,
     ) -> list[dict[str, Any]]:
         """Load the records from the window configuration."""
         t_start, t_stop = win.bounds
         t_step = win.t_step
         duration = t_stop - t_start
-        if win.trial_steps_list:
-            step_offsets = win.trial_steps_list
-        else:
-            step_offsets = [win.trial_steps_value * i for i in range(win.n_trials or 1)]
-        if trial_steps_config:
-            dynamic_offset = _calculate_dynamic_offset(
-                simulation=rec.simulation,
-                circuit=rec.circuit,
-                initial_offset=win.initial_offset,
-                step_offsets=step_offsets,
-                trial_steps_config=trial_steps_config,
-            )
-        else:
-            dynamic_offset = 0.0
+        step_offsets = _get_step_offsets(win)
         L.info(
             "Using window=%s, initial_offset=%s, dynamic_offset=%s, step_offsets=%s, "
             "t_start=%s, t_stop=%s, t_step=%s, duration=%s",
@@ -214,6 +451,26 @@ class Windows(BaseExtractor):
             for index, step_offset in enumerate(step_offsets)
         ]
 
+    @classmethod
+    def _get_dynamic_offsets(
+        cls,
+        simulations_df: pd.DataFrame,
+        windows_config: dict[str, Union[str, WindowConfig]],
+        trial_steps_config: dict[str, TrialStepsConfig],
+        offsets_cache: Optional[DynamicOffsetsCache],
+    ) -> dict[tuple[int, str], float]:
+        """Return the dynamic offsets as a dict (simulation_id, window) -> dynamic_offset.
+
+        The offsets not found in the cache are calculated in parallel for each simulation.
+        """
+        calculator = _DynamicOffsetsCalculator(offsets_cache)
+        for _, rec in simulations_df.etl.iter():
+            for name, win in windows_config.items():
+                if isinstance(win, str) or not win.trial_steps_label:
+                    continue
+                calculator.add(rec, name, win, trial_steps_config[win.trial_steps_label])
+        return calculator.calculate()
+
     @classmethod
     def from_simulations(
         cls,
@@ -221,6 +478,7 @@ class Windows(BaseExtractor):
         windows_config: dict[str, Union[str, WindowConfig]],
         trial_steps_config: dict[str, TrialStepsConfig],
         resolver: Resolver,
+        offsets_cache: Optional[DynamicOffsetsCache] = None,
     ) -> "Windows":
         """Return a new Windows instance from the given simulations and configuration.
 
@@ -229,12 +487,20 @@ class Windows(BaseExtractor):
             windows_config: configuration dict.
             trial_steps_config: configuration dict.
             resolver: resolver instance.
+            offsets_cache: optional cache of the dynamic offsets, updated at the end.
 
         Returns:
             Windows: new instance.
         """
+        simulations_df = simulations.df
+        dynamic_offsets = cls._get_dynamic_offsets(
+            simulations_df=simulations_df,
+            windows_config=windows_config,
+            trial_steps_config=trial_steps_config,
+            offsets_cache=offsets_cache,
+        )
         results = []
-        for _, rec in simulations.df.etl.iter():
+        for _, rec in simulations_df.etl.iter():
             for name, win in windows_config.items():
                 L.info(
                     "Processing simulation_id=%s, circuit_id=%s, window=%s",
@@ -255,31 +521,81 @@ class Windows(BaseExtractor):
                         name=name,
                         win=win,
                         rec=rec,
-                        trial_steps_config=(
-                            trial_steps_config[win.trial_steps_label]
-                            if win.trial_steps_label
-                            else None
-                        ),
+                        dynamic_offset=dynamic_offsets.get((rec.simulation_id, name), 0.0),
                     )
                 results.extend(partial_results)
 
         df = pd.DataFrame(results)
         return cls(df, cached=False, filtered=False)
 
+    @cached_property
+    def window_index(self) -> dict[str, WindowIndex]:
+        """Return a dict window -> WindowIndex, to look up the windows without filtering the df.
+
+        The index is built only once, and it's small compared to the df,
+        so it can be built before pickling the object to be sent to the subprocesses.
+        """
+        result = {}
+        for window, group in self.df.groupby(WINDOW, observed=True, sort=False):
+            simulation_ids, rows = np.unique(group[SIMULATION_ID].to_numpy(), return_inverse=True)
+            trials = group[TRIAL].to_numpy()
+            n_trials = int(trials.max()) + 1
+            offsets = np.full((len(simulation_ids), n_trials), np.nan)
+            offsets[rows, trials] = group[OFFSET].to_numpy()
+            first = group.iloc[0]
+            result[str(window)] = WindowIndex(
+                t_start=float(first[T_START]),
+                t_stop=float(first[T_STOP]),
+                duration=float(first[DURATION]),
+                n_trials=n_trials,
+                simulation_ids=simulation_ids,
+                offsets=offsets,
+            )
+        return result
+
     def get_bounds(self, window: str) -> tuple[float, float]:
         """Return the interval (t_start, t_stop) for the specified window.
 
         The returned values don't depend on the simulation or the trial,
         because they are relative the offset, that is the only changing value.
         """
-        rec = self.df.etl.first(window=window)
-        t_start, t_stop = rec[[T_START, T_STOP]]
-        return t_start, t_stop
+        index = self.window_index[window]
+        return index.t_start, index.t_stop
 
     def get_duration(self, window: str) -> float:
         """Return the duration of the specified window."""
-        return self.df.etl.first(window=window)[DURATION]
+        return self.window_index[window].duration
 
     def get_number_of_trials(self, window: str) -> int:
         """Return the number of trials for the specified window."""
-        return np.max(self.df.etl.q(window=window)[TRIAL]) + 1
+        return self.window_index[window].n_trials
+
+    def get_offsets(
+        self, window: str, simulation_ids: np.ndarray, trials: np.ndarray
+    ) -> np.ndarray:
+        """Return the offsets of the specified window for the given simulation ids and trials.
+
+        Args:
+            window: name of the window.
+            simulation_ids: array of simulation ids, broadcast together with trials.
+            trials: array of trials, broadcast together with simulation_ids.
+
+        Returns:
+            array of offsets, with the same shape of the broadcast simulation_ids and trials.
+
+        Raises:
+            KeyError: if any offset isn't defined for the given window.
+        """
+        index = self.window_index[window]
+        simulation_ids, trials = np.broadcast_arrays(
+            np.asarray(simulation_ids, dtype=np.int64), np.asarray(trials, dtype=np.int64)
+        )
+        # the window index contains at least one simulation
+        rows = np.searchsorted(index.simulation_ids, simulation_ids)
+        rows = np.minimum(rows, len(index.simulation_ids) - 1)
+        valid = (index.simulation_ids[rows] == simulation_ids) & (trials >= 0)
+        valid &= trials < index.n_trials
+        offsets = index.offsets[rows, np.where(valid, trials, 0)]
+        if not np.all(valid) or np.any(np.isnan(offsets)):
+            raise KeyError(f"Some offsets are not defined for window {window}")
+        return offsets
@@ -1,11 +1,13 @@
 """Features collection."""
 
 import logging
+import tempfile
 from collections import Counter, defaultdict
-from collections.abc import Iterator
+from collections.abc import Iterator, Mapping
 from copy import deepcopy
 from dataclasses import dataclass
-from functools import cached_property
+from functools import cached_property, partial
+from pathlib import Path
 from typing import Any, NamedTuple, Optional, Union
 
 import pandas as pd
@@ -14,13 +16,22 @@ from blueetl_core.utils import smart_concat
 from blueetl.cache import CacheManager
 from blueetl.config.analysis_model import FeaturesConfig
 from blueetl.constants import SIMULATION_ID
-from blueetl.extract.feature import Feature
-from blueetl.parallel import merge_filter
-from blueetl.repository import Repository
-from blueetl.utils import all_equal, ensure_dtypes, extract_items, import_by_string, timed
+from blueetl.extract.feature import (
+    Feature,
+    FeatureLoader,
+    FeaturesLRU,
+    FeaturesSink,
+    LazyFeature,
+)
+from blueetl.parallel import TRANSPORT_SHARED, SharedObject, WorkerPool, merge_filter
+from blueetl.repository import Repository, RepositoryContext
+from blueetl.utils import all_equal, extract_items, import_by_string, timed
 
 L = logging.getLogger(__name__)
 
+# minimum number of rows of the concatenated features written to disk while they are calculated
+CHUNK_ROWS = 1_000_000
+
 
 class ConcatenatedFeatures:
     """ConcatenatedFeatures class.
@@ -140,6 +151,8 @@ class FeaturesCollection:
         features_configs: list[FeaturesConfig],
         repo: Repository,
         cache_manager: CacheManager,
+        lazy: bool = False,
+        memory_budget: Optional[int] = None,
     ) -> None:
         """Initialize the FeaturesCollection from the given list of configurations.
 
@@ -147,11 +160,17 @@ class FeaturesCollection:
             features_configs: list of features configuration dicts.
             repo: Repository instance.
             cache_manager: CacheManager instance.
+            lazy: if True, the cached features are loaded only when accessed for the first time.
+            memory_budget: maximum number of bytes used by the lazy features loaded in memory,
+                or None for no limit. The least recently used features exceeding the budget
+                are removed from memory, and they are loaded again from the cache when needed.
         """
         self._features_configs = features_configs
         self._repo = repo
         self._cache_manager = cache_manager
-        self._data: dict[str, Feature] = {}
+        self._lazy = lazy
+        self._lru = FeaturesLRU(memory_budget=memory_budget)
+        self._data: dict[str, Union[Feature, LazyFeature]] = {}
         self._concatenated_features: dict[str, ConcatenatedFeatures] = {}
 
     @property
@@ -166,7 +185,7 @@ class FeaturesCollection:
         """Access to the cache manager."""
         return self._cache_manager
 
-    def __getattr__(self, name: str) -> Union[Feature, ConcatenatedFeatures]:
+    def __getattr__(self, name: str) -> Union[Feature, LazyFeature, ConcatenatedFeatures]:
         """Return the features by name.
 
         It mimics the behaviour of Repository, where each Extractor can be accessed by attribute.
@@ -184,7 +203,7 @@ class FeaturesCollection:
         """Allow autocompletion of dynamic attributes."""
         return list(super().__dir__()) + list(self._data) + list(self._concatenated_features)
 
-    def _update_features(self, mapping: dict[str, Feature]) -> None:
+    def _update_features(self, mapping: Mapping[str, Union[Feature, LazyFeature]]) -> None:
         if overlapping := set(mapping).intersection(self._data):
             raise RuntimeError(
                 f"Overlapping features dataframes aren't allowed: {sorted(overlapping)}"
@@ -226,19 +245,26 @@ class FeaturesCollection:
             return
 
         def _process_features(
-            features_config: FeaturesConfig, features: dict[str, Feature]
+            features_config: FeaturesConfig,
+            features: Mapping[str, Union[Feature, LazyFeature]],
+            filtered: bool = False,
         ) -> None:
-            """Update the features of the instance, and write the cache if needed."""
+            """Update the features of the instance, and write the cache if needed.
+
+            If filtered is True, the features have been filtered while loading them from the cache.
+            """
             self._update_features(features)
             self._update_concatenated_features(list(features), features_config)
             to_be_written: dict[str, pd.DataFrame] = {}
             for name, f in features.items():
-                if not f._cached or f._filtered:  # pylint: disable=protected-access
+                if not f._cached or f._filtered or filtered:  # pylint: disable=protected-access
                     to_be_written[name] = f.to_pandas()
             if to_be_written:
                 self.cache_manager.dump_features(to_be_written, features_config=features_config)
 
-        def _log_features(features: dict[str, Feature], n: int, tot: int, features_id) -> None:
+        def _log_features(
+            features: Mapping[str, Union[Feature, LazyFeature]], n: int, tot: int, features_id
+        ) -> None:
             """Log a message about the features being processed."""
             msg = "\n".join(
                 # pylint: disable=protected-access
@@ -270,19 +296,26 @@ class FeaturesCollection:
                 query = None
                 if self._repo.cache_manager.features_cache_needs_filter(features_config):
                     query = {SIMULATION_ID: self._repo.simulation_ids}
-                df_dict = self.cache_manager.load_features(features_config=features_config)
+                elif self._lazy:
+                    # the filtered features must be written to the cache, so they cannot be lazy
+                    features = _lazy_features(
+                        features_config, cache_manager=self.cache_manager, lru=self._lru
+                    )
+                    _process_features(features_config, features)
+                    _log_features(features, n, len(cached), features_config.id)
+                    continue
+                df_dict = self.cache_manager.load_features(
+                    features_config=features_config, query=query
+                )
                 features = _calculate_cached(features_config, df_dict, query=query)
-                _process_features(features_config, features)
+                _process_features(features_config, features, filtered=query is not None)
                 _log_features(features, n, len(cached), features_config.id)
 
         def _process_new_features(groups: dict[FeaturesConfigKey, list[FeaturesConfig]]) -> None:
-            for num, (features_configs_key, features_configs_list) in enumerate(groups.items(), 1):
-                L.info("Considering group: %s/%s, key: %s", num, len(groups), features_configs_key)
-                for n, (features_config, features) in enumerate(
-                    _calculate_new(self._repo, features_configs_key, features_configs_list), 1
-                ):
-                    _process_features(features_config, features)
-                    _log_features(features, n, len(features_configs_list), features_config.id)
+            tot = sum(len(features_configs_list) for features_configs_list in groups.values())
+            for n, (features_config, features) in enumerate(_calculate_new(self._repo, groups), 1):
+                _process_features(features_config, features)
+                _log_features(features, n, tot, features_config.id)
 
         with timed(L.info, "Step 1: grouping features by attributes"):
             features_configs_cached, features_configs_groups = _group_features_by_attributes()
@@ -309,10 +342,28 @@ class FilteredFeaturesCollection(FeaturesCollection):
             features_configs=parent._features_configs,
             repo=repo,
             cache_manager=parent.cache_manager.to_readonly(),
+            lazy=parent._lazy,
+            memory_budget=parent._lru.memory_budget,
         )
-        dataframes = {name: features.df for name, features in parent._data.items()}
         query = {SIMULATION_ID: repo.simulation_ids}
-        self._data = _dataframes_to_features(dataframes, config=None, cached=True, query=query)
+        dataframes = {
+            name: features.df
+            for name, features in parent._data.items()
+            if not isinstance(features, LazyFeature)
+        }
+        self._data = {
+            **_dataframes_to_features(dataframes, config=None, cached=True, query=query),
+            **{
+                name: LazyFeature(
+                    name,
+                    loader=_filtered_loader(features, query=query),
+                    config=features.config,
+                    lru=self._lru,
+                )
+                for name, features in parent._data.items()
+                if isinstance(features, LazyFeature)
+            },
+        }
         self._concatenated_features = self._clone_concatenated_features(
             parent._concatenated_features
         )
@@ -349,6 +400,31 @@ def _dataframes_to_features(
     return result
 
 
+def _lazy_features(
+    features_config: FeaturesConfig, cache_manager: CacheManager, lru: FeaturesLRU
+) -> dict[str, Union[Feature, LazyFeature]]:
+    """Return handles of cached features, loaded from the cache only when needed."""
+    config = features_config.dict()
+    return {
+        name: LazyFeature(
+            name, loader=partial(cache_manager.load_feature, name), config=config, lru=lru
+        )
+        for name in cache_manager.get_cached_features_checksums(features_config)
+    }
+
+
+def _filtered_loader(feature: LazyFeature, query: dict) -> FeatureLoader:
+    """Return a loader of the given lazy features, filtered by query."""
+
+    def _loader(
+        other_query: Optional[dict[str, Any]], columns: Optional[list[str]]
+    ) -> pd.DataFrame:
+        df = feature.load(query=query, columns=columns)
+        return df.etl.q(other_query) if other_query else df
+
+    return _loader
+
+
 def _calculate_cached(
     features_config: FeaturesConfig,
     df_dict: dict[str, pd.DataFrame],
@@ -359,22 +435,41 @@ def _calculate_cached(
 
 
 def _calculate_new(
-    repo: Repository,
-    features_configs_key: FeaturesConfigKey,
-    features_configs_list: list[FeaturesConfig],
+    repo: Repository, groups: dict[FeaturesConfigKey, list[FeaturesConfig]]
 ) -> Iterator[tuple[FeaturesConfig, dict[str, Feature]]]:
-    """Calculate new features and yield tuples."""
-    results = calculate_features(
-        repo=repo,
-        features_configs_key=features_configs_key,
-        features_configs_list=features_configs_list,
-    )
-    assert len(features_configs_list) == len(results)
-    for features_config, df_dict in zip(features_configs_list, results):
-        features = _dataframes_to_features(
-            df_dict, config=features_config, cached=False, query=None
+    """Calculate new features and yield tuples, in the same order as the configurations.
+
+    When a WorkerPool is active, the groups are calculated concurrently, so that the tasks of the
+    following groups are executed by the subprocesses while the previous groups are completed.
+    """
+
+    def _func(
+        num: int,
+        features_configs_key: FeaturesConfigKey,
+        features_configs_list: list[FeaturesConfig],
+    ) -> list[dict[str, pd.DataFrame]]:
+        L.info("Considering group: %s/%s, key: %s", num, len(groups), features_configs_key)
+        return calculate_features(
+            repo=repo,
+            features_configs_key=features_configs_key,
+            features_configs_list=features_configs_list,
         )
-        yield features_config, features
+
+    funcs = [partial(_func, num, *item) for num, item in enumerate(groups.items(), 1)]
+    pool = WorkerPool.active()
+    if pool is None:
+        results_by_group = (func() for func in funcs)
+    else:
+        # the dataframes must be extracted before being accessed by concurrent threads
+        repo.extract()
+        results_by_group = pool.run_concurrently(funcs)
+    for features_configs_list, results in zip(groups.values(), results_by_group):
+        assert len(features_configs_list) == len(results)
+        for features_config, df_dict in zip(features_configs_list, results):
+            features = _dataframes_to_features(
+                df_dict, config=features_config, cached=False, query=None
+            )
+            yield features_config, features
 
 
 def _func_wrapper(
@@ -441,13 +536,18 @@ def calculate_features(
     def _func(key: NamedTuple, df_list: list[pd.DataFrame]) -> list[dict[str, pd.DataFrame]]:
         """Should be called in a subprocess to execute the wrapper function."""
         neurons_df, windows_df, report_df = df_list
+        # the context is loaded only once in each subprocess
+        repo_context = shared_context.get()
+        if to_long is not None:
+            # convert only the blocks of the report needed by the group
+            report_df = to_long(report_df)
         return [
             _func_wrapper(
                 key=key,
                 neurons_df=neurons_df,
                 windows_df=windows_df,
                 report_df=report_df,
-                repo=repo,
+                repo=repo_context,
                 features_config=features_config,
             )
             for features_config in features_configs_list
@@ -458,55 +558,75 @@ def calculate_features(
         return df.etl.q({key: value}) if value else df
 
     def _concatenate_all(
-        it: Iterator[list[dict[str, pd.DataFrame]]]
+        it: Iterator[tuple[int, list[dict[str, pd.DataFrame]]]], tmpdir: Path
     ) -> list[dict[str, pd.DataFrame]]:
         """Concatenate all the dataframes having the same feature_group label.
 
         Args:
-            it: iterator yielding lists of dict of DataFrames, where the number of lists is equal
+            it: iterator yielding tuples (n_group, lst) in any order, where n_group is the position
+                of the group, and lst is a list of dict of DataFrames. The number of lists is equal
                 to the number of groups determined by features_configs_key, and the number of dicts
                 in each list is equal to the number of FeaturesConfig in features_configs_list.
+            tmpdir: temporary directory where the concatenated chunks can be written.
 
         Returns:
-            list of DataFrames obtained by the concatenation of the partial DataFrames.
+            list of DataFrames obtained by the concatenation of the partial DataFrames,
+            in the same order as if the groups were received in order.
         """
-        tmp_result: list[dict[str, list[pd.DataFrame]]] = [
-            defaultdict(list) for _ in range(len(features_configs_list))
-        ]
-        for n_group, lst in enumerate(it):
+        tmp_result: list[dict[str, FeaturesSink]] = [{} for _ in range(len(features_configs_list))]
+        # position of the first group and dict item of each feature_group, to sort the results
+        first_seen: list[dict[str, tuple[int, int]]] = [{} for _ in range(len(tmp_result))]
+        for n_group, lst in it:
             # lst is the list of dicts returned by _func, and it contains one dict for each config
             assert len(lst) == len(tmp_result)
             for n_config, df_dict in enumerate(lst):
                 # to concatenate across the groups the DataFrames contained in each dict,
-                # append tmp_df to the list holding all the other tmp_df of the same type
+                # append tmp_df to the sink receiving all the other tmp_df of the same type
                 partial_result = tmp_result[n_config]
-                for feature_group, tmp_df in df_dict.items():
+                for n_item, (feature_group, tmp_df) in enumerate(df_dict.items()):
                     L.debug(
                         "Iterating over group=%s, config=%s, feature_group=%s",
                         n_group,
                         n_config,
                         feature_group,
                     )
-                    partial_result[feature_group].append(tmp_df)
-        # finally, build the dicts of DataFrames in a single concat operation
+                    if feature_group not in partial_result:
+                        path = tmpdir / f"features_{n_config}_{len(partial_result)}.arrow"
+                        partial_result[feature_group] = FeaturesSink(path, chunk_rows=CHUNK_ROWS)
+                    seen = first_seen[n_config]
+                    seen[feature_group] = min(
+                        seen.get(feature_group, (n_group, n_item)), (n_group, n_item)
+                    )
+                    partial_result[feature_group].append(tmp_df, key=n_group)
+        # finally, build the dicts of DataFrames from the concatenated chunks
         return [
             {
-                feature_group: ensure_dtypes(smart_concat(df_list))
-                for feature_group, df_list in dct.items()
+                feature_group: dct[feature_group].to_pandas()
+                for feature_group in sorted(dct, key=seen.__getitem__)
             }
-            for dct in tmp_result
+            for dct, seen in zip(tmp_result, first_seen)
         ]
 
     key = features_configs_key
-    return _concatenate_all(
-        merge_filter(
-            df_list=[
-                _filter_by_value(repo.neurons.df, "neuron_class", value=key.neuron_classes),
-                _filter_by_value(repo.windows.df, "window", value=key.windows),
-                repo.report.df,
-            ],
-            groupby=key.groupby,
-            func=_func,
-            parallel=True,
+    report_df = repo.report.df if repo.report.wide_df is None else repo.report.wide_df
+    to_long = None if repo.report.wide_df is None else repo.report.to_long
+    with tempfile.TemporaryDirectory(prefix="blueetl_") as tmpdir:
+        # the repository is pickled only once, instead of being serialized with each task
+        shared_context = SharedObject.from_object(
+            RepositoryContext(repo), path=Path(tmpdir, "context.pkl")
+        )
+        return _concatenate_all(
+            merge_filter(
+                df_list=[
+                    _filter_by_value(repo.neurons.df, "neuron_class", value=key.neuron_classes),
+                    _filter_by_value(repo.windows.df, "window", value=key.windows),
+                    report_df,
+                ],
+                groupby=key.groupby,
+                func=_func,
+                parallel=True,
+                transport=TRANSPORT_SHARED,
+                ordered=False,
+            ),
+            tmpdir=Path(tmpdir),
         )
-    )
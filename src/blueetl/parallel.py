@@ -1,20 +1,380 @@
 """Parallelization utilities."""
 
+import importlib
 import logging
-from collections import namedtuple
-from collections.abc import Callable, Iterator
+import os
+import pickle
+import tempfile
+from collections import deque, namedtuple
+from collections.abc import Callable, Iterable, Iterator
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import AbstractContextManager, contextmanager, nullcontext
 from functools import partial
+from pathlib import Path
 from types import SimpleNamespace
-from typing import Any, NamedTuple
+from typing import Any, NamedTuple, Optional, Union
 
+import numpy as np
 import pandas as pd
-from blueetl_core.parallel import Task, run_parallel
-from blueetl_core.utils import CachedDataFrame
+import pyarrow as pa
+from blueetl_core.constants import (
+    BLUEETL_JOBLIB_BACKEND,
+    BLUEETL_JOBLIB_JOBS,
+    BLUEETL_JOBLIB_VERBOSE,
+)
+from blueetl_core.parallel import Task, TaskContext, run_parallel
+from joblib import Parallel, delayed, parallel_config
+from joblib.externals.loky import get_reusable_executor
 
 from blueetl.constants import CIRCUIT_ID, SIMULATION_ID
+from blueetl.store.base import columns_to_index, index_to_columns
 
 L = logging.getLogger(__name__)
 
+# transport used to send the filtered DataFrames to the subprocesses
+TRANSPORT_PICKLE = "pickle"
+TRANSPORT_SHARED = "shared"
+
+
+class WorkerPool:
+    """Pool of subprocesses reused by all the parallel tasks executed while the pool is active.
+
+    Without an active pool, the subprocesses are shut down at the end of each parallel call.
+    When a pool is active, they are kept alive instead, so that the following calls can reuse
+    them without starting new processes and importing the same modules again.
+    The subprocesses are shut down when the pool is closed.
+
+    The given modules are imported by each subprocess as soon as it's started, so that the first
+    tasks don't need to import them. This is supported only with the default loky backend.
+
+    All the parallel tasks submitted while the pool is active, from any thread, are scheduled
+    in the same queue. The functions passed to ``run_concurrently`` are called in separate threads,
+    so that the tasks submitted by the following functions can be executed by the subprocesses
+    while the last tasks of the previous functions are being completed.
+
+    The objects loaded through SharedObject are not kept by the subprocesses after the end of the
+    call using them, since they are released before running any other task.
+    """
+
+    _active: Optional["WorkerPool"] = None
+
+    def __init__(self, modules: Iterable[str] = (), max_concurrent_calls: int = 2) -> None:
+        """Initialize the object.
+
+        Args:
+            modules: names of the modules to be imported when the subprocesses are started.
+            max_concurrent_calls: maximum number of functions called at the same time by
+                ``run_concurrently``.
+        """
+        self._modules = tuple(sorted(set(modules)))
+        self._max_concurrent_calls = max_concurrent_calls
+        self._used = False
+        self._closed = False
+
+    @classmethod
+    def active(cls) -> Optional["WorkerPool"]:
+        """Return the active pool, or None if no pool is active."""
+        return cls._active
+
+    @property
+    def closed(self) -> bool:
+        """Return True if the pool has been closed."""
+        return self._closed
+
+    @property
+    def modules(self) -> tuple[str, ...]:
+        """Return the names of the modules imported when the subprocesses are started."""
+        return self._modules
+
+    @contextmanager
+    def activate(self) -> Iterator["WorkerPool"]:
+        """Activate the pool in the context, restoring the previous active pool on exit."""
+        if self._closed:
+            raise RuntimeError("The pool has been closed")
+        previous = WorkerPool._active
+        WorkerPool._active = self
+        try:
+            yield self
+        finally:
+            WorkerPool._active = previous
+
+    def _parallel_config(self) -> AbstractContextManager:
+        """Return the context where the new subprocesses import the modules when started.
+
+        The joblib configuration is local to the current thread, so it's set for each call.
+        """
+        if not self._modules or os.getenv(BLUEETL_JOBLIB_BACKEND):
+            return nullcontext()
+        return parallel_config(
+            backend="loky", initializer=_import_modules, initargs=(self._modules,)
+        )
+
+    def run(self, tasks: Iterable[Task]) -> list[Any]:
+        """Run the tasks in parallel, without shutting down the subprocesses at the end."""
+        self._used = True
+        with self._parallel_config():
+            return run_parallel(tasks, shutdown_executor=False)
+
+    def run_unordered(
+        self, tasks: Iterable[Task], window: Optional[int] = None
+    ) -> Iterator[tuple[int, Any]]:
+        """Run the tasks in parallel, yielding the results in order of completion.
+
+        The subprocesses are not shut down at the end. See ``run_unordered`` for the details.
+        """
+        self._used = True
+        with self._parallel_config():
+            yield from run_unordered(tasks, window=window, shutdown_executor=False)
+
+    def run_concurrently(self, funcs: Iterable[Callable[[], Any]]) -> Iterator[Any]:
+        """Call the functions in separate threads, and yield the results in the same order.
+
+        The parallel tasks submitted by the functions are executed by the subprocesses of the pool,
+        so the subprocesses don't remain idle while the last tasks of each function are completed.
+        At most ``max_concurrent_calls`` functions are running at the same time, to limit the
+        memory used by the functions running concurrently.
+        """
+        with ThreadPoolExecutor(max_workers=self._max_concurrent_calls) as executor:
+            pending: deque[Future] = deque()
+            try:
+                for func in funcs:
+                    if len(pending) == self._max_concurrent_calls:
+                        yield pending.popleft().result()
+                    pending.append(executor.submit(func))
+                while pending:
+                    yield pending.popleft().result()
+            finally:
+                # cancel the functions not started yet, if the generator is closed before the end
+                for future in pending:
+                    future.cancel()
+
+    def close(self) -> None:
+        """Shut down the subprocesses, if they have been started by the pool."""
+        if self._closed:
+            return
+        self._closed = True
+        backend = os.getenv(BLUEETL_JOBLIB_BACKEND)
+        if self._used and backend in (None, "", "loky") and os.getenv(BLUEETL_JOBLIB_JOBS) != "1":
+            L.info("Shutting down the pool of subprocesses")
+            get_reusable_executor().shutdown(wait=True)
+
+
+def _import_modules(modules: tuple[str, ...]) -> None:
+    """Import the given modules. It's executed in each subprocess when it's started."""
+    for module in modules:
+        try:
+            importlib.import_module(module)
+        except Exception as ex:  # pylint: disable=broad-exception-caught
+            # the same error is raised again by the task using the module
+            L.warning("Unable to import module %s: %s", module, ex)
+
+
+def run_tasks(funcs: Iterable[Callable[[], Any]]) -> list[Any]:
+    """Call the functions in parallel, and return the results in the same order.
+
+    The subprocesses of the active WorkerPool are reused if available.
+    """
+    tasks = (Task(f) for f in funcs)
+    pool = WorkerPool.active()
+    return run_parallel(tasks) if pool is None else pool.run(tasks)
+
+
+def run_unordered(
+    tasks: Iterable[Task],
+    jobs: Optional[int] = None,
+    backend: Optional[str] = None,
+    verbose: Optional[int] = None,
+    base_seed: Optional[int] = None,
+    shutdown_executor: bool = True,
+    window: Optional[int] = None,
+) -> Iterator[tuple[int, Any]]:
+    """Run the tasks in parallel, and yield the position and the result of each completed task.
+
+    It's equivalent to ``blueetl_core.parallel.run_parallel``, and it accepts the same parameters,
+    but the results are yielded as soon as each task completes, so a slow task doesn't prevent the
+    caller from consuming the results of the tasks already completed. The tasks are dispatched
+    to the subprocesses only while the number of tasks not completed yet is lower than window.
+
+    Args:
+        tasks: iterable of Task instances.
+        jobs: number of jobs, see ``run_parallel``.
+        backend: backend passed to joblib, see ``run_parallel``.
+        verbose: verbosity of joblib, see ``run_parallel``.
+        base_seed: initial base seed, see ``run_parallel``.
+        shutdown_executor: if True and using loky, shutdown the subprocesses at the end.
+        window: maximum number of tasks dispatched and not completed yet.
+            If not specified, use twice the number of jobs.
+
+    Yields:
+        tuples (position, result), where position is the index of the task in tasks.
+    """
+    # the defaults are resolved as in run_parallel, that doesn't support unordered results
+    loglevel = L.getEffectiveLevel()
+    if verbose is None:
+        verbose_env = os.getenv(BLUEETL_JOBLIB_VERBOSE)
+        verbose = int(verbose_env) if verbose_env else 0 if loglevel >= logging.WARNING else 10
+    if not jobs:
+        jobs_env = os.getenv(BLUEETL_JOBLIB_JOBS)
+        jobs = int(jobs_env) if jobs_env else max((os.cpu_count() or 1) // 2, 1)
+    if not backend:
+        backend = os.getenv(BLUEETL_JOBLIB_BACKEND)
+    parallel = Parallel(
+        n_jobs=jobs,
+        backend=backend,
+        verbose=verbose,
+        pre_dispatch="2*n_jobs" if window is None else window,
+        # requires joblib>=1.4
+        return_as="generator_unordered",
+    )
+    results = parallel(
+        delayed(_call_with_position)(
+            task,
+            position=i,
+            ctx=TaskContext(
+                task_id=i,
+                loglevel=loglevel,
+                seed=None if base_seed is None else base_seed + i,
+                ppid=os.getpid(),
+            ),
+        )
+        for i, task in enumerate(tasks)
+    )
+    try:
+        yield from results
+    finally:
+        # abort the remaining tasks if the generator is closed before the end
+        results.close()
+        if shutdown_executor and (not backend or backend == "loky") and jobs != 1:
+            get_reusable_executor().shutdown(wait=True)
+
+
+def _call_with_position(task: Task, position: int, ctx: TaskContext) -> tuple[int, Any]:
+    """Call the task and return the result with the position of the task."""
+    return position, task(ctx)
+
+
+def run_tasks_unordered(
+    funcs: Iterable[Callable[[], Any]], window: Optional[int] = None
+) -> Iterator[tuple[int, Any]]:
+    """Call the functions in parallel, and yield the position and the result in order of completion.
+
+    The subprocesses of the active WorkerPool are reused if available.
+    """
+    tasks = (Task(f) for f in funcs)
+    pool = WorkerPool.active()
+    return (
+        run_unordered(tasks, window=window) if pool is None else pool.run_unordered(tasks, window)
+    )
+
+
+class SharedDataFrame:
+    """DataFrame written once to an Arrow IPC file, to be memory-mapped by the subprocesses.
+
+    Only the path of the file is serialized when the object is pickled, and the subprocesses
+    can read the selected rows without copying the full DataFrame.
+    """
+
+    def __init__(self, path: Path, range_index: bool) -> None:
+        """Initialize the object.
+
+        Args:
+            path: path to the Arrow IPC file.
+            range_index: True if the original DataFrame had a default RangeIndex,
+                that can be reconstructed from the positions of the rows.
+        """
+        self._path = path
+        self._range_index = range_index
+
+    @classmethod
+    def from_pandas(cls, df: pd.DataFrame, path: Path) -> "SharedDataFrame":
+        """Write the DataFrame to the given path, and return a new instance.
+
+        Raises:
+            pyarrow.ArrowException: if the DataFrame cannot be converted to Arrow, or back to
+                the same DataFrame, for example because some columns contain Python objects.
+        """
+        converted = index_to_columns(df)
+        table = pa.Table.from_pandas(converted, preserve_index=False)
+        if any(pa.types.is_nested(field.type) for field in table.schema):
+            # lists would be converted back to numpy arrays, so they are not supported
+            raise pa.ArrowNotImplementedError("Nested types are not supported")
+        with pa.OSFile(str(path), "wb") as sink, pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+        return cls(path, range_index=converted is df)
+
+    def take(self, rows: slice) -> pd.DataFrame:
+        """Return a DataFrame containing only the given rows.
+
+        The original index is restored, so the result is equivalent to ``df.iloc[rows]``.
+
+        Args:
+            rows: slice of the rows to be selected.
+        """
+        # the memory map is released when all the Arrow buffers are garbage collected
+        table = pa.ipc.open_file(pa.memory_map(str(self._path))).read_all()
+        df = columns_to_index(table.slice(rows.start, rows.stop - rows.start).to_pandas())
+        if self._range_index:
+            df.index = pd.RangeIndex(rows.start, rows.stop)
+        return df
+
+
+class SharedObject:
+    """Object pickled once to a file, to be loaded only once by each subprocess.
+
+    Only the path of the file is serialized when the object is pickled, so the instance can be
+    passed to many tasks without serializing the wrapped object each time. In the subprocesses,
+    the object is loaded on first access and kept in memory for the following tasks.
+    """
+
+    # objects loaded in the current process, by path
+    _loaded: dict[Path, Any] = {}
+
+    def __init__(self, path: Path, obj: Any = None) -> None:
+        """Initialize the object.
+
+        Args:
+            path: path to the pickled object.
+            obj: the original object, if available in the current process.
+        """
+        self._path = path
+        self._obj = obj
+
+    @classmethod
+    def from_object(cls, obj: Any, path: Path) -> "SharedObject":
+        """Pickle the object to the given path, and return a new instance."""
+        with open(path, "wb") as f:
+            pickle.dump(obj, f, protocol=pickle.HIGHEST_PROTOCOL)
+        return cls(path, obj=obj)
+
+    def __getstate__(self) -> dict:
+        """Get the object state when the object is pickled."""
+        return {"_path": self._path, "_obj": None}
+
+    def __setstate__(self, state: dict) -> None:
+        """Set the object state when the object is unpickled."""
+        self.__dict__.update(state)
+
+    @classmethod
+    def release(cls) -> None:
+        """Release the objects loaded in the current process, if their files have been removed.
+
+        The file of each object is removed when the tasks using it are completed, so the objects
+        still in use by other concurrent tasks are kept, while the others can be released.
+        """
+        for path in [path for path in cls._loaded if not path.exists()]:
+            del cls._loaded[path]
+
+    def get(self) -> Any:
+        """Return the wrapped object, loading it from the file if needed."""
+        if self._obj is None:
+            loaded = SharedObject._loaded
+            SharedObject.release()
+            if self._path not in loaded:
+                with open(self._path, "rb") as f:
+                    loaded[self._path] = pickle.load(f)
+            self._obj = loaded[self._path]
+        return self._obj
+
 
 def _unique_rows(df: pd.DataFrame, columns: list[str]) -> pd.DataFrame:
     """Return the unique rows of the given DataFrame.
@@ -60,24 +420,125 @@ def _groups(df_list: list[pd.DataFrame], groupby: list[str]) -> pd.DataFrame:
     return result[groupby].sort_values(groupby, ignore_index=True)
 
 
+class GroupIndex:
+    """DataFrame sorted by the groupby columns, with the boundaries of each group.
+
+    The DataFrame is sorted only once, so that the rows of each group are contiguous,
+    and they can be selected with a slice instead of filtering the full DataFrame.
+    The order of the rows in each group is the same as in the original DataFrame.
+    """
+
+    def __init__(self, df: pd.DataFrame, groupby: list[str]) -> None:
+        """Initialize the object.
+
+        Args:
+            df: DataFrame to be indexed.
+            groupby: list of columns or index levels used to group the DataFrame.
+                Any name not present in the DataFrame is ignored.
+        """
+        self._columns = [col for col in groupby if col in df.columns or col in df.index.names]
+        self._bounds: dict[tuple, slice] = {}
+        self._df = df
+        if not self._columns:
+            # every group contains the full DataFrame
+            return
+        # rows containing nan are ignored, because they wouldn't match any query
+        indices = df.groupby(self._columns, observed=True, sort=False, dropna=True).indices
+        start = 0
+        for group, positions in indices.items():
+            group = group if len(self._columns) > 1 else (group,)
+            self._bounds[group] = slice(start, start + len(positions))
+            start += len(positions)
+        order = np.concatenate(list(indices.values())) if indices else np.array([], dtype=int)
+        if len(order) != len(df) or np.any(order[1:] < order[:-1]):
+            # copy the DataFrame only if it's not already sorted
+            self._df = df.take(order)
+
+    @property
+    def df(self) -> pd.DataFrame:
+        """Return the sorted DataFrame."""
+        return self._df
+
+    def rows(self, key: NamedTuple) -> slice:
+        """Return the slice of rows of the sorted DataFrame matching the given key.
+
+        Any field of the key not present in the DataFrame is ignored.
+        """
+        if not self._columns:
+            return slice(0, len(self._df))
+        values = key._asdict()  # type: ignore[attr-defined]
+        return self._bounds.get(tuple(values[col] for col in self._columns), slice(0, 0))
+
+    def get(self, key: NamedTuple) -> pd.DataFrame:
+        """Return the rows matching the given key, as a view of the sorted DataFrame."""
+        return self._df.iloc[self.rows(key)]
+
+
+def _call_with_shared(
+    func: Callable,
+    key: NamedTuple,
+    df_list: list[Union[pd.DataFrame, tuple[SharedDataFrame, slice]]],
+) -> Any:
+    """Read the shared DataFrames and call func. It's executed in a subprocess."""
+    df_list = [item[0].take(item[1]) if isinstance(item, tuple) else item for item in df_list]
+    return func(key=key, df_list=df_list)
+
+
 def _func_generator(
     df_list: list[pd.DataFrame], groupby: list[str], func: Callable
 ) -> Iterator[Callable[[], Any]]:
     """Yield functions to be executed in a subprocess."""
     groups = _groups(df_list, groupby=groupby)
-    caches = [CachedDataFrame(df) for df in df_list]
+    indexes = [GroupIndex(df, groupby=groupby) for df in df_list]
     L.info("Tasks to be executed: %s", len(groups))
     # for each group, yield a function that can be called in a subprocess
     for _, key in groups.etl.iter():
-        filtered = [df.query(key._asdict(), ignore_unknown_keys=True) for df in caches]
+        filtered = [index.get(key) for index in indexes]
         yield partial(func, key=key, df_list=filtered)
 
 
+def _shared_func_generator(
+    df_list: list[pd.DataFrame], groupby: list[str], func: Callable, tmpdir: Path
+) -> Iterator[Callable[[], Any]]:
+    """Yield functions to be executed in a subprocess, using shared DataFrames when possible.
+
+    Each sorted DataFrame is written only once to a memory-mappable file, and each task receives
+    only the slices of the selected rows, instead of the pickled slices of the DataFrames.
+    DataFrames that cannot be converted to Arrow are filtered and pickled as usual.
+    """
+    groups = _groups(df_list, groupby=groupby)
+    indexes = [GroupIndex(df, groupby=groupby) for df in df_list]
+    sources: list[Optional[SharedDataFrame]] = []
+    for n, index in enumerate(indexes):
+        try:
+            sources.append(SharedDataFrame.from_pandas(index.df, path=tmpdir / f"{n}.arrow"))
+        except pa.ArrowException as ex:
+            L.info("Using pickle transport for DataFrame %s: %s", n, ex)
+            sources.append(None)
+    L.info("Tasks to be executed: %s", len(groups))
+    for _, key in groups.etl.iter():
+        filtered = [
+            index.get(key) if source is None else (source, index.rows(key))
+            for source, index in zip(sources, indexes)
+        ]
+        yield partial(_call_with_shared, func, key=key, df_list=filtered)
+
+
+def _consume(results: list[Any]) -> Iterator[Any]:
+    """Yield the results, releasing the references held by the list as soon as possible."""
+    for i, result in enumerate(results):
+        results[i] = None
+        yield result
+
+
 def merge_filter(
     df_list: list[pd.DataFrame],
     groupby: list[str],
     func: Callable[[NamedTuple, list[pd.DataFrame]], Any],
     parallel: bool = True,
+    transport: str = TRANSPORT_PICKLE,
+    ordered: bool = True,
+    window: Optional[int] = None,
 ) -> Iterator[Any]:
     """Merge the specified columns of the list of DataFrames, and call func for each combination.
 
@@ -89,16 +550,47 @@ def merge_filter(
         func: callback function accepting ``key: NamedTuple, df_list: list[pd.DataFrames]``,
             executed for each calculated combination of columns.
         parallel: True to call the callback function in subprocesses, False otherwise.
+        transport: how the filtered DataFrames are passed to the subprocesses, ignored if
+            parallel is False. If "pickle", the DataFrames are filtered in the main process,
+            and each slice is serialized. If "shared", the DataFrames are written only once to
+            temporary Arrow files that are memory-mapped and sliced in the subprocesses.
+            The temporary files are created in the default temporary directory, that can be
+            changed with the TMPDIR env variable (for example, to use ``/dev/shm``).
+        ordered: if True, yield the results in the same order as the sorted combinations.
+            If False, yield tuples ``(position, result)`` as soon as each task completes,
+            where position is the index of the combination in the sorted combinations,
+            so that the caller can restore the same order if needed.
+        window: maximum number of tasks dispatched to the subprocesses and not completed yet,
+            used only when ordered is False. If not specified, use twice the number of jobs.
 
     Yields:
-        values returned by the callback function.
+        values returned by the callback function, or tuples ``(position, value)`` if ordered is
+        False.
 
     """
-    func_generator = _func_generator(df_list=df_list, groupby=groupby, func=func)
-    if parallel:
-        yield from run_parallel(Task(f) for f in func_generator)
+    if transport not in (TRANSPORT_PICKLE, TRANSPORT_SHARED):
+        raise ValueError(f"Invalid transport: {transport}")
+    if parallel and transport == TRANSPORT_SHARED:
+        with tempfile.TemporaryDirectory(prefix="blueetl_") as tmpdir:
+            func_generator = _shared_func_generator(
+                df_list=df_list, groupby=groupby, func=func, tmpdir=Path(tmpdir)
+            )
+            if not ordered:
+                # the temporary files are needed until all the tasks are completed
+                yield from run_tasks_unordered(func_generator, window=window)
+                return
+            results = run_tasks(func_generator)
+        yield from _consume(results)
+    elif parallel:
+        func_generator = _func_generator(df_list=df_list, groupby=groupby, func=func)
+        if not ordered:
+            yield from run_tasks_unordered(func_generator, window=window)
+            return
+        yield from _consume(run_tasks(func_generator))
     else:
-        yield from (f() for f in func_generator)
+        func_generator = _func_generator(df_list=df_list, groupby=groupby, func=func)
+        results = (f() for f in func_generator)
+        yield from (results if ordered else enumerate(results))
 
 
 def merge_groupby(
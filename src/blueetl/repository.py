@@ -16,13 +16,13 @@ from blueetl.extract.base import ExtractorT
 from blueetl.extract.compartment_report import CompartmentReport
 from blueetl.extract.neuron_classes import NeuronClasses
 from blueetl.extract.neurons import Neurons
-from blueetl.extract.report import ReportExtractor
-from blueetl.extract.simulations import Simulations
+from blueetl.extract.report import ReportExtractor, ReportExtractorT
+from blueetl.extract.simulations import Simulations, SimulationStatusCache
 from blueetl.extract.soma_report import SomaReport
 from blueetl.extract.spikes import Spikes
-from blueetl.extract.windows import Windows
+from blueetl.extract.windows import DynamicOffsetsCache, Windows
 from blueetl.resolver import Resolver
-from blueetl.utils import timed
+from blueetl.utils import timed, unlocked_cached_property
 
 L = logging.getLogger(__name__)
 
@@ -42,6 +42,10 @@ class BaseExtractor(ABC, Generic[ExtractorT]):
     def extract_cached(self, df: pd.DataFrame, name: str) -> ExtractorT:
         """Instantiate an object from a cached DataFrame."""
 
+    @abstractmethod
+    def cache_query(self, name: str) -> Optional[dict[str, Any]]:
+        """Return the query to filter the cached DataFrame, or None if not needed."""
+
     def extract(self, name: str) -> ExtractorT:
         """Return an object extracted from the cache or as new.
 
@@ -49,19 +53,33 @@ class BaseExtractor(ABC, Generic[ExtractorT]):
             name: name of the dataframe.
         """
         with timed(L.debug, f"Extracting {name}") as messages:
-            df = self._repo.cache_manager.load_repo(name)
+            # the query is applied while loading, to read only the needed data
+            query = self.cache_query(name)
+            df = self._repo.cache_manager.load_repo(name, query=query)
             if df is not None:
                 instance = self.extract_cached(df, name)
             else:
-                instance = self.extract_new()
+                instance = self.extract_uncached(name)
             assert instance is not None, "The extraction didn't return a valid instance."
             is_cached = instance._cached  # pylint: disable=protected-access
             is_filtered = instance._filtered  # pylint: disable=protected-access
-            if not is_cached or is_filtered:
-                self._repo.cache_manager.dump_repo(df=instance.to_pandas(), name=name)
+            if not is_cached or is_filtered or query is not None:
+                self.dump(instance, name)
             messages[:] = [f"Extracted {name}: {is_cached=} {is_filtered=} rows={len(instance.df)}"]
             return instance
 
+    def extract_uncached(self, name: str) -> ExtractorT:
+        """Instantiate an object when the DataFrame is not cached.
+
+        It can be overridden to reuse any valid part of the cached DataFrame.
+        """
+        L.debug("Extracting %s from the configuration", name)
+        return self.extract_new()
+
+    def dump(self, instance: ExtractorT, name: str) -> None:
+        """Write the DataFrame of the extracted object to the cache."""
+        self._repo.cache_manager.dump_repo(df=instance.to_pandas(), name=name)
+
 
 class SimulationsExtractor(BaseExtractor[Simulations]):
     """SimulationsExtractor class."""
@@ -71,14 +89,35 @@ class SimulationsExtractor(BaseExtractor[Simulations]):
         return Simulations.from_config(
             config=self._repo.simulations_config,
             query=self._repo.simulations_filter,
+            probe_workers=self._repo.simulation_probe_workers,
+            status_cache=self._status_cache(),
         )
 
+    def cache_query(self, name: str) -> Optional[dict[str, Any]]:
+        """Return the query to filter the cached DataFrame, or None if not needed."""
+        if self._repo.needs_filter(name):
+            return self._repo.simulations_filter
+        return None
+
     def extract_cached(self, df: pd.DataFrame, name: str) -> Simulations:
         """Instantiate an object from a cached DataFrame."""
-        query = None
-        if self._repo.needs_filter(name):
-            query = self._repo.simulations_filter
-        return Simulations.from_pandas(df, query=query, cached=True)
+        return Simulations.from_pandas(
+            df,
+            query=self.cache_query(name),
+            cached=True,
+            probe_workers=self._repo.simulation_probe_workers,
+            status_cache=self._status_cache(),
+        )
+
+    def _status_cache(self) -> Optional[SimulationStatusCache]:
+        """Return the cache of the status of the simulations, or None if the cache is read-only.
+
+        The read-only cache is used by the filtered repositories, that reuse the loaded objects.
+        """
+        cache_manager = self._repo.cache_manager
+        if cache_manager.readonly:
+            return None
+        return SimulationStatusCache(cache_manager.simulations_status_path)
 
 
 class NeuronsExtractor(BaseExtractor[Neurons]):
@@ -91,13 +130,16 @@ class NeuronsExtractor(BaseExtractor[Neurons]):
             neuron_classes=self._repo.extraction_config.neuron_classes,
         )
 
-    def extract_cached(self, df: pd.DataFrame, name: str) -> Neurons:
-        """Instantiate an object from a cached DataFrame."""
-        query = None
+    def cache_query(self, name: str) -> Optional[dict[str, Any]]:
+        """Return the query to filter the cached DataFrame, or None if not needed."""
         if self._repo.needs_filter(name):
             selected_sims = self._repo.simulations.df.etl.q(simulation_id=self._repo.simulation_ids)
-            query = {CIRCUIT_ID: sorted(set(selected_sims[CIRCUIT_ID]))}
-        return Neurons.from_pandas(df, query=query, cached=True)
+            return {CIRCUIT_ID: sorted(set(selected_sims[CIRCUIT_ID]))}
+        return None
+
+    def extract_cached(self, df: pd.DataFrame, name: str) -> Neurons:
+        """Instantiate an object from a cached DataFrame."""
+        return Neurons.from_pandas(df, query=self.cache_query(name), cached=True)
 
 
 class NeuronClassesExtractor(BaseExtractor[NeuronClasses]):
@@ -109,13 +151,16 @@ class NeuronClassesExtractor(BaseExtractor[NeuronClasses]):
             neurons=self._repo.neurons, neuron_classes=self._repo.extraction_config.neuron_classes
         )
 
-    def extract_cached(self, df: pd.DataFrame, name: str) -> NeuronClasses:
-        """Instantiate an object from a cached DataFrame."""
-        query = None
+    def cache_query(self, name: str) -> Optional[dict[str, Any]]:
+        """Return the query to filter the cached DataFrame, or None if not needed."""
         if self._repo.needs_filter(name):
             selected_sims = self._repo.simulations.df.etl.q(simulation_id=self._repo.simulation_ids)
-            query = {CIRCUIT_ID: sorted(set(selected_sims[CIRCUIT_ID]))}
-        return NeuronClasses.from_pandas(df, query=query, cached=True)
+            return {CIRCUIT_ID: sorted(set(selected_sims[CIRCUIT_ID]))}
+        return None
+
+    def extract_cached(self, df: pd.DataFrame, name: str) -> NeuronClasses:
+        """Instantiate an object from a cached DataFrame."""
+        return NeuronClasses.from_pandas(df, query=self.cache_query(name), cached=True)
 
 
 class WindowsExtractor(BaseExtractor[Windows]):
@@ -129,77 +174,103 @@ class WindowsExtractor(BaseExtractor[Windows]):
             windows_config=self._repo.extraction_config.windows,
             trial_steps_config=self._repo.extraction_config.trial_steps,
             resolver=self._repo.resolver,
+            offsets_cache=self._offsets_cache(),
         )
 
+    def cache_query(self, name: str) -> Optional[dict[str, Any]]:
+        """Return the query to filter the cached DataFrame, or None if not needed."""
+        if self._repo.needs_filter(name):
+            return {SIMULATION_ID: self._repo.simulation_ids}
+        return None
+
     def extract_cached(self, df: pd.DataFrame, name: str) -> Windows:
         """Instantiate an object from a cached DataFrame."""
-        query = None
-        if self._repo.needs_filter(name):
-            query = {SIMULATION_ID: self._repo.simulation_ids}
-        return Windows.from_pandas(df, query=query, cached=True)
+        return Windows.from_pandas(df, query=self.cache_query(name), cached=True)
 
+    def _offsets_cache(self) -> Optional[DynamicOffsetsCache]:
+        """Return the cache of the dynamic offsets, or None if the cache is read-only."""
+        cache_manager = self._repo.cache_manager
+        if cache_manager.readonly:
+            return None
+        return DynamicOffsetsCache(cache_manager.dynamic_offsets_path)
 
-class SpikesExtractor(BaseExtractor[Spikes]):
-    """SpikesExtractor class."""
 
-    def extract_new(self) -> Spikes:
+class BaseReportExtractor(BaseExtractor[ReportExtractorT]):
+    """BaseReportExtractor class, cached in partitions by simulation_id."""
+
+    report_class: type[ReportExtractorT]
+
+    def extract_new(self) -> ReportExtractorT:
         """Instantiate an object from the configuration."""
-        return Spikes.from_simulations(
+        return self.extract_partitions({})
+
+    def extract_uncached(self, name: str) -> ReportExtractorT:
+        """Instantiate an object from the configuration, reusing the valid cached partitions."""
+        partitions = self._repo.cache_manager.load_repo_partitions(
+            name, partition_keys=self.partition_keys
+        )
+        return self.extract_partitions(partitions)
+
+    def extract_partitions(self, partitions: dict[int, pd.DataFrame]) -> ReportExtractorT:
+        """Instantiate an object from the configuration, reusing the given partitions."""
+        return self.report_class.from_simulations(
             simulations=self._repo.simulations,
             neurons=self._repo.neurons,
             windows=self._repo.windows,
             neuron_classes=self._repo.neuron_classes,
             name=self._repo.extraction_config.report.name,
+            partitions=partitions,
+            storage=self._repo.extraction_config.report.storage,
         )
 
-    def extract_cached(self, df: pd.DataFrame, name: str) -> Spikes:
-        """Instantiate an object from a cached DataFrame."""
-        query = None
+    def cache_query(self, name: str) -> Optional[dict[str, Any]]:
+        """Return the query to filter the cached DataFrame, or None if not needed."""
         if self._repo.needs_filter(name):
-            query = {SIMULATION_ID: self._repo.simulation_ids}
-        return Spikes.from_pandas(df, query=query, cached=True)
+            return {SIMULATION_ID: self._repo.simulation_ids}
+        return None
 
+    def extract_cached(self, df: pd.DataFrame, name: str) -> ReportExtractorT:
+        """Instantiate an object from a cached DataFrame."""
+        return self.report_class.from_pandas(df, query=self.cache_query(name), cached=True)
 
-class SomaReportExtractor(BaseExtractor[SomaReport]):
-    """SomaReportExtractor class."""
+    def dump(self, instance: ReportExtractorT, name: str) -> None:
+        """Write the partitions of the extracted object to the cache."""
+        self._repo.cache_manager.dump_repo(
+            df=instance.to_pandas(), name=name, partition_keys=self.partition_keys
+        )
 
-    def extract_new(self) -> SomaReport:
-        """Instantiate an object from the configuration."""
-        return SomaReport.from_simulations(
+    @cached_property
+    def partition_keys(self) -> dict[int, str]:
+        """Return the keys of the partitions by simulation_id.
+
+        Any partition cached with the same key can be reused instead of being extracted again.
+        """
+        return self.report_class.partition_keys(
             simulations=self._repo.simulations,
             neurons=self._repo.neurons,
             windows=self._repo.windows,
             neuron_classes=self._repo.neuron_classes,
             name=self._repo.extraction_config.report.name,
+            storage=self._repo.extraction_config.report.storage,
         )
 
-    def extract_cached(self, df: pd.DataFrame, name: str) -> SomaReport:
-        """Instantiate an object from a cached DataFrame."""
-        query = None
-        if self._repo.needs_filter(name):
-            query = {SIMULATION_ID: self._repo.simulation_ids}
-        return SomaReport.from_pandas(df, query=query, cached=True)
 
+class SpikesExtractor(BaseReportExtractor[Spikes]):
+    """SpikesExtractor class."""
 
-class CompartmentReportExtractor(BaseExtractor[CompartmentReport]):
-    """CompartmentReportExtractor class."""
+    report_class = Spikes
 
-    def extract_new(self) -> CompartmentReport:
-        """Instantiate an object from the configuration."""
-        return CompartmentReport.from_simulations(
-            simulations=self._repo.simulations,
-            neurons=self._repo.neurons,
-            windows=self._repo.windows,
-            neuron_classes=self._repo.neuron_classes,
-            name=self._repo.extraction_config.report.name,
-        )
 
-    def extract_cached(self, df: pd.DataFrame, name: str) -> CompartmentReport:
-        """Instantiate an object from a cached DataFrame."""
-        query = None
-        if self._repo.needs_filter(name):
-            query = {SIMULATION_ID: self._repo.simulation_ids}
-        return CompartmentReport.from_pandas(df, query=query, cached=True)
+class SomaReportExtractor(BaseReportExtractor[SomaReport]):
+    """SomaReportExtractor class."""
+
+    report_class = SomaReport
+
+
+class CompartmentReportExtractor(BaseReportExtractor[CompartmentReport]):
+    """CompartmentReportExtractor class."""
+
+    report_class = CompartmentReport
 
 
 class Repository:
@@ -212,6 +283,7 @@ class Repository:
         cache_manager: CacheManager,
         simulations_filter: Optional[dict[str, Any]] = None,
         resolver: Optional[Resolver] = None,
+        simulation_probe_workers: int = 1,
     ) -> None:
         """Initialize the repository.
 
@@ -221,12 +293,14 @@ class Repository:
             cache_manager: cache manager responsible to load and dump dataframes.
             simulations_filter: optional simulations filter.
             resolver: resolver instance.
+            simulation_probe_workers: number of threads used to load and check the simulations.
         """
         self._extraction_config = extraction_config
         self._simulations_config = simulations_config
         self._cache_manager = cache_manager
         self._simulations_filter = simulations_filter
         self._resolver = resolver
+        self._simulation_probe_workers = simulation_probe_workers
         report_type = extraction_config.report.type
         available_reports: dict[str, type[BaseExtractor]] = {
             "spikes": SpikesExtractor,
@@ -287,22 +361,27 @@ class Repository:
         """Return the resolver."""
         return self._resolver
 
-    @cached_property
+    @property
+    def simulation_probe_workers(self) -> int:
+        """Return the number of threads used to load and check the simulations."""
+        return self._simulation_probe_workers
+
+    @unlocked_cached_property
     def simulations(self) -> Simulations:
         """Return the Simulations extraction."""
         return self._mapping["simulations"](self).extract(name="simulations")
 
-    @cached_property
+    @unlocked_cached_property
     def neurons(self) -> Neurons:
         """Return the Neurons extraction."""
         return self._mapping["neurons"](self).extract(name="neurons")
 
-    @cached_property
+    @unlocked_cached_property
     def neuron_classes(self) -> NeuronClasses:
         """Return the NeuronClasses extraction."""
         return self._mapping["neuron_classes"](self).extract(name="neuron_classes")
 
-    @cached_property
+    @unlocked_cached_property
     def windows(self) -> Windows:
         """Return the Windows extraction."""
         return self._mapping["windows"](self).extract(name="windows")
@@ -318,7 +397,7 @@ class Repository:
         assert isinstance(self.report, Spikes)
         return self.report
 
-    @cached_property
+    @unlocked_cached_property
     def report(self) -> ReportExtractor:
         """Return the Report extraction."""
         return self._mapping["report"](self).extract(name="report")
@@ -395,8 +474,11 @@ class FilteredRepository(Repository):
             extraction_config=parent.extraction_config,
             cache_manager=parent.cache_manager.to_readonly(),
             simulations_filter=simulations_filter,
+            simulation_probe_workers=parent.simulation_probe_workers,
         )
         dataframes = {name: getattr(parent, name).df for name in parent.names}
+        # the report is filtered in the same format used to store it
+        dataframes["report"] = parent.report.to_pandas()
         self._assign_from_dataframes(dataframes)
 
     def _assign_from_dataframes(self, dicts: dict[str, pd.DataFrame]) -> None:
@@ -409,3 +491,56 @@ class FilteredRepository(Repository):
     def needs_filter(self, name: str) -> bool:
         """Return True if the repository needs to be filtered during the extraction."""
         return bool(self.simulations_filter)
+
+
+class RepositoryContext:
+    """Read-only view of a Repository, to be sent to the subprocesses calculating the features.
+
+    The simulations, neurons, neuron classes, and windows are stored in the instance together
+    with their lookup indexes, so they don't need to be loaded again from the cache in each task.
+    Any other attribute, like the report, is looked up in the wrapped repository, that is
+    pickled without the extracted dataframes, and loads them from the cache only when needed.
+    """
+
+    def __init__(self, repo: Repository) -> None:
+        """Initialize the object from the given extracted repository."""
+        self._repo = repo
+        self._simulations = repo.simulations
+        self._neurons = repo.neurons
+        self._neuron_classes = repo.neuron_classes
+        self._windows = repo.windows
+        # build the indexes only once, before the object is pickled
+        _ = self._neurons.neuron_class_offsets
+        _ = self._windows.window_index
+
+    def __getattr__(self, name: str) -> Any:
+        """Return the attributes not defined in the context from the wrapped repository."""
+        if name.startswith("_"):
+            # needed to avoid infinite recursion when the object is unpickled
+            raise AttributeError(name)
+        return getattr(self._repo, name)
+
+    @property
+    def simulations(self) -> Simulations:
+        """Return the Simulations extraction."""
+        return self._simulations
+
+    @property
+    def neurons(self) -> Neurons:
+        """Return the Neurons extraction."""
+        return self._neurons
+
+    @property
+    def neuron_classes(self) -> NeuronClasses:
+        """Return the NeuronClasses extraction."""
+        return self._neuron_classes
+
+    @property
+    def windows(self) -> Windows:
+        """Return the Windows extraction."""
+        return self._windows
+
+    @property
+    def simulation_ids(self) -> list[int]:
+        """Return the list of simulation ids, possibly filtered."""
+        return self._simulations.df[SIMULATION_ID].to_list()
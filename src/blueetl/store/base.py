@@ -3,15 +3,91 @@
 import logging
 from abc import ABC, abstractmethod
 from pathlib import Path
-from typing import Optional
+from typing import Any, Optional
 
 import pandas as pd
+from blueetl_core.utils import smart_concat
 
 from blueetl.types import StrOrPath
-from blueetl.utils import checksum, resolve_path
+from blueetl.utils import checksum, fingerprint, resolve_path
 
 L = logging.getLogger(__name__)
 
+# checksum of the full content of the files
+CHECKSUM_FULL = "full"
+# fingerprint based on size, modification time and inode of the files
+CHECKSUM_STAT = "stat"
+# checksum of the metadata in the footer of the parquet files
+CHECKSUM_FOOTER = "footer"
+# separator between the mode and the digest in the returned checksums
+CHECKSUM_MODE_SEP = ":"
+# prefix and separator of the names of the columns containing the index levels,
+# when the index is converted to columns: {INDEX_PREFIX}{INDEX_SEP}{position}{INDEX_SEP}{name}
+INDEX_PREFIX = "_index"
+INDEX_SEP = ":"
+
+
+def get_checksum_mode(value: str) -> str:
+    """Return the mode used to calculate the given checksum.
+
+    The checksums calculated in full mode aren't prefixed, for backward compatibility.
+    """
+    mode, sep, _ = value.rpartition(CHECKSUM_MODE_SEP)
+    return mode if sep else CHECKSUM_FULL
+
+
+def index_to_columns(df: pd.DataFrame) -> pd.DataFrame:
+    """Convert index to columns in the given DataFrame, to be restored with columns_to_index.
+
+    The DataFrame is returned unchanged if it has an unnamed RangeIndex starting from 0.
+    Feather does not support serializing generic Indexes and any MultiIndex for the index
+    see https://github.com/pandas-dev/pandas/blob/v1.4.1/pandas/io/feather_format.py#L59-L81
+    """
+    if (
+        not isinstance(df.index, (pd.Index, pd.RangeIndex))
+        or df.index.name
+        or not df.index.equals(pd.RangeIndex.from_range(range(len(df))))
+    ):
+        # rename the levels before resetting the index, because any unnamed level would be
+        # automatically named as "index" or "level_N" depending on the number of levels
+        names = [
+            f"{INDEX_PREFIX}{INDEX_SEP}{i}{INDEX_SEP}{name or ''}"
+            for i, name in enumerate(df.index.names)
+        ]
+        return df.rename_axis(names).reset_index()
+    return df
+
+
+def columns_to_index(df: pd.DataFrame) -> pd.DataFrame:
+    """Convert columns to index in the given DataFrame."""
+    mapping = {}
+    for col in df.columns:
+        if col.startswith(INDEX_PREFIX):
+            _, _, name = col.split(INDEX_SEP, 2)
+            mapping[col] = name or None
+    if mapping:
+        df = df.set_index(list(mapping))
+        # it works also for single level indexes
+        df.index.set_names([mapping.get(name) for name in df.index.names], inplace=True)
+    return df
+
+
+def concat_partitions(partitions: list[pd.DataFrame], ignore_index: bool = False) -> pd.DataFrame:
+    """Concatenate the partitions of a dataframe, without converting categorical columns to object.
+
+    If the categories are different, they are replaced with the sorted union of the categories.
+    """
+    # empty partitions are ignored, and they may not contain the categorical dtypes
+    partitions = [df for df in partitions if not df.empty] or partitions
+    if len(partitions) > 1:
+        for column in partitions[0].select_dtypes("category"):
+            categories = [df[column].cat.categories for df in partitions]
+            if not all(categories[0].equals(other) for other in categories[1:]):
+                union = sorted(set().union(*categories))
+                for df in partitions:
+                    df[column] = df[column].cat.set_categories(union)
+    return smart_concat(partitions, ignore_index=ignore_index)
+
 
 class BaseStore(ABC):
     """Abstract class defining a generic file data store.
@@ -19,13 +95,21 @@ class BaseStore(ABC):
     It's responsible for reading and writing Pandas DataFrames in a specific serialization format.
     """
 
-    def __init__(self, basedir: StrOrPath) -> None:
+    CHECKSUM_MODES: tuple[str, ...] = (CHECKSUM_FULL, CHECKSUM_STAT)
+
+    def __init__(self, basedir: StrOrPath, checksum_mode: str = CHECKSUM_FULL) -> None:
         """Initialize the object.
 
         Args:
             basedir: base directory where the files should be stored.
+            checksum_mode: mode used to calculate the checksums of the files, in CHECKSUM_MODES.
         """
+        if checksum_mode not in self.CHECKSUM_MODES:
+            raise ValueError(
+                f"Unsupported checksum mode {checksum_mode!r} for {self.__class__.__name__}"
+            )
         self._basedir = resolve_path(basedir)
+        self._checksum_mode = checksum_mode
         L.info("Using class %s with basedir %s", self.__class__.__name__, self.basedir)
 
     @property
@@ -43,8 +127,32 @@ class BaseStore(ABC):
         """Save a dataframe to file, using the given name and the class extension."""
 
     @abstractmethod
-    def load(self, name: str) -> Optional[pd.DataFrame]:
-        """Load a dataframe from file, using the given name and the class extension."""
+    def load(
+        self,
+        name: str,
+        filters: Optional[dict[str, Any]] = None,
+        columns: Optional[list[str]] = None,
+    ) -> Optional[pd.DataFrame]:
+        """Load a dataframe from file, using the given name and the class extension.
+
+        Args:
+            name: name of the dataframe.
+            filters: optional query dict, accepted by ``etl.q``, used to filter the rows.
+            columns: optional list of columns to be loaded. The index is always loaded.
+        """
+
+    @staticmethod
+    def _filter(
+        df: pd.DataFrame,
+        filters: Optional[dict[str, Any]] = None,
+        columns: Optional[list[str]] = None,
+    ) -> pd.DataFrame:
+        """Filter the rows and the columns of a dataframe already loaded."""
+        if filters:
+            df = df.etl.q(filters)
+        if columns is not None:
+            df = df[columns]
+        return df
 
     def delete(self, name: str) -> None:
         """Delete the file with the given name and the class extension, if it exists."""
@@ -54,9 +162,48 @@ class BaseStore(ABC):
         """Return the full path of the file with the given name and the class extension."""
         return self.basedir / f"{name}.{self.extension}"
 
-    def checksum(self, name: str) -> Optional[str]:
-        """Return a checksum of the file, or None if it doesn't exist."""
+    @property
+    def checksum_mode(self) -> str:
+        """Return the mode used to calculate the checksums of the files."""
+        return self._checksum_mode
+
+    def checksum(self, name: str, mode: Optional[str] = None) -> Optional[str]:
+        """Return a checksum of the file, or None if it doesn't exist.
+
+        Args:
+            name: name of the dataframe.
+            mode: mode used to calculate the checksum, or None to use the mode of the store.
+        """
         path = self.path(name)
         if path.exists():
-            return checksum(path)
+            mode = mode or self.checksum_mode
+            return self._with_mode(self._file_checksum(path, mode=mode), mode=mode)
         return None
+
+    def verify(self, name: str, expected: Optional[str]) -> bool:
+        """Return True if the checksum of the file is equal to the expected checksum.
+
+        The checksum is calculated with the same mode used for the expected checksum,
+        so that the files written with a different mode can still be verified.
+        However, if the mode of the store is full, the files can be verified only with a
+        full checksum, so any other checksum is considered invalid.
+        """
+        if not expected:
+            return False
+        mode = get_checksum_mode(expected)
+        if mode not in self.CHECKSUM_MODES:
+            return False
+        if self.checksum_mode == CHECKSUM_FULL and mode != CHECKSUM_FULL:
+            return False
+        return self.checksum(name, mode=mode) == expected
+
+    @staticmethod
+    def _with_mode(digest: str, mode: str) -> str:
+        """Return the checksum prefixed with the mode, unless it's the full mode."""
+        return digest if mode == CHECKSUM_FULL else f"{mode}{CHECKSUM_MODE_SEP}{digest}"
+
+    def _file_checksum(self, path: Path, mode: str) -> str:
+        """Return the checksum of the given file, calculated with the given mode."""
+        if mode == CHECKSUM_STAT:
+            return fingerprint(path)
+        return checksum(path)
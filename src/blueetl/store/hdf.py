@@ -1,7 +1,7 @@
 """HDF data store."""
 
 import logging
-from typing import Optional
+from typing import Any, Optional
 
 import pandas as pd
 
@@ -39,10 +39,16 @@ class HDFStore(BaseStore):
                 # format="table",
             )
 
-    def load(self, name: str) -> Optional[pd.DataFrame]:
+    def load(
+        self,
+        name: str,
+        filters: Optional[dict[str, Any]] = None,
+        columns: Optional[list[str]] = None,
+    ) -> Optional[pd.DataFrame]:
         """Load a dataframe from file, using the given name and the class extension."""
         path = self.path(name)
         if not path.exists():
             return None
         with timed(L.debug, f"Reading {name} from {path}"):
-            return pd.read_hdf(path, key=name)
+            df = pd.read_hdf(path, key=name)
+            return self._filter(df, filters=filters, columns=columns)
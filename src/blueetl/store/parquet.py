@@ -1,23 +1,142 @@
 """Parquet data store."""
 
+import hashlib
 import logging
+import os
+import shutil
+from collections.abc import Iterator
+from pathlib import Path
 from typing import Any, Optional
+from urllib.parse import quote, unquote
 
+import numpy as np
 import pandas as pd
+import pyarrow.parquet as pq
 
-from blueetl.store.base import BaseStore
+from blueetl.store.base import (
+    CHECKSUM_FOOTER,
+    CHECKSUM_FULL,
+    CHECKSUM_STAT,
+    BaseStore,
+    concat_partitions,
+)
 from blueetl.types import StrOrPath
-from blueetl.utils import timed
+from blueetl.utils import checksum_json, relpath, timed
 
 L = logging.getLogger(__name__)
 
+# name of the file written in each partition of a dataset
+_PART = "part"
+# column added to the partitions when needed to restore the original order of the rows
+_ROW = "__row__"
+# operators of etl.q that can be used as filters when reading the parquet files
+_OPERATORS = {"eq": "==", "ne": "!=", "le": "<=", "lt": "<", "ge": ">=", "gt": ">", "isin": "in"}
+
+
+def _to_parquet_filters(
+    filters: dict[str, Any], names: list[str]
+) -> tuple[list[tuple[str, str, Any]], dict[str, Any]]:
+    """Split the etl.q filters into parquet filters and remaining filters.
+
+    Args:
+        filters: query dict accepted by ``etl.q``.
+        names: names of the columns and index levels in the parquet file.
+
+    Returns:
+        tuple (parquet_filters, remaining), where ``parquet_filters`` can be passed to
+        ``pd.read_parquet``, and ``remaining`` must be applied to the loaded dataframe.
+    """
+    parquet_filters: list[tuple[str, str, Any]] = []
+    remaining: dict[str, Any] = {}
+    for key, value in filters.items():
+        if key not in names:
+            remaining[key] = value
+        elif isinstance(value, dict) and set(value).issubset(_OPERATORS):
+            for op, op_value in value.items():
+                if op == "isin":
+                    op_value = list(op_value)
+                parquet_filters.append((key, _OPERATORS[op], op_value))
+        elif isinstance(value, (list, tuple, set, np.ndarray)):
+            parquet_filters.append((key, "in", list(value)))
+        elif isinstance(value, dict) or value is None:
+            remaining[key] = value
+        else:
+            parquet_filters.append((key, "==", value))
+    return parquet_filters, remaining
+
+
+def _partition_values(filters: dict[str, Any], key: str) -> Optional[set[str]]:
+    """Return the partition values selected by the filters for the given key, or None for all."""
+    value = filters.get(key)
+    if isinstance(value, dict):
+        if set(value) - {"eq", "isin"}:
+            return None
+        values = [*value.get("isin", []), *([value["eq"]] if "eq" in value else [])]
+    elif isinstance(value, (list, tuple, set, np.ndarray)):
+        values = list(value)
+    elif value is None:
+        return None
+    else:
+        values = [value]
+    return {str(v) for v in values}
+
+
+def _footer_checksum(path: Path) -> str:
+    """Return the checksum of the metadata in the footer of a parquet file, and of its size.
+
+    The footer contains the schema, and the sizes, offsets and statistics of all the column chunks,
+    so it's very likely to change when the file is written again with different data.
+    """
+    with open(path, "rb") as f:
+        size = f.seek(0, os.SEEK_END)
+        f.seek(size - 8)
+        tail = f.read(8)
+        footer_size = int.from_bytes(tail[:4], "little")
+        f.seek(size - 8 - footer_size)
+        filehash = hashlib.blake2b(f.read(footer_size))
+    filehash.update(tail)
+    filehash.update(str(size).encode("utf-8"))
+    return filehash.hexdigest()
+
+
+def _partition_sort_key(path: Path) -> tuple:
+    """Return a key to sort the partitions by the values in the path."""
+
+    def _convert(part: str) -> tuple:
+        value = unquote(part.partition("=")[2])
+        for num, func in enumerate([int, float]):
+            try:
+                return num, func(value)
+            except ValueError:
+                pass
+        return 2, value
+
+    return tuple(_convert(part) for part in path.parts)
+
 
 class ParquetStore(BaseStore):
     """Parquet data store."""
 
-    def __init__(self, basedir: StrOrPath) -> None:
-        """Initialize the object."""
-        super().__init__(basedir=basedir)
+    CHECKSUM_MODES = (CHECKSUM_FULL, CHECKSUM_STAT, CHECKSUM_FOOTER)
+
+    def __init__(
+        self,
+        basedir: StrOrPath,
+        checksum_mode: str = CHECKSUM_FULL,
+        partition_cols: Optional[list[str]] = None,
+    ) -> None:
+        """Initialize the object.
+
+        Args:
+            basedir: base directory where the files should be stored.
+            checksum_mode: mode used to calculate the checksums of the files, in CHECKSUM_MODES.
+            partition_cols: if specified, each dataframe is stored as a dataset partitioned by
+                the given columns or index levels, using the Hive layout ``column=value``.
+                The columns are written also in the partitions, so that their dtypes are kept.
+                Any column not present in the dataframe is ignored.
+        """
+        super().__init__(basedir=basedir, checksum_mode=checksum_mode)
+        self._partition_cols = partition_cols or []
         self._dump_options: dict[str, Any] = {
             "engine": "pyarrow",
             # "engine": "fastparquet",
@@ -44,20 +163,173 @@ class ParquetStore(BaseStore):
         """Return the file extension to be used with this specific data store."""
         return "parquet"
 
-    def dump(self, df: pd.DataFrame, name: str) -> None:
-        """Save a dataframe to file, using the given name and the class extension."""
-        path = self.path(name)
+    @property
+    def partitioned(self) -> bool:
+        """Return True if the dataframes are stored as partitioned datasets."""
+        return bool(self._partition_cols)
+
+    def path(self, name: str) -> Path:
+        """Return the full path of the file, or of the directory of the partitioned dataset."""
+        if self.partitioned:
+            return self.basedir / name
+        return super().path(name)
+
+    def delete(self, name: str) -> None:
+        """Delete the file or the partitioned dataset with the given name, if it exists."""
+        if self.partitioned:
+            shutil.rmtree(self.path(name), ignore_errors=True)
+        else:
+            super().delete(name)
+
+    def checksum(self, name: str, mode: Optional[str] = None) -> Optional[str]:
+        """Return a checksum of the file or of the partitioned dataset, or None if missing.
+
+        Args:
+            name: name of the dataframe.
+            mode: mode used to calculate the checksum, or None to use the mode of the store.
+        """
+        if self.partitioned:
+            path = self.path(name)
+            if path.is_dir():
+                mode = mode or self.checksum_mode
+                digest = checksum_json(
+                    {
+                        str(relpath(f, path)): self._file_checksum(f, mode=mode)
+                        for f in self._partition_files(path)
+                    }
+                )
+                return self._with_mode(digest, mode=mode)
+            return None
+        return super().checksum(name, mode=mode)
+
+    def _file_checksum(self, path: Path, mode: str) -> str:
+        """Return the checksum of the given file, calculated with the given mode."""
+        if mode == CHECKSUM_FOOTER:
+            return _footer_checksum(path)
+        return super()._file_checksum(path, mode=mode)
+
+    def _partition_files(self, path: Path) -> list[Path]:
+        """Return the files of the partitioned dataset in the given directory, sorted."""
+        files = [f.relative_to(path) for f in path.glob(f"**/{_PART}.{self.extension}")]
+        return [path / f for f in sorted(files, key=lambda f: _partition_sort_key(f.parent))]
+
+    def _write(self, df: pd.DataFrame, path: Path) -> None:
+        """Write a dataframe to the given path."""
         # Unless the parameter "index" is explicitly enforced, ensure that RangeIndex
         # is converted to Int64Index in MultiIndexes with Pandas >= 1.5.0.
         # See https://github.com/apache/arrow/issues/33030
         index = True if isinstance(df.index, pd.MultiIndex) else None
-        with timed(L.debug, f"Writing {name} to {path}"):
-            df.to_parquet(path=path, **{"index": index, **self._dump_options})
+        df.to_parquet(path=path, **{"index": index, **self._dump_options})
+
+    def _read(
+        self,
+        path: Path,
+        filters: Optional[dict[str, Any]],
+        columns: Optional[list[str]],
+    ) -> pd.DataFrame:
+        """Read a dataframe from the given path, pushing down the filters when possible."""
+        options = dict(self._load_options)
+        remaining = filters
+        names = pq.read_schema(path).names if filters or columns is not None else []
+        if columns is not None:
+            # the column used to restore the order of the rows is always needed
+            options["columns"] = [*columns, _ROW] if _ROW in names else columns
+        if filters and options["engine"] == "pyarrow":
+            parquet_filters, remaining = _to_parquet_filters(filters, names=names)
+            options["filters"] = parquet_filters or None
+        df = pd.read_parquet(path=path, **options)
+        if remaining:
+            df = df.etl.q(remaining)
+        return df
 
-    def load(self, name: str) -> Optional[pd.DataFrame]:
-        """Load a dataframe from file, using the given name and the class extension."""
+    def dump(self, df: pd.DataFrame, name: str) -> None:
+        """Save a dataframe to file, using the given name and the class extension."""
+        path = self.path(name)
+        if not self.partitioned:
+            with timed(L.debug, f"Writing {name} to {path}"):
+                self._write(df, path)
+            return
+        with timed(L.debug, f"Writing {name} to {path} partitioned by {self._partition_cols}"):
+            self.delete(name)
+            for subdir, part_df in self._split(df):
+                (path / subdir).mkdir(parents=True, exist_ok=True)
+                self._write(part_df, path / subdir / f"{_PART}.{self.extension}")
+
+    def _split(self, df: pd.DataFrame) -> Iterator[tuple[Path, pd.DataFrame]]:
+        """Split the dataframe by the partition columns, and yield subdirectories and partitions.
+
+        The partitions are yielded in the same order used when they are loaded.
+        """
+        columns = [
+            col for col in self._partition_cols if col in df.columns or col in df.index.names
+        ]
+        indices = df.groupby(columns, observed=True, dropna=False).indices if columns else {}
+        if not indices or any(pd.isna(v) for key in indices for v in np.atleast_1d(key)):
+            # write a single partition if there are no rows or no partition columns,
+            # or if the partition columns contain null values that cannot be used in the path
+            yield Path(), df
+            return
+        parts = [
+            (Path(*(f"{col}={quote(str(v), safe='')}" for col, v in zip(columns, key))), pos)
+            for key, pos in ((k if len(columns) > 1 else (k,), v) for k, v in indices.items())
+        ]
+        parts.sort(key=lambda item: _partition_sort_key(item[0]))
+        order = np.concatenate([positions for _, positions in parts])
+        if np.any(order[1:] < order[:-1]):
+            # the original order cannot be restored from the order of the partitions
+            df = df.assign(**{_ROW: np.arange(len(df))})
+        for subdir, positions in parts:
+            yield subdir, df.iloc[positions]
+
+    def load(
+        self,
+        name: str,
+        filters: Optional[dict[str, Any]] = None,
+        columns: Optional[list[str]] = None,
+    ) -> Optional[pd.DataFrame]:
+        """Load a dataframe from file, using the given name and the class extension.
+
+        Any filter on the partition columns is used to skip the partitions not selected,
+        and the other filters are pushed down to the parquet reader when possible.
+
+        Args:
+            name: name of the dataframe.
+            filters: optional query dict, accepted by ``etl.q``, used to filter the rows.
+                When the filters are pushed down, the labels of an unnamed RangeIndex
+                are not preserved, and the returned dataframe has a new RangeIndex.
+            columns: optional list of columns to be loaded. The index is always loaded.
+        """
         path = self.path(name)
         if not path.exists():
             return None
-        with timed(L.debug, f"Reading {name} from {path}"):
-            return pd.read_parquet(path=path, **self._load_options)
+        if not self.partitioned:
+            with timed(L.debug, f"Reading {name} from {path}"):
+                return self._read(path, filters=filters, columns=columns)
+        with timed(L.debug, f"Reading {name} from {path}") as messages:
+            files = self._partition_files(path)
+            selected = [f for f in files if self._is_selected(relpath(f.parent, path), filters)]
+            partitions = [self._read(f, filters=filters, columns=columns) for f in selected]
+            messages[:] = [f"Read {name} from {len(selected)}/{len(files)} partitions"]
+            if not partitions:
+                # read the schema from the first partition to return an empty dataframe
+                partitions = [self._read(files[0], filters=None, columns=columns).iloc[:0]]
+            df = concat_partitions(partitions)
+            if _ROW in df.columns:
+                if np.any(np.diff(df[_ROW].to_numpy()) < 0):
+                    df = df.sort_values(_ROW, kind="stable")
+                df = df.drop(columns=_ROW)
+            if not any(df.index.names) and df.index.equals(pd.RangeIndex(len(df))):
+                df.index = pd.RangeIndex(len(df))
+            return df
+
+    @staticmethod
+    def _is_selected(subdir: Path, filters: Optional[dict[str, Any]]) -> bool:
+        """Return True if the partition in subdir is selected by the filters."""
+        if not filters:
+            return True
+        for part in subdir.parts:
+            key, _, value = part.partition("=")
+            values = _partition_values(filters, key)
+            if values is not None and unquote(value) not in values:
+                return False
+        return True
@@ -6,6 +6,7 @@ import itertools
 import json
 import logging
 import os.path
+import sys
 import time
 from collections.abc import Iterable, Iterator
 from contextlib import contextmanager
@@ -19,6 +20,26 @@ import yaml
 from blueetl.constants import DTYPES
 from blueetl.types import StrOrPath
 
+if sys.version_info >= (3, 12):
+    unlocked_cached_property = cached_property
+else:
+
+    class unlocked_cached_property(cached_property):  # pylint: disable=invalid-name
+        """Same as cached_property, without the lock used with Python < 3.12.
+
+        The lock is shared by all the instances of the class, so it would prevent the computation
+        of the same property for different instances in concurrent threads.
+        """
+
+        def __get__(self, instance, owner=None):
+            """Return the cached value, or compute it if needed."""
+            if instance is None:
+                return self
+            instance_dict = instance.__dict__
+            if self.attrname not in instance_dict:
+                instance_dict[self.attrname] = self.func(instance)
+            return instance_dict[self.attrname]
+
 
 class CachedPropertyMixIn:
     """MixIn to be used with classes using cached_property to be skipped when pickled."""
@@ -177,6 +198,23 @@ def checksum(filepath: StrOrPath, chunk_size: int = 65536) -> str:
     return filehash.hexdigest()
 
 
+def fingerprint(filepath: StrOrPath) -> str:
+    """Calculate and return a fingerprint of the given file, without reading its content.
+
+    The fingerprint is based on size, modification time and inode of the file.
+    """
+    stat = os.stat(filepath)
+    return checksum_json([stat.st_size, stat.st_mtime_ns, stat.st_ino])
+
+
+def mtime_ns(filepath: Optional[StrOrPath]) -> Optional[int]:
+    """Return the modification time of the file in nanoseconds, or None if it doesn't exist."""
+    try:
+        return os.stat(filepath).st_mtime_ns if filepath else None
+    except OSError:
+        return None
+
+
 def checksum_str(s: str) -> str:
     """Calculate and return the checksum of the given string."""
     return hashlib.blake2b(s.encode("utf-8")).hexdigest()
@@ -0,0 +1,11 @@
+import os
+
+import pytest
+
+BLUEETL_BENCHMARKS = "BLUEETL_BENCHMARKS"
+
+
+def pytest_runtest_setup(item):
+    # the benchmarks are slow, and they are executed only when explicitly requested
+    if not os.getenv(BLUEETL_BENCHMARKS):
+        pytest.skip(f"Benchmarks are executed only when {BLUEETL_BENCHMARKS} is set")
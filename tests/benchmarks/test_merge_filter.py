@@ -0,0 +1,42 @@
+import time
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from blueetl import parallel as test_module
+from tests.unit.test_parallel import _assert_merge_filter_equal, merge_filter_classic
+
+
+@pytest.mark.parametrize("n_groups", [10, 100, 1000])
+def test_merge_filter_benchmark(n_groups):
+    # compare the time needed to filter the DataFrames with GroupIndex and with one query per key
+    rng = np.random.default_rng(0)
+    n_rows = 100_000
+    df_list = [
+        pd.DataFrame(
+            {
+                "simulation_id": rng.integers(n_groups, size=n_rows),
+                "circuit_id": 0,
+                "gid": np.arange(n_rows),
+                "time": rng.random(n_rows),
+            }
+        ),
+        pd.DataFrame({"simulation_id": np.arange(n_groups), "circuit_id": 0}),
+    ]
+    groupby = ["simulation_id", "circuit_id"]
+
+    start = time.perf_counter()
+    result = [
+        (key, [df.copy() for df in filtered])
+        for key, filtered in test_module.merge_filter(
+            df_list, groupby=groupby, func=lambda key, df_list: (key, df_list), parallel=False
+        )
+    ]
+    elapsed_new = time.perf_counter() - start
+    start = time.perf_counter()
+    expected = list(merge_filter_classic(df_list, groupby=groupby))
+    elapsed_old = time.perf_counter() - start
+    print(f"groups={n_groups} group_index={elapsed_new:.3f}s query={elapsed_old:.3f}s")
+
+    _assert_merge_filter_equal(result, expected)
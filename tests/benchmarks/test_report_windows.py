@@ -0,0 +1,34 @@
+import time
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from blueetl.adapters.interfaces.simulation import PopulationReportInterface
+from tests.unit.adapters.test_simulation import _get_synthetic_report
+
+
+@pytest.mark.parametrize("n_trials", [10, 100])
+def test_population_report_get_windows_benchmark(tmp_path, n_trials):
+    # compare the time needed to read the windows in batches and with one read per window
+    dt = 0.1
+    report = _get_synthetic_report(
+        tmp_path, n_frames=100_000, dt=dt, t_start=0.0, elements_per_node=10
+    )
+    # overlapping windows repeated for each trial, as in the windows with trial_steps
+    windows = [
+        (offset + start, offset + start + duration, None)
+        for offset in np.arange(n_trials) * 10_000 / n_trials
+        for start, duration in [(0.0, 50.0), (20.0, 30.0), (0.0, 100.0)]
+    ]
+
+    start = time.perf_counter()
+    result = report.get_windows([0, 1, 2], windows=windows)
+    elapsed_new = time.perf_counter() - start
+    start = time.perf_counter()
+    expected = PopulationReportInterface.get_windows(report, [0, 1, 2], windows=windows)
+    elapsed_old = time.perf_counter() - start
+    print(f"trials={n_trials} batched={elapsed_new:.3f}s per_window={elapsed_old:.3f}s")
+
+    for df, expected_df in zip(result, expected):
+        pd.testing.assert_frame_equal(df, expected_df)
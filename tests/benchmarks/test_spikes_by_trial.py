@@ -0,0 +1,26 @@
+import time
+
+import pytest
+from pandas.testing import assert_frame_equal
+
+from blueetl.external.bnac import calculate_features as test_module
+from tests.unit.external.bnac.test_calculate_features import (
+    _get_spikes_by_trial_classic,
+    _get_spikes_df,
+)
+
+
+@pytest.mark.parametrize("n_neurons", [1000, 10_000])
+def test_get_spikes_by_trial_benchmark(n_neurons):
+    # compare the time needed to aggregate the spikes with and without the lambda function
+    df = _get_spikes_df(n_neurons, n_trials=10, n_spikes=20 * n_neurons)
+
+    start = time.perf_counter()
+    result = test_module._get_spikes_by_trial(df)
+    elapsed_new = time.perf_counter() - start
+    start = time.perf_counter()
+    expected = _get_spikes_by_trial_classic(df)
+    elapsed_old = time.perf_counter() - start
+    print(f"neurons={n_neurons} vectorized={elapsed_new:.3f}s groupby={elapsed_old:.3f}s")
+
+    assert_frame_equal(result, expected)
@@ -1,12 +1,22 @@
+import json
+import os
 import pickle
 from pathlib import Path
+from unittest.mock import Mock
 
 import pytest
+from numpy.testing import assert_array_equal
+from pandas.testing import assert_frame_equal
 
 from blueetl.adapters import circuit as test_module
 from blueetl.adapters.base import AdapterError
 from blueetl.adapters.node_sets import NodeSetsAdapter
-from tests.unit.utils import BLUEPY_AVAILABLE, TEST_DATA_PATH, assert_isinstance
+from tests.unit.utils import (
+    BLUEPY_AVAILABLE,
+    TEST_CIRCUIT_CONFIG,
+    TEST_DATA_PATH,
+    assert_isinstance,
+)
 
 
 @pytest.mark.parametrize(
@@ -58,7 +68,7 @@ def test_circuit_adapter(path, population, expected_classes, monkeypatch):
     assert isinstance(loaded, test_module.CircuitAdapter)
     assert_isinstance(loaded.instance, expected_classes["circuit"])
     # no cached_properties should be loaded after unpickling
-    assert sorted(loaded.__dict__) == ["_impl"]
+    assert sorted(loaded.__dict__) == ["_checksum", "_impl", "_loader"]
     assert sorted(loaded._impl.__dict__) == ["_circuit"]
 
 
@@ -93,3 +103,97 @@ def test_circuit_adapter_node_sets():
     assert obj.node_sets_file.name == "node_sets.json"
 
     assert isinstance(obj.node_sets, NodeSetsAdapter)
+
+
+def test_circuit_adapter_checksum_is_memoized(monkeypatch):
+    obj = test_module.CircuitAdapter.from_file(TEST_CIRCUIT_CONFIG)
+    checksum = obj.checksum()
+
+    # the checksum isn't calculated again
+    monkeypatch.setattr(obj._impl, "checksum", None)
+    assert obj.checksum() == checksum
+
+
+def test_circuit_adapter_get_cells():
+    obj = test_module.CircuitAdapter.from_file(TEST_CIRCUIT_CONFIG)
+    expected = obj.nodes["default"].get(group="Node2012", properties=["mtype", "x"])
+
+    result = obj.get_cells("default", "Node2012", None, properties=["x"])
+    assert_frame_equal(result, expected[["x"]])
+
+    # the cells are loaded again with all the properties, and then they are cached
+    result = obj.get_cells("default", "Node2012", None, properties=["x", "mtype"])
+    assert_frame_equal(result, expected[["x", "mtype"]])
+    cached = obj._cells_cache[("default", "Node2012", None)]
+    assert sorted(cached.columns) == ["mtype", "x"]
+
+    result = obj.get_cells("default", "Node2012", None, properties=["mtype"])
+    assert_frame_equal(result, expected[["mtype"]])
+    assert obj._cells_cache[("default", "Node2012", None)] is cached
+
+    # the empty node_set selects all the cells
+    result = obj.get_cells("default", "", None, properties=["x"])
+    assert_frame_equal(result, obj.nodes["default"].get(properties=["x"]))
+
+
+def test_circuit_adapter_get_node_ids(tmp_path):
+    node_sets_file = tmp_path / "node_sets.json"
+    node_sets_file.write_text(json.dumps({"ExtraNodes": {"node_id": [0, 2]}}))
+    obj = test_module.CircuitAdapter.from_file(TEST_CIRCUIT_CONFIG)
+
+    result = obj.get_node_ids("default", "ExtraNodes", node_sets_file)
+    assert_array_equal(result, [0, 2])
+    assert obj.get_node_ids("default", "ExtraNodes", node_sets_file) is result
+    assert_array_equal(obj.get_node_ids("default", None, None), [0, 1, 2])
+
+    # the cached nodes and the checksum aren't pickled
+    obj.checksum()
+    loaded = pickle.loads(pickle.dumps(obj))
+    assert sorted(loaded.__dict__) == ["_checksum", "_impl", "_loader"]
+    assert loaded._checksum is None
+
+    obj.clear_nodes_cache()
+    assert sorted(obj.__dict__) == ["_checksum", "_impl", "_loader"]
+
+
+def test_circuit_registry(tmp_path):
+    path = tmp_path / "circuit_config.json"
+    path.write_text(TEST_CIRCUIT_CONFIG.read_text())
+    factory = Mock(side_effect=lambda: test_module.CircuitAdapter.from_file_lazy(path))
+
+    # without an active registry, the circuits aren't registered
+    assert test_module.CircuitRegistry.active() is None
+    assert test_module.CircuitRegistry.get(path, factory) is not None
+    assert test_module.CircuitRegistry.get(path, factory) is not None
+    assert factory.call_count == 2
+
+    registry = test_module.CircuitRegistry()
+    with registry.activate():
+        assert test_module.CircuitRegistry.active() is registry
+        circuit = test_module.CircuitRegistry.get(path, factory)
+        assert test_module.CircuitRegistry.get(path, factory) is circuit
+        assert factory.call_count == 3
+
+        # the circuit config is modified
+        os.utime(path, ns=(0, 0))
+        other_circuit = test_module.CircuitRegistry.get(path, factory)
+        assert other_circuit is not circuit
+        assert factory.call_count == 4
+
+        # the circuit isn't registered if the config doesn't exist
+        nonexistent_path = tmp_path / "nonexistent.json"
+        assert test_module.CircuitRegistry.get(nonexistent_path, factory) is not None
+        assert test_module.CircuitRegistry.get(nonexistent_path, factory) is not None
+        assert factory.call_count == 6
+    assert test_module.CircuitRegistry.active() is None
+
+    other_circuit._cells_cache = {}
+    registry.clear_nodes_cache()
+    assert "_cells_cache" not in other_circuit.__dict__
+    with registry.activate():
+        assert test_module.CircuitRegistry.get(path, factory) is other_circuit
+
+    registry.clear()
+    with registry.activate():
+        assert test_module.CircuitRegistry.get(path, factory) is not other_circuit
+    assert factory.call_count == 7
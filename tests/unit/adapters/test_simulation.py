@@ -1,10 +1,17 @@
+import json
 import pickle
 from pathlib import Path
 
+import h5py
+import numpy as np
+import pandas as pd
 import pytest
 
 from blueetl.adapters import simulation as test_module
 from blueetl.adapters.base import AdapterError
+from blueetl.adapters.circuit import CircuitRegistry
+from blueetl.adapters.impl.bluepysnap import simulation as snap_module
+from blueetl.adapters.interfaces.simulation import PopulationReportInterface
 from tests.unit.utils import BLUEPY_AVAILABLE, TEST_DATA_PATH, assert_isinstance
 
 
@@ -20,8 +27,8 @@ from tests.unit.utils import BLUEPY_AVAILABLE, TEST_DATA_PATH, assert_isinstance
                     "simulation": "bluepysnap.Simulation",
                     "population": "bluepysnap.nodes.NodePopulation",
                     "spikes": "bluepysnap.spike_report.PopulationSpikeReport",
-                    "soma_report": "bluepysnap.frame_report.PopulationSomaReport",
-                    "section_report": "bluepysnap.frame_report.PopulationCompartmentReport",
+                    "soma_report": "blueetl.adapters.impl.bluepysnap.simulation.PopulationReportImpl",
+                    "section_report": "blueetl.adapters.impl.bluepysnap.simulation.PopulationReportImpl",
                 },
                 id="snap",
             )
@@ -72,7 +79,7 @@ def test_simulation_adapter(path, population, reports, expected_classes, monkeyp
     assert isinstance(loaded, test_module.SimulationAdapter)
     assert_isinstance(loaded.instance, expected_classes["simulation"])
     # no cached_properties should be loaded after unpickling
-    assert sorted(loaded.__dict__) == ["_impl"]
+    assert sorted(loaded.__dict__) == ["_impl", "_loader"]
     assert sorted(loaded._impl.__dict__) == ["_simulation"]
 
 
@@ -99,3 +106,168 @@ def test_simulation_adapter_with_nonexistent_path():
 
     assert isinstance(loaded, test_module.SimulationAdapter)
     assert loaded.instance is None
+
+
+def test_simulation_adapter_lazy(monkeypatch):
+    path = TEST_DATA_PATH / "simulation" / "sonata" / "simulation_config.json"
+    monkeypatch.chdir(path.parent)
+    expected = test_module.SimulationAdapter.from_file(path)
+    obj = test_module.SimulationAdapter.from_file_lazy(path)
+    circuit = obj.lazy_circuit(checksum="known")
+
+    # the checksum is known, so the circuit isn't loaded
+    assert circuit.checksum() == "known"
+    assert obj.loaded is False
+    assert circuit.loaded is False
+
+    # the pickled objects aren't loaded, and the known checksum isn't pickled
+    loaded_obj, loaded_circuit = pickle.loads(pickle.dumps((obj, circuit)))
+    assert loaded_obj.loaded is False
+    assert loaded_circuit.loaded is False
+    assert loaded_circuit.checksum() == expected.circuit.checksum()
+    assert loaded_circuit.loaded is True
+
+    assert obj.exists() is True
+    assert obj.loaded is True
+    assert obj.is_complete() is True
+    assert obj.spikes_file == expected.spikes_file
+    assert_isinstance(obj.instance, "bluepysnap.Simulation")
+    assert sorted(obj.__dict__) == ["_impl", "_loader"]
+
+
+def test_simulation_adapter_lazy_with_nonexistent_path():
+    obj = test_module.SimulationAdapter.from_file_lazy(Path("path/to/simulation_config.json"))
+
+    assert obj.loaded is False
+    assert obj.exists() is False
+    assert obj.loaded is True
+
+
+def _write_sonata_report(path, node_ids, n_frames, dt, t_start, elements_per_node):
+    # write a synthetic SONATA report with random values for the given nodes
+    node_ids = np.asarray(node_ids, dtype=np.uint64)
+    rng = np.random.default_rng(0)
+    with h5py.File(path, "w") as f:
+        group = f.create_group("report/default")
+        data = rng.random((n_frames, len(node_ids) * elements_per_node), dtype=np.float32)
+        group.create_dataset("data", data=data).attrs["units"] = "mV"
+        mapping = group.create_group("mapping")
+        mapping.create_dataset("node_ids", data=node_ids).attrs["sorted"] = 1
+        mapping.create_dataset(
+            "index_pointers",
+            data=np.arange(len(node_ids) + 1, dtype=np.uint64) * elements_per_node,
+        )
+        mapping.create_dataset(
+            "element_ids",
+            data=np.tile(np.arange(elements_per_node, dtype=np.uint32), len(node_ids)),
+        )
+        time_range = [t_start, t_start + n_frames * dt, dt]
+        mapping.create_dataset("time", data=time_range).attrs["units"] = "ms"
+
+
+def _get_synthetic_report(tmp_path, n_frames, dt, t_start, elements_per_node):
+    _write_sonata_report(
+        tmp_path / "report.h5",
+        node_ids=[0, 1, 2],
+        n_frames=n_frames,
+        dt=dt,
+        t_start=t_start,
+        elements_per_node=elements_per_node,
+    )
+    config = {
+        "run": {"tstop": t_start + n_frames * dt, "dt": dt, "random_seed": 0},
+        "network": str(TEST_DATA_PATH / "circuit" / "sonata" / "circuit_config.json"),
+        "output": {"output_dir": str(tmp_path), "spikes_file": "spikes.h5"},
+        "reports": {
+            "report": {
+                "cells": "Layer23",
+                "variable_name": "v",
+                "sections": "soma" if elements_per_node == 1 else "all",
+                "type": "compartment",
+                "file_name": "report",
+                "start_time": t_start,
+                "end_time": t_start + n_frames * dt,
+                "dt": dt,
+            }
+        },
+    }
+    path = tmp_path / "simulation_config.json"
+    path.write_text(json.dumps(config))
+    obj = test_module.SimulationAdapter.from_file(path)
+    return obj.reports["report"]["default"]
+
+
+@pytest.mark.parametrize(
+    "windows",
+    [
+        [(0.0, 0.0, None)],
+        [(0.0, 10.0, None), (10.0, 20.0, None)],
+        [(5.0, 15.0, None), (0.0, 10.0, None), (2.5, 3.5, None)],
+        [(1.05, 2.05, None), (1.0, 2.0, 0.2), (30.0, 31.0, 0.3), (39.9, 50.0, None)],
+        [(20.0, 21.0, 0.1), (20.0, 21.0, 0.3)],
+        [(45.0, 50.0, None), (0.0, 1.0, None)],
+    ],
+)
+@pytest.mark.parametrize(
+    "dt, t_start, elements_per_node",
+    [
+        (0.1, 0.0, 1),
+        (0.025, 1.0, 1),
+        (0.1, 0.0, 3),
+    ],
+)
+def test_population_report_get_windows(tmp_path, windows, dt, t_start, elements_per_node):
+    report = _get_synthetic_report(
+        tmp_path,
+        n_frames=round(50 / dt),
+        dt=dt,
+        t_start=t_start,
+        elements_per_node=elements_per_node,
+    )
+    assert isinstance(report, snap_module.PopulationReportImpl)
+    # the windows are relative to the start time of the report
+    windows = [(t_start + start, t_start + stop, step) for start, stop, step in windows]
+
+    result = report.get_windows([0, 2], windows=windows)
+    expected = PopulationReportInterface.get_windows(report, [0, 2], windows=windows)
+
+    assert len(result) == len(expected)
+    for df, expected_df in zip(result, expected):
+        pd.testing.assert_frame_equal(df, expected_df)
+
+
+def test_population_report_get_windows_raises(tmp_path):
+    report = _get_synthetic_report(tmp_path, n_frames=100, dt=0.1, t_start=0.0, elements_per_node=1)
+
+    with pytest.raises(snap_module.BluepySnapError, match="Invalid t_step=0.01"):
+        report.get_windows([0], windows=[(0.0, 5.0, None), (1.0, 2.0, 0.01)])
+
+
+@pytest.mark.parametrize(
+    "windows, expected",
+    [
+        ([], []),
+        ([(0, 10, None)], [([0], 0, 10)]),
+        ([(5, 15, None), (0, 10, None)], [([1, 0], 0, 15)]),
+        ([(0, 10, None), (10.5, 20, None)], [([0, 1], 0, 20)]),
+        ([(0, 10, None), (12, 20, None), (1, 2, None)], [([0, 2], 0, 10), ([1], 12, 20)]),
+    ],
+)
+def test_merge_windows(windows, expected):
+    result = snap_module._merge_windows(windows, gap=1)
+    assert result == expected
+
+
+def test_simulation_adapter_shared_circuit(monkeypatch):
+    path = TEST_DATA_PATH / "simulation" / "sonata" / "simulation_config.json"
+    monkeypatch.chdir(path.parent)
+    obj1 = test_module.SimulationAdapter.from_file(path)
+    obj2 = test_module.SimulationAdapter.from_file(path)
+
+    # the circuit is shared by the simulations using the same circuit config
+    assert obj1.circuit_config_path.name == "circuit_config.json"
+    with CircuitRegistry().activate():
+        assert obj1.circuit is obj2.circuit
+        assert obj1.circuit.checksum() == obj2.circuit.checksum()
+    # the circuit isn't shared without an active registry
+    assert obj1.circuit is not obj2.circuit
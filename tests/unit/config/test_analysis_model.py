@@ -22,3 +22,14 @@ def test_analysis_model(config_file):
     config_dict = load_yaml(config_file)
     config = test_module.MultiAnalysisConfig.model_validate(config_dict)
     assert isinstance(config, test_module.MultiAnalysisConfig)
+
+
+@pytest.mark.parametrize("report_type", ["soma", "compartment"])
+def test_report_config_with_wide_storage(report_type):
+    config = test_module.ReportConfig(type=report_type, name="report", storage="wide")
+    assert config.storage == "wide"
+
+
+def test_report_config_with_wide_storage_not_supported():
+    with pytest.raises(ValueError, match="storage=wide is supported only for soma and compartment"):
+        test_module.ReportConfig(type="spikes", storage="wide")
@@ -22,14 +22,18 @@ def global_config():
 
 
 @pytest.fixture
-def repo(global_config):
+def repo(global_config, tmp_path):
     simulations_config = SimulationCampaign.load(global_config.simulation_campaign)
     extraction_config = global_config.analysis["spikes"].extraction
     cache_manager = PicklableMock(
         is_repo_cached=PicklableMock(return_value=False),
         load_repo=PicklableMock(return_value=None),
+        load_repo_partitions=PicklableMock(return_value={}),
         load_features=PicklableMock(return_value=None),
         get_cached_features_checksums=PicklableMock(return_value={}),
+        simulations_status_path=tmp_path / "simulations_status.cached.json",
+        dynamic_offsets_path=tmp_path / "dynamic_offsets.cached.json",
+        readonly=False,
     )
     simulations_filter = global_config.simulations_filter
     resolver = PicklableMock()
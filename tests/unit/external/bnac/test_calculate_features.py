@@ -0,0 +1,75 @@
+import numpy as np
+import pandas as pd
+import pytest
+from pandas.testing import assert_frame_equal
+
+from blueetl.constants import COUNT, GID, NEURON_CLASS_INDEX, TIME, TIMES, TRIAL
+from blueetl.external.bnac import calculate_features as test_module
+
+
+def _get_spikes_by_trial_classic(df):
+    # previous implementation, used as reference
+    return df.groupby([TRIAL, GID, NEURON_CLASS_INDEX])[TIME].agg(
+        **{
+            COUNT: "count",
+            test_module.FIRST: "min",
+            TIMES: lambda x: [i for i in x if not np.isnan(i)],
+        }
+    )
+
+
+def _get_spikes_df(n_neurons, n_trials, n_spikes, seed=0):
+    # df similar to the one passed to the features functions, with nan for neurons without spikes
+    rng = np.random.default_rng(seed)
+    gids = rng.choice(np.arange(10 * n_neurons), size=n_neurons, replace=False)
+    neurons = pd.DataFrame({GID: gids, NEURON_CLASS_INDEX: np.arange(n_neurons)})
+    trials = pd.DataFrame({TRIAL: np.arange(n_trials, dtype=np.int16)})
+    spikes = pd.DataFrame(
+        {
+            TRIAL: rng.integers(n_trials, size=n_spikes).astype(np.int16),
+            GID: rng.choice(gids[: n_neurons // 2 + 1], size=n_spikes),
+            TIME: rng.random(n_spikes) * 1000,
+        }
+    )
+    return neurons.merge(trials, how="cross").merge(spikes, how="left")
+
+
+@pytest.mark.parametrize(
+    "n_neurons, n_trials, n_spikes",
+    [
+        (1, 1, 0),
+        (1, 1, 1),
+        (5, 1, 20),
+        (5, 3, 20),
+        (50, 4, 1000),
+    ],
+)
+def test_get_spikes_by_trial(n_neurons, n_trials, n_spikes):
+    df = _get_spikes_df(n_neurons, n_trials, n_spikes)
+
+    result = test_module._get_spikes_by_trial(df)
+
+    expected = _get_spikes_by_trial_classic(df)
+    assert_frame_equal(result, expected)
+
+
+def test_get_spikes_by_trial_empty():
+    df = _get_spikes_df(5, 2, 10).iloc[:0]
+
+    result = test_module._get_spikes_by_trial(df)
+
+    expected = _get_spikes_by_trial_classic(df)
+    assert_frame_equal(result, expected)
+
+
+def test_get_spikes_by_trial_with_nan_keys():
+    df = _get_spikes_df(5, 3, 20)
+    n_groups = len(_get_spikes_by_trial_classic(df))
+    # the rows of one neuron in all the trials
+    df.loc[df[GID] == df[GID].iloc[0], GID] = np.nan
+
+    result = test_module._get_spikes_by_trial(df)
+
+    expected = _get_spikes_by_trial_classic(df)
+    assert_frame_equal(result, expected)
+    assert len(result) == n_groups - 3
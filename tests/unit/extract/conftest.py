@@ -3,6 +3,7 @@ from unittest.mock import MagicMock
 import pandas as pd
 import pytest
 
+from blueetl.adapters.circuit import CircuitAdapter
 from tests.unit.utils import TEST_NODE_SETS_FILE
 
 
@@ -47,7 +48,7 @@ def _get_cells():
 
 @pytest.fixture
 def mock_circuit():
-    """Simplified mock of circuit, providing only get() and ids() for a node population."""
+    """Circuit wrapping a simplified mock, providing only get() and ids() for a node population."""
     mock = MagicMock()
     mock.node_sets_file = str(TEST_NODE_SETS_FILE)
     df = _get_cells()
@@ -57,7 +58,7 @@ def mock_circuit():
     mock_population.get.return_value = df
     # circuit.nodes[population].ids()
     mock_population.ids.return_value = df.index.to_numpy()
-    return mock
+    return CircuitAdapter(mock)
 
 
 @pytest.fixture
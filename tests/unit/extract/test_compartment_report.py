@@ -1,10 +1,13 @@
 import os
+from functools import partial
 from unittest.mock import MagicMock, Mock, PropertyMock, patch
 
 import pandas as pd
+import pytest
 from blueetl_core.constants import BLUEETL_JOBLIB_JOBS
 from pandas.testing import assert_frame_equal
 
+from blueetl.adapters.interfaces.simulation import PopulationReportInterface
 from blueetl.constants import (
     CIRCUIT,
     CIRCUIT_ID,
@@ -55,13 +58,17 @@ def _get_compartment_report(group=None, t_start=None, t_stop=None, t_step=None):
     return df.etl.q(time={"ge": t_start, "lt": t_stop})[list(group)]
 
 
+@pytest.mark.parametrize("storage", ["long", "wide"])
 @patch.dict(os.environ, {BLUEETL_JOBLIB_JOBS: "1"})
-def test_compartment_report_from_simulations():
+def test_compartment_report_from_simulations(storage):
     mock_circuit = MagicMock()
     mock_sim = MagicMock()
     _report_by_type = mock_sim.reports.__getitem__.return_value
     _report_by_pop = _report_by_type.__getitem__.return_value
     _report_by_pop.get.side_effect = _get_compartment_report
+    _report_by_pop.get_windows.side_effect = partial(
+        PopulationReportInterface.get_windows, _report_by_pop
+    )
     mock_simulations_df = PropertyMock(
         return_value=pd.DataFrame(
             [
@@ -140,6 +147,7 @@ def test_compartment_report_from_simulations():
         windows=mock_windows,
         neuron_classes=mock_neuron_classes,
         name="AllCompartments",
+        storage=storage,
     )
 
     expected_df = pd.DataFrame(
@@ -150,6 +158,7 @@ def test_compartment_report_from_simulations():
                 "time": 20.0,
                 "value": -72.3,
                 "window": "w1",
+                "trial": 0,
                 "simulation_id": 0,
                 "circuit_id": 0,
                 "neuron_class": "L23_EXC",
@@ -160,6 +169,7 @@ def test_compartment_report_from_simulations():
                 "time": 20.5,
                 "value": -72.5,
                 "window": "w1",
+                "trial": 0,
                 "simulation_id": 0,
                 "circuit_id": 0,
                 "neuron_class": "L23_EXC",
@@ -170,6 +180,7 @@ def test_compartment_report_from_simulations():
                 "time": 20.0,
                 "value": -70.8,
                 "window": "w1",
+                "trial": 0,
                 "simulation_id": 0,
                 "circuit_id": 0,
                 "neuron_class": "L23_EXC",
@@ -180,6 +191,7 @@ def test_compartment_report_from_simulations():
                 "time": 20.5,
                 "value": -71.0,
                 "window": "w1",
+                "trial": 0,
                 "simulation_id": 0,
                 "circuit_id": 0,
                 "neuron_class": "L23_EXC",
@@ -190,6 +202,7 @@ def test_compartment_report_from_simulations():
                 "time": 20.0,
                 "value": -69.8,
                 "window": "w1",
+                "trial": 0,
                 "simulation_id": 0,
                 "circuit_id": 0,
                 "neuron_class": "L23_EXC",
@@ -200,6 +213,7 @@ def test_compartment_report_from_simulations():
                 "time": 20.5,
                 "value": -70.0,
                 "window": "w1",
+                "trial": 0,
                 "simulation_id": 0,
                 "circuit_id": 0,
                 "neuron_class": "L23_EXC",
@@ -210,6 +224,7 @@ def test_compartment_report_from_simulations():
                 "time": 20.0,
                 "value": -72.1,
                 "window": "w1",
+                "trial": 0,
                 "simulation_id": 0,
                 "circuit_id": 0,
                 "neuron_class": "L23_EXC",
@@ -220,6 +235,7 @@ def test_compartment_report_from_simulations():
                 "time": 20.5,
                 "value": -72.2,
                 "window": "w1",
+                "trial": 0,
                 "simulation_id": 0,
                 "circuit_id": 0,
                 "neuron_class": "L23_EXC",
@@ -230,6 +246,7 @@ def test_compartment_report_from_simulations():
                 "time": 20.0,
                 "value": -73.2,
                 "window": "w1",
+                "trial": 0,
                 "simulation_id": 0,
                 "circuit_id": 0,
                 "neuron_class": "L4_EXC",
@@ -240,6 +257,7 @@ def test_compartment_report_from_simulations():
                 "time": 20.5,
                 "value": -73.4,
                 "window": "w1",
+                "trial": 0,
                 "simulation_id": 0,
                 "circuit_id": 0,
                 "neuron_class": "L4_EXC",
@@ -250,6 +268,7 @@ def test_compartment_report_from_simulations():
                 "time": 20.0,
                 "value": -73.3,
                 "window": "w1",
+                "trial": 0,
                 "simulation_id": 0,
                 "circuit_id": 0,
                 "neuron_class": "L4_EXC",
@@ -260,6 +279,7 @@ def test_compartment_report_from_simulations():
                 "time": 20.5,
                 "value": -73.5,
                 "window": "w1",
+                "trial": 0,
                 "simulation_id": 0,
                 "circuit_id": 0,
                 "neuron_class": "L4_EXC",
@@ -269,6 +289,16 @@ def test_compartment_report_from_simulations():
     expected_df = ensure_dtypes(expected_df)
     assert isinstance(result, test_module.CompartmentReport)
     assert_frame_equal(result.df, expected_df)
+    assert result.storage == storage
+    if storage == "wide":
+        # one block for each neuron class and window
+        assert len(result.wide_df) == 2
+    else:
+        assert result.wide_df is None
+    # the dataframe can be stored and loaded in the same format
+    loaded = test_module.CompartmentReport.from_pandas(result.to_pandas())
+    assert loaded.storage == storage
+    assert_frame_equal(loaded.df, expected_df)
     assert mock_simulations_df.call_count == 1
     assert mock_neurons_df.call_count == 1
     assert mock_windows_df.call_count == 1
@@ -1,12 +1,24 @@
-from unittest.mock import Mock, PropertyMock
+import os
+from unittest.mock import Mock, PropertyMock, patch
 
 import numpy as np
 import pandas as pd
 import pytest
+from blueetl_core.constants import BLUEETL_JOBLIB_JOBS
 from pandas.testing import assert_frame_equal, assert_series_equal
 
+from blueetl.adapters.circuit import CircuitAdapter
 from blueetl.config.analysis_model import NeuronClassConfig
-from blueetl.constants import CIRCUIT, CIRCUIT_ID, GID, NEURON_CLASS, SIMULATION, SIMULATION_ID
+from blueetl.constants import (
+    CIRCUIT,
+    CIRCUIT_ID,
+    GID,
+    NEURON_CLASS,
+    NEURON_CLASS_INDEX,
+    SIMULATION,
+    SIMULATION_ID,
+)
+from blueetl.extract import neurons as test_module
 from blueetl.extract.neurons import Neurons
 from blueetl.utils import ensure_dtypes
 from tests.unit.utils import TEST_NODE_SETS_FILE_EXTRA
@@ -86,6 +98,43 @@ def test_neurons_from_simulations(mock_circuit):
     assert mock_simulations_df.call_count == 1
 
 
+@patch.dict(os.environ, {BLUEETL_JOBLIB_JOBS: "1"})
+def test_neurons_from_simulations_with_multiple_circuits(mock_circuit):
+    # different circuits with the same nodes
+    other_circuit = CircuitAdapter(mock_circuit._impl)
+    mock_simulations = Mock()
+    type(mock_simulations).df = PropertyMock(
+        return_value=pd.DataFrame(
+            [
+                {SIMULATION_ID: 0, CIRCUIT_ID: 0, SIMULATION: Mock(), CIRCUIT: mock_circuit},
+                {SIMULATION_ID: 1, CIRCUIT_ID: 1, SIMULATION: Mock(), CIRCUIT: other_circuit},
+            ]
+        )
+    )
+    neuron_classes = {
+        "INH": NeuronClassConfig.model_validate(
+            {"population": "thalamus_neurons", "query": {"synapse_class": ["INH"]}}
+        ),
+        "LIMITED": NeuronClassConfig.model_validate(
+            {"population": "thalamus_neurons", "query": {"synapse_class": ["INH"]}, "limit": 1}
+        ),
+    }
+
+    results = []
+    for _ in range(2):
+        # the random selection is reproducible when the seed is set
+        np.random.seed(0)
+        results.append(
+            Neurons.from_simulations(simulations=mock_simulations, neuron_classes=neuron_classes)
+        )
+
+    assert_frame_equal(results[0].df, results[1].df)
+    counts = results[0].count_by_neuron_class()
+    assert counts.to_dict() == {(0, "INH"): 2, (0, "LIMITED"): 1, (1, "INH"): 2, (1, "LIMITED"): 1}
+    # the cells are loaded once for each circuit, and cached for the following extractions
+    assert mock_circuit.nodes.__getitem__.return_value.get.call_count == 2
+
+
 def test_neurons_from_simulations_without_neurons(mock_circuit):
     mock_simulations_df = PropertyMock(
         return_value=pd.DataFrame(
@@ -152,3 +201,83 @@ def test_neurons_count_by_neuron_class():
     ).set_index([CIRCUIT_ID, NEURON_CLASS])[GID]
 
     assert_series_equal(result, expected_series)
+
+
+def test_neurons_get_count_and_gids():
+    df = pd.DataFrame(
+        [
+            # unsorted rows and neuron classes
+            [1, "NC1", 100, 0],
+            [0, "NC2", 300, 1],
+            [0, "NC1", 200, 1],
+            [0, "NC2", 100, 0],
+            [0, "NC1", 100, 0],
+        ],
+        columns=[CIRCUIT_ID, NEURON_CLASS, GID, NEURON_CLASS_INDEX],
+    )
+    df[NEURON_CLASS] = pd.Categorical(df[NEURON_CLASS], categories=["NC2", "NC1"])
+    neurons = Neurons.from_pandas(df)
+
+    assert neurons.neuron_class_offsets == {
+        (0, "NC2"): (0, 2),
+        (0, "NC1"): (2, 2),
+        (1, "NC1"): (4, 1),
+    }
+    assert neurons.get_count(0, "NC1") == 2
+    assert neurons.get_count(np.int16(1), "NC1") == 1
+    assert neurons.get_count(1, "NC2") == 0
+    assert neurons.get_count(2, "NC1") == 0
+    np.testing.assert_array_equal(neurons.get_gids(0, "NC1"), [100, 200])
+    np.testing.assert_array_equal(neurons.get_gids(0, "NC2"), [100, 300])
+    np.testing.assert_array_equal(neurons.get_gids(1, "NC1"), [100])
+    np.testing.assert_array_equal(neurons.get_gids(1, "NC2"), [])
+    for (circuit_id, neuron_class), (_, count) in neurons.neuron_class_offsets.items():
+        selected = neurons.df.etl.q(circuit_id=circuit_id, neuron_class=neuron_class)
+        assert count == len(selected)
+        np.testing.assert_array_equal(neurons.get_gids(circuit_id, neuron_class), selected[GID])
+    with pytest.raises(ValueError, match="read-only"):
+        neurons.get_gids(0, "NC1")[0] = 0
+
+
+@pytest.mark.parametrize(
+    "data, expected",
+    [
+        ({"a": [], "b": []}, True),
+        ({"a": [1], "b": [2]}, True),
+        ({"a": [0, 0, 1, 1], "b": [1, 2, 0, 1]}, True),
+        ({"a": [0, 0, 1, 1], "b": [1, 1, 0, 0]}, True),
+        ({"a": [0, 0, 1, 1], "b": [2, 1, 0, 1]}, False),
+        ({"a": [0, 1, 0], "b": [0, 0, 0]}, False),
+        ({"a": pd.Categorical(["x", "y"], categories=["y", "x"]), "b": [0, 0]}, False),
+        ({"a": pd.Categorical(["x", "y"]), "b": [1, 0]}, True),
+        ({"a": pd.Categorical(["y", "x"]), "b": [0, 1]}, False),
+    ],
+)
+def test_is_sorted(data, expected):
+    df = pd.DataFrame(data)
+    assert test_module._is_sorted(df, ["a", "b"]) is expected
+    assert df.equals(df.sort_values(["a", "b"])) is expected
+
+
+def test_neurons_build_dataframe():
+    gids_by_circuit = {
+        1: {"B": np.array([5, 7]), "A": np.array([3])},
+        0: {"B": np.array([1, 2, 4]), "C": np.array([], dtype=np.int64)},
+    }
+    expected = pd.DataFrame(
+        [
+            {"circuit_id": 0, "neuron_class": "B", "gid": 1, "neuron_class_index": 0},
+            {"circuit_id": 0, "neuron_class": "B", "gid": 2, "neuron_class_index": 1},
+            {"circuit_id": 0, "neuron_class": "B", "gid": 4, "neuron_class_index": 2},
+            {"circuit_id": 1, "neuron_class": "A", "gid": 3, "neuron_class_index": 0},
+            {"circuit_id": 1, "neuron_class": "B", "gid": 5, "neuron_class_index": 0},
+            {"circuit_id": 1, "neuron_class": "B", "gid": 7, "neuron_class_index": 1},
+        ]
+    )
+
+    df = Neurons._build_dataframe(gids_by_circuit)
+    result = Neurons(df, cached=False, filtered=False)
+
+    assert test_module._is_sorted(df, Neurons.COLUMNS) is True
+    assert df[NEURON_CLASS].cat.categories.to_list() == ["A", "B"]
+    assert_frame_equal(result.df, ensure_dtypes(expected))
@@ -1,9 +1,11 @@
-from unittest.mock import MagicMock, Mock, patch
+import os
+from unittest.mock import MagicMock, Mock, call, patch
 
 import pandas as pd
 import pytest
 from pandas.testing import assert_frame_equal
 
+from blueetl.adapters.circuit import CircuitAdapter, CircuitRegistry
 from blueetl.campaign.config import SimulationCampaign
 from blueetl.extract import simulations as test_module
 from blueetl.utils import ensure_dtypes
@@ -496,3 +498,181 @@ def test_simulations_to_pandas():
     expected_df = ensure_dtypes(expected_df)
     assert_frame_equal(result_df, expected_df)
     assert mock_circuit0 != mock_circuit1
+
+
+@pytest.mark.parametrize("probe_workers", [1, 4])
+@patch(f"{test_module.__name__}.Simulation", autospec=True)
+def test_simulations_from_config_with_probe_workers(mock_simulation_class, probe_workers):
+    # simulation 2 is missing, simulation 3 is incomplete, and the circuits are 1, 0, 1, 1, 0
+    mock_simulations = {
+        "path0": _get_mock_simulation(1),
+        "path1": _get_mock_simulation(0),
+        "path2": _get_mock_simulation(1, exists=False),
+        "path3": _get_mock_simulation(1, is_complete=False),
+        "path4": _get_mock_simulation(0),
+    }
+    mock_simulation_class.from_file.side_effect = lambda path: mock_simulations[str(path)]
+    config = MagicMock(SimulationCampaign)
+    config.get.return_value = pd.DataFrame([{"simulation_path": path} for path in mock_simulations])
+
+    result = test_module.Simulations.from_config(config, probe_workers=probe_workers)
+
+    assert result.df["simulation_path"].tolist() == ["path0", "path1", "path4"]
+    assert result.df["simulation_id"].tolist() == [0, 1, 4]
+    # the circuit_id is the simulation_id of the first simulation using the circuit
+    assert result.df["circuit_id"].tolist() == [0, 1, 1]
+    assert result.df["circuit"].tolist() == [
+        mock_simulations["path0"].circuit,
+        mock_simulations["path1"].circuit,
+        mock_simulations["path1"].circuit,
+    ]
+    assert mock_simulation_class.from_file.call_count == 5
+    assert mock_simulations["path2"].is_complete.call_count == 0
+
+
+@patch(f"{test_module.__name__}.Simulation", autospec=True)
+def test_simulations_from_pandas_load_inconsistent_campaign_with_probe_workers(
+    mock_simulation_class,
+):
+    mock_simulations = {"path1": _get_mock_simulation(0), "path2": _get_mock_simulation(1)}
+    mock_simulation_class.from_file.side_effect = lambda path: mock_simulations[str(path)]
+    df = pd.DataFrame(
+        [
+            {"simulation_path": "path1", "simulation_id": 0, "circuit_id": 0},
+            {"simulation_path": "path2", "simulation_id": 1, "circuit_id": 0},
+        ]
+    )
+    with pytest.raises(test_module.InconsistentSimulations, match="Inconsistent hash and id"):
+        test_module.Simulations.from_pandas(df, probe_workers=2)
+
+
+def _get_mock_simulation_with_files(tmp_path, name, n=0, circuit_config=None):
+    config_path = tmp_path / f"{name}.json"
+    config_path.write_text("{}")
+    spikes_file = tmp_path / f"{name}.h5"
+    spikes_file.write_text("")
+    mock_simulation = _get_mock_simulation(n)
+    mock_simulation.spikes_file = spikes_file
+    mock_simulation.circuit_config_path = circuit_config
+    if circuit_config is not None and not circuit_config.exists():
+        circuit_config.write_text("{}")
+    return str(config_path), mock_simulation
+
+
+def test_simulation_status_cache(tmp_path):
+    path = tmp_path / "simulations_status.json"
+    simulation_path, mock_simulation = _get_mock_simulation_with_files(tmp_path, "sim0")
+    status_cache = test_module.SimulationStatusCache(path)
+    assert status_cache.get(simulation_path) is None
+
+    status_cache.set(simulation_path, mock_simulation, circuit_hash="hash0")
+    assert status_cache.get(simulation_path) == "hash0"
+    assert not path.exists()
+
+    status_cache.dump()
+    assert path.exists()
+    assert test_module.SimulationStatusCache(path).get(simulation_path) == "hash0"
+
+    # the entry isn't valid anymore when the spikes file is modified
+    os.utime(mock_simulation.spikes_file, ns=(0, 0))
+    assert test_module.SimulationStatusCache(path).get(simulation_path) is None
+
+
+def test_simulation_status_cache_with_circuit_config(tmp_path):
+    path = tmp_path / "simulations_status.json"
+    circuit_config = tmp_path / "circuit_config.json"
+    simulation_path, mock_simulation = _get_mock_simulation_with_files(
+        tmp_path, "sim0", circuit_config=circuit_config
+    )
+    status_cache = test_module.SimulationStatusCache(path)
+    status_cache.set(simulation_path, mock_simulation, circuit_hash="hash0")
+    status_cache.dump()
+
+    status_cache = test_module.SimulationStatusCache(path)
+    assert status_cache.get(simulation_path) == "hash0"
+    assert status_cache.get_circuit_config(simulation_path) == circuit_config
+
+    # the entry isn't valid anymore when the circuit config is modified
+    os.utime(circuit_config, ns=(0, 0))
+    assert test_module.SimulationStatusCache(path).get(simulation_path) is None
+
+
+def test_simulation_status_cache_with_invalid_file(tmp_path):
+    path = tmp_path / "simulations_status.json"
+    path.write_text("invalid")
+
+    status_cache = test_module.SimulationStatusCache(path)
+
+    assert status_cache.get("path") is None
+
+
+@patch(f"{test_module.__name__}.Simulation", autospec=True)
+def test_simulations_from_pandas_with_status_cache(mock_simulation_class, tmp_path):
+    status_cache_path = tmp_path / "simulations_status.json"
+    simulation_path0, mock_simulation0 = _get_mock_simulation_with_files(tmp_path, "sim0")
+    simulation_path1, mock_simulation1 = _get_mock_simulation_with_files(tmp_path, "sim1", n=1)
+    mock_simulations = {simulation_path0: mock_simulation0, simulation_path1: mock_simulation1}
+    mock_simulation_class.from_file.side_effect = lambda path: mock_simulations[str(path)]
+    df = pd.DataFrame([{"simulation_path": path} for path in mock_simulations])
+
+    status_cache = test_module.SimulationStatusCache(status_cache_path)
+    result = test_module.Simulations.from_pandas(df, cached=False, status_cache=status_cache)
+
+    assert mock_simulation_class.from_file.call_count == 2
+    assert mock_simulation_class.from_file_lazy.call_count == 0
+    assert status_cache_path.exists()
+
+    # the simulations aren't loaded again when the status is cached
+    lazy_simulation = mock_simulation_class.from_file_lazy.return_value
+    lazy_circuits = [Mock(), Mock()]
+    for n, lazy_circuit in enumerate(lazy_circuits):
+        lazy_circuit.checksum.return_value = n
+    lazy_simulation.lazy_circuit.side_effect = lazy_circuits
+    status_cache = test_module.SimulationStatusCache(status_cache_path)
+    cached_result = test_module.Simulations.from_pandas(
+        result.to_pandas(), status_cache=status_cache
+    )
+
+    assert mock_simulation_class.from_file.call_count == 2
+    assert mock_simulation_class.from_file_lazy.call_count == 2
+    assert mock_simulation0.is_complete.call_count == 1
+    assert_frame_equal(cached_result.to_pandas(), result.to_pandas())
+    assert cached_result.df["simulation"].tolist() == [lazy_simulation, lazy_simulation]
+    assert cached_result.df["circuit"].tolist() == lazy_circuits
+    assert lazy_simulation.lazy_circuit.call_args_list == [
+        call(checksum=0),
+        call(checksum=1),
+    ]
+
+
+@patch(f"{test_module.__name__}.Simulation", autospec=True)
+def test_simulations_from_pandas_with_status_cache_and_circuit_config(
+    mock_simulation_class, tmp_path
+):
+    status_cache_path = tmp_path / "simulations_status.json"
+    circuit_config = tmp_path / "circuit_config.json"
+    mock_simulations = dict(
+        _get_mock_simulation_with_files(tmp_path, f"sim{i}", circuit_config=circuit_config)
+        for i in range(2)
+    )
+    mock_simulation_class.from_file.side_effect = lambda path: mock_simulations[str(path)]
+    df = pd.DataFrame([{"simulation_path": path} for path in mock_simulations])
+    status_cache = test_module.SimulationStatusCache(status_cache_path)
+    result = test_module.Simulations.from_pandas(df, cached=False, status_cache=status_cache)
+
+    # the circuits are shared with any simulation using the same circuit config
+    status_cache = test_module.SimulationStatusCache(status_cache_path)
+    with CircuitRegistry().activate():
+        cached_results = [
+            test_module.Simulations.from_pandas(result.to_pandas(), status_cache=status_cache)
+            for _ in range(2)
+        ]
+
+    assert mock_simulation_class.from_file.call_count == 2
+    circuits = [circuit for r in cached_results for circuit in r.df["circuit"]]
+    assert len({id(circuit) for circuit in circuits}) == 1
+    assert isinstance(circuits[0], CircuitAdapter)
+    # the circuit isn't loaded, because the checksum is cached
+    assert circuits[0].loaded is False
+    assert circuits[0].checksum() == 0
+    assert_frame_equal(cached_results[0].to_pandas(), result.to_pandas())
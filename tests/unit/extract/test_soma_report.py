@@ -1,10 +1,13 @@
 import os
+from functools import partial
 from unittest.mock import MagicMock, Mock, PropertyMock, patch
 
 import pandas as pd
+import pytest
 from blueetl_core.constants import BLUEETL_JOBLIB_JOBS
 from pandas.testing import assert_frame_equal
 
+from blueetl.adapters.interfaces.simulation import PopulationReportInterface
 from blueetl.constants import (
     CIRCUIT,
     CIRCUIT_ID,
@@ -21,10 +24,13 @@ from blueetl.constants import (
     QUERY,
     SIMULATION,
     SIMULATION_ID,
+    SIMULATION_PATH,
     T_START,
     T_STEP,
     T_STOP,
+    TIME,
     TRIAL,
+    VALUE,
     WINDOW,
     WINDOW_TYPE,
 )
@@ -45,13 +51,17 @@ def _get_soma_report(group=None, t_start=None, t_stop=None, t_step=None):
     return df.etl.q(time={"ge": t_start, "lt": t_stop})[list(group)]
 
 
+@pytest.mark.parametrize("storage", ["long", "wide"])
 @patch.dict(os.environ, {BLUEETL_JOBLIB_JOBS: "1"})
-def test_soma_report_from_simulations():
+def test_soma_report_from_simulations(storage):
     mock_circuit = MagicMock()
     mock_sim = MagicMock()
     _report_by_type = mock_sim.reports.__getitem__.return_value
     _report_by_pop = _report_by_type.__getitem__.return_value
     _report_by_pop.get.side_effect = _get_soma_report
+    _report_by_pop.get_windows.side_effect = partial(
+        PopulationReportInterface.get_windows, _report_by_pop
+    )
     mock_simulations_df = PropertyMock(
         return_value=pd.DataFrame(
             [
@@ -130,6 +140,7 @@ def test_soma_report_from_simulations():
         windows=mock_windows,
         neuron_classes=mock_neuron_classes,
         name="soma",
+        storage=storage,
     )
 
     expected_df = pd.DataFrame(
@@ -139,6 +150,7 @@ def test_soma_report_from_simulations():
                 "time": 20.0,
                 "value": -72.3,
                 "window": "w1",
+                "trial": 0,
                 "simulation_id": 0,
                 "circuit_id": 0,
                 "neuron_class": "L23_EXC",
@@ -148,6 +160,7 @@ def test_soma_report_from_simulations():
                 "time": 20.5,
                 "value": -72.5,
                 "window": "w1",
+                "trial": 0,
                 "simulation_id": 0,
                 "circuit_id": 0,
                 "neuron_class": "L23_EXC",
@@ -157,6 +170,7 @@ def test_soma_report_from_simulations():
                 "time": 20.0,
                 "value": -70.8,
                 "window": "w1",
+                "trial": 0,
                 "simulation_id": 0,
                 "circuit_id": 0,
                 "neuron_class": "L23_EXC",
@@ -166,6 +180,7 @@ def test_soma_report_from_simulations():
                 "time": 20.5,
                 "value": -71.0,
                 "window": "w1",
+                "trial": 0,
                 "simulation_id": 0,
                 "circuit_id": 0,
                 "neuron_class": "L23_EXC",
@@ -175,6 +190,7 @@ def test_soma_report_from_simulations():
                 "time": 20.0,
                 "value": -69.8,
                 "window": "w1",
+                "trial": 0,
                 "simulation_id": 0,
                 "circuit_id": 0,
                 "neuron_class": "L4_EXC",
@@ -184,6 +200,7 @@ def test_soma_report_from_simulations():
                 "time": 20.5,
                 "value": -70.0,
                 "window": "w1",
+                "trial": 0,
                 "simulation_id": 0,
                 "circuit_id": 0,
                 "neuron_class": "L4_EXC",
@@ -193,6 +210,144 @@ def test_soma_report_from_simulations():
     expected_df = ensure_dtypes(expected_df)
     assert isinstance(result, test_module.SomaReport)
     assert_frame_equal(result.df, expected_df)
+    assert result.storage == storage
+    if storage == "wide":
+        # one block for each neuron class and window
+        assert len(result.wide_df) == 2
+    else:
+        assert result.wide_df is None
+    # the dataframe can be stored and loaded in the same format
+    loaded = test_module.SomaReport.from_pandas(result.to_pandas())
+    assert loaded.storage == storage
+    assert_frame_equal(loaded.df, expected_df)
     assert mock_simulations_df.call_count == 1
     assert mock_neurons_df.call_count == 1
     assert mock_windows_df.call_count == 1
+
+
+def test_soma_report_to_long_empty():
+    df = pd.DataFrame({col: [] for col in test_module.SomaReport.wide_columns()})
+    result = test_module.SomaReport.to_long(df)
+    assert len(result) == 0
+    assert set(result.columns) == set(test_module.SomaReport.COLUMNS)
+    assert result[GID].dtype == "int64"
+
+
+def test_soma_report_from_simulations_with_invalid_storage():
+    with pytest.raises(ValueError, match="Invalid storage: invalid"):
+        test_module.SomaReport.from_simulations(
+            simulations=Mock(),
+            neurons=Mock(),
+            windows=Mock(),
+            neuron_classes=Mock(),
+            name="soma",
+            storage="invalid",
+        )
+
+
+@pytest.mark.parametrize("storage", ["long", "wide"])
+@patch.dict(os.environ, {BLUEETL_JOBLIB_JOBS: "1"})
+def test_soma_report_from_simulations_with_trials(storage):
+    mock_sim = MagicMock()
+    _report_by_pop = mock_sim.reports.__getitem__.return_value.__getitem__.return_value
+    _report_by_pop.get.side_effect = _get_soma_report
+    _report_by_pop.get_windows.side_effect = partial(
+        PopulationReportInterface.get_windows, _report_by_pop
+    )
+    simulations = Mock(
+        df=pd.DataFrame([{SIMULATION_ID: 0, CIRCUIT_ID: 0, SIMULATION: mock_sim}]),
+    )
+    neurons = Mock(
+        df=pd.DataFrame([{CIRCUIT_ID: 0, NEURON_CLASS: "L23_EXC", GID: 100, NEURON_CLASS_INDEX: 0}])
+    )
+    windows = Mock(
+        df=pd.DataFrame(
+            [
+                {SIMULATION_ID: 0, CIRCUIT_ID: 0, WINDOW: "w1", TRIAL: trial, OFFSET: offset}
+                | {T_START: 0, T_STOP: 1, T_STEP: 0, DURATION: 1, WINDOW_TYPE: "evoked"}
+                for trial, offset in enumerate([19.5, 20.5])
+            ]
+        )
+    )
+    neuron_classes = Mock(
+        df=pd.DataFrame([{CIRCUIT_ID: 0, NEURON_CLASS: "L23_EXC", POPULATION: "default"}])
+    )
+
+    result = test_module.SomaReport.from_simulations(
+        simulations=simulations,
+        neurons=neurons,
+        windows=windows,
+        neuron_classes=neuron_classes,
+        name="soma",
+        storage=storage,
+    )
+
+    assert result.df[TRIAL].to_list() == [0, 0, 1]
+    assert result.df[TIME].to_list() == [19.5, 20.0, 20.5]
+    assert result.df[VALUE].to_list() == [-72.1, -72.3, -72.5]
+    if storage == "wide":
+        # the trials are stored in separate blocks
+        assert result.wide_df[TRIAL].to_list() == [0, 1]
+
+
+@patch.dict(os.environ, {BLUEETL_JOBLIB_JOBS: "1"})
+def test_soma_report_partitions_with_changed_storage():
+    mock_sim = MagicMock()
+    _report_by_pop = mock_sim.reports.__getitem__.return_value.__getitem__.return_value
+    _report_by_pop.get.side_effect = _get_soma_report
+    _report_by_pop.get_windows.side_effect = partial(
+        PopulationReportInterface.get_windows, _report_by_pop
+    )
+    simulations = Mock(
+        df=pd.DataFrame(
+            [
+                {SIMULATION_ID: sim_id, CIRCUIT_ID: 0, SIMULATION: mock_sim}
+                | {SIMULATION_PATH: f"/path/to/sim{sim_id}"}
+                for sim_id in [0, 1]
+            ]
+        )
+    )
+    neurons = Mock(
+        df=pd.DataFrame([{CIRCUIT_ID: 0, NEURON_CLASS: "L23_EXC", GID: 100, NEURON_CLASS_INDEX: 0}])
+    )
+    windows = Mock(
+        df=pd.DataFrame(
+            [
+                {SIMULATION_ID: sim_id, CIRCUIT_ID: 0, WINDOW: "w1", TRIAL: 0, OFFSET: 19.5}
+                | {T_START: 0, T_STOP: 1, T_STEP: 0, DURATION: 1, WINDOW_TYPE: "evoked"}
+                for sim_id in [0, 1]
+            ]
+        )
+    )
+    neuron_classes = Mock(
+        df=pd.DataFrame([{CIRCUIT_ID: 0, NEURON_CLASS: "L23_EXC", POPULATION: "default"}])
+    )
+    kwargs = {
+        "simulations": simulations,
+        "neurons": neurons,
+        "windows": windows,
+        "neuron_classes": neuron_classes,
+        "name": "soma",
+    }
+    # simulate the partitions cached in long format
+    cached_keys = test_module.SomaReport.partition_keys(**kwargs, storage="long")
+    cached_df = test_module.SomaReport.from_simulations(**kwargs, storage="long").to_pandas()
+    cached_partitions = dict(list(cached_df.groupby(SIMULATION_ID)))
+
+    keys = test_module.SomaReport.partition_keys(**kwargs, storage="wide")
+    assert list(keys) == [0, 1]
+    assert keys != cached_keys
+    # the partitions are reused only when the keys are unchanged, as in load_repo_partitions
+    partitions = {
+        sim_id: df
+        for sim_id, df in cached_partitions.items()
+        if keys[sim_id] == cached_keys[sim_id]
+    }
+    assert partitions == {}
+    result = test_module.SomaReport.from_simulations(
+        **kwargs, partitions=partitions, storage="wide"
+    )
+
+    assert result.storage == "wide"
+    assert result.wide_df[SIMULATION_ID].to_list() == [0, 1]
+    assert_frame_equal(result.df, test_module.SomaReport.from_pandas(cached_df).df)
@@ -1,7 +1,9 @@
 import os
 from unittest.mock import MagicMock, Mock, PropertyMock, patch
 
+import numpy as np
 import pandas as pd
+import pytest
 from blueetl_core.constants import BLUEETL_JOBLIB_JOBS
 from pandas.testing import assert_frame_equal
 
@@ -24,6 +26,7 @@ from blueetl.constants import (
     T_START,
     T_STEP,
     T_STOP,
+    TIME,
     TRIAL,
     WINDOW,
     WINDOW_TYPE,
@@ -32,14 +35,19 @@ from blueetl.extract import spikes as test_module
 from blueetl.utils import ensure_dtypes
 
 
-def _get_spikes(gids):
+def _get_spikes(gids, t_start=None, t_stop=None):
     """Return a Series as returned by simulation.spikes[population].get()."""
     spikes = pd.Series(
         [300, 100, 300, 200, 100, 100],
         index=pd.Index([56.05, 82.25, 441.85, 520.025, 609.425, 1167.525], name="times"),
         name="ids",
     )
-    return spikes[spikes.isin(gids)]
+    spikes = spikes[spikes.isin(gids)]
+    if t_start is not None:
+        spikes = spikes[spikes.index >= t_start]
+    if t_stop is not None:
+        spikes = spikes[spikes.index <= t_stop]
+    return spikes
 
 
 @patch.dict(os.environ, {BLUEETL_JOBLIB_JOBS: "1"})
@@ -155,3 +163,112 @@ def test_spikes_from_simulations():
     assert mock_simulations_df.call_count == 1
     assert mock_neurons_df.call_count == 1
     assert mock_windows_df.call_count == 1
+
+
+def _assign_windows_classic(times, gids, windows_df):
+    """Assign the spikes to the windows filtering the spikes separately for each window."""
+    df = pd.DataFrame({TIME: times, GID: gids})
+    df_list = []
+    for rec in windows_df.itertuples():
+        t_start = rec.offset + rec.t_start
+        t_stop = rec.offset + rec.t_stop
+        tmp = df[(df[TIME] >= t_start) & (df[TIME] < t_stop)].copy()
+        tmp[WINDOW] = rec.window
+        tmp[TRIAL] = rec.trial
+        tmp[TIME] -= rec.offset
+        df_list.append(tmp)
+    return pd.concat(df_list).reset_index(drop=True)
+
+
+@pytest.mark.parametrize("sort", [True, False])
+def test_spikes_assign_windows(sort):
+    rng = np.random.default_rng(0)
+    times = rng.uniform(0, 1000, size=500).round(1)
+    gids = rng.integers(0, 50, size=500)
+    if sort:
+        order = np.argsort(times, kind="stable")
+        times, gids = times[order], gids[order]
+    # overlapping windows and trials, including an empty window
+    windows_df = pd.DataFrame(
+        [
+            {WINDOW: "w1", TRIAL: 0, OFFSET: 0, T_START: 0, T_STOP: 100},
+            {WINDOW: "w1", TRIAL: 1, OFFSET: 50, T_START: 0, T_STOP: 100},
+            {WINDOW: "w1", TRIAL: 2, OFFSET: 100, T_START: 0, T_STOP: 100},
+            {WINDOW: "w2", TRIAL: 0, OFFSET: 200.5, T_START: -50, T_STOP: 500},
+            {WINDOW: "w3", TRIAL: 0, OFFSET: 2000, T_START: 0, T_STOP: 100},
+        ]
+    )
+
+    result = test_module.Spikes._assign_windows(times=times, gids=gids, windows_df=windows_df)
+
+    expected = _assign_windows_classic(times=times, gids=gids, windows_df=windows_df)
+    assert len(result) > 0
+    assert_frame_equal(result, expected)
+
+
+@pytest.mark.parametrize(
+    "t_start, t_stop, chunk_duration, expected",
+    [
+        ([], [], None, []),
+        ([0, 50, 200], [100, 150, 300], None, [(0, 150), (200, 300)]),
+        ([0, 100], [100, 200], None, [(0, 200)]),
+        ([200, 0], [300, 100], None, [(0, 100), (200, 300)]),
+        ([-50, 10], [20, 10], None, [(0, 20)]),
+        ([0, 200], [150, 260], 100, [(0, 100), (100, 150), (200, 260)]),
+    ],
+)
+def test_iter_chunks(t_start, t_stop, chunk_duration, expected):
+    result = test_module._iter_chunks(
+        np.array(t_start, dtype=float), np.array(t_stop, dtype=float), chunk_duration
+    )
+    assert list(result) == expected
+
+
+@pytest.mark.parametrize("chunk_duration", [None, 1000, 70, 3])
+def test_spikes_load_values_by_chunks(chunk_duration):
+    rng = np.random.default_rng(0)
+    times = np.sort(rng.uniform(0, 1000, size=500).round(1))
+    gids = rng.integers(0, 50, size=500)
+    all_spikes = pd.Series(gids, index=pd.Index(times, name="times"), name="ids")
+    windows_df = pd.DataFrame(
+        [
+            {WINDOW: "w1", TRIAL: 0, OFFSET: 0, T_START: 0, T_STOP: 100},
+            {WINDOW: "w1", TRIAL: 1, OFFSET: 50, T_START: 0, T_STOP: 100},
+            {WINDOW: "w2", TRIAL: 0, OFFSET: 600, T_START: -50, T_STOP: 200.5},
+            {WINDOW: "w3", TRIAL: 0, OFFSET: 2000, T_START: 0, T_STOP: 100},
+        ]
+    )
+    mock_sim = MagicMock()
+    mock_report = mock_sim.spikes.__getitem__.return_value
+    mock_report.get.side_effect = lambda gids, t_start, t_stop: all_spikes[
+        (all_spikes.index >= t_start) & (all_spikes.index <= t_stop)
+    ]
+
+    with patch.object(test_module.Spikes, "CHUNK_DURATION", chunk_duration):
+        result = test_module.Spikes._load_values(
+            simulation=mock_sim,
+            population="default",
+            gids=None,
+            windows_df=windows_df,
+            name="spikes",
+        )
+
+    expected = test_module.Spikes._assign_windows(times=times, gids=gids, windows_df=windows_df)
+    assert len(result) > 0
+    assert_frame_equal(result, expected)
+    # only the intervals covered by the windows should be read
+    for call in mock_report.get.call_args_list:
+        assert 0 <= call.kwargs["t_start"] < call.kwargs["t_stop"] <= 2100
+        assert not 800.5 < call.kwargs["t_start"] < 2000
+
+
+def test_spikes_from_simulations_with_wide_storage():
+    with pytest.raises(ValueError, match="The wide format is not supported by Spikes"):
+        test_module.Spikes.from_simulations(
+            simulations=Mock(),
+            neurons=Mock(),
+            windows=Mock(),
+            neuron_classes=Mock(),
+            name="spikes",
+            storage="wide",
+        )
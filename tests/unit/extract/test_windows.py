@@ -1,6 +1,10 @@
-from unittest.mock import Mock, PropertyMock
+import os
+from unittest.mock import Mock, PropertyMock, patch
 
+import numpy as np
 import pandas as pd
+import pytest
+from blueetl_core.constants import BLUEETL_JOBLIB_JOBS
 from pandas.testing import assert_frame_equal
 
 from blueetl.config.analysis_model import TrialStepsConfig, WindowConfig
@@ -11,6 +15,7 @@ from blueetl.constants import (
     OFFSET,
     SIMULATION,
     SIMULATION_ID,
+    SIMULATION_PATH,
     T_START,
     T_STEP,
     T_STOP,
@@ -243,3 +248,242 @@ def test_windows_from_simulations(mock_simulation, mock_circuit):
     assert isinstance(result, test_module.Windows)
     assert_frame_equal(result.df, expected_df)
     assert mock_simulations_df.call_count == 1
+
+
+_onset_calls = []
+
+
+def _myfunc3(spikes, params):
+    """Calculate and return the cortical onset from spikes, recording the call"""
+    _onset_calls.append([np.round(s, 6).tolist() for s in spikes])
+    return 10
+
+
+@pytest.mark.parametrize(
+    "intervals, expected",
+    [
+        ([], []),
+        ([(0, 10)], [(0, 10)]),
+        ([(20, 30), (0, 10)], [(0, 10), (20, 30)]),
+        ([(0, 10), (5, 20), (20, 30)], [(0, 30)]),
+        ([(0, 10), (2, 3)], [(0, 10)]),
+        ([(0, 10), (10.5, 20)], [(0, 20)]),
+        ([(0, 10), (11, 20)], [(0, 10), (11, 20)]),
+    ],
+)
+def test_merge_intervals(intervals, expected):
+    result = test_module._merge_intervals(intervals, gap=0.5)
+    assert result == expected
+
+
+def test_dynamic_offsets_cache(tmp_path):
+    path = tmp_path / "dynamic_offsets.json"
+    spikes_file = tmp_path / "out.h5"
+    spikes_file.write_text("spikes")
+    offsets_cache = test_module.DynamicOffsetsCache(path)
+    assert offsets_cache.get("sim0.json", "checksum0") is None
+
+    offsets_cache.set("sim0.json", spikes_file, "checksum0", 12.5)
+    offsets_cache.set("sim0.json", spikes_file, "checksum1", 20.0)
+    # not cached, because the spikes file doesn't exist
+    offsets_cache.set("sim1.json", tmp_path / "missing.h5", "checksum0", 10.0)
+    assert offsets_cache.get("sim0.json", "checksum0") == 12.5
+    assert offsets_cache.get("sim1.json", "checksum0") is None
+    assert not path.exists()
+
+    offsets_cache.dump()
+    offsets_cache = test_module.DynamicOffsetsCache(path)
+    assert offsets_cache.get("sim0.json", "checksum0") == 12.5
+    assert offsets_cache.get("sim0.json", "checksum1") == 20.0
+    assert offsets_cache.get("sim1.json", "checksum0") is None
+
+    # the offsets aren't valid anymore when the spikes file is modified
+    stat = spikes_file.stat()
+    os.utime(spikes_file, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000))
+    assert offsets_cache.get("sim0.json", "checksum0") is None
+    assert offsets_cache.get("sim0.json", "checksum1") is None
+    offsets_cache.set("sim0.json", spikes_file, "checksum1", 30.0)
+    assert offsets_cache.get("sim0.json", "checksum0") is None
+    assert offsets_cache.get("sim0.json", "checksum1") == 30.0
+
+
+def test_dynamic_offsets_cache_with_invalid_file(tmp_path):
+    path = tmp_path / "dynamic_offsets.json"
+    path.write_text("invalid")
+
+    offsets_cache = test_module.DynamicOffsetsCache(path)
+
+    assert offsets_cache.get("sim0.json", "checksum0") is None
+
+
+@patch.dict(os.environ, {BLUEETL_JOBLIB_JOBS: "1"})
+def test_windows_from_simulations_with_dynamic_offsets(mock_simulation, mock_circuit, tmp_path):
+    mock_simulation.spikes_file = tmp_path / "out.h5"
+    mock_simulation.spikes_file.write_text("spikes")
+    mock_simulations = Mock()
+    mock_simulations.df = pd.DataFrame(
+        [
+            {
+                SIMULATION_ID: i,
+                CIRCUIT_ID: 0,
+                SIMULATION_PATH: f"sim{i}.json",
+                SIMULATION: mock_simulation,
+                CIRCUIT: mock_circuit,
+            }
+            for i in range(2)
+        ]
+    )
+
+    def _get_windows(bounds, initial_offset=100, limit=None):
+        trial_steps_config = {
+            "ts1": TrialStepsConfig(function=f"{__name__}._myfunc3", bounds=[-20, 30], limit=limit),
+        }
+        windows_config = {
+            name: WindowConfig(
+                bounds=bounds,
+                initial_offset=initial_offset,
+                trial_steps_list=trial_steps_list,
+                trial_steps_label="ts1",
+            )
+            for name, trial_steps_list in [("w1", [0, 20]), ("w2", [0])]
+        }
+        return test_module.Windows.from_simulations(
+            simulations=mock_simulations,
+            windows_config=windows_config,
+            trial_steps_config=trial_steps_config,
+            resolver=Mock(),
+            offsets_cache=test_module.DynamicOffsetsCache(tmp_path / "dynamic_offsets.json"),
+        )
+
+    _onset_calls.clear()
+    result = _get_windows(bounds=[0, 100])
+
+    assert result.df[OFFSET].tolist() == [110.0, 130.0, 110.0] * 2
+    # the node ids are loaded once, and the spikes are read once for each simulation
+    assert mock_circuit.nodes.__getitem__.return_value.ids.call_count == 1
+    assert mock_simulation.spikes.__getitem__.return_value.get.call_count == 2
+    # the spikes are selected for each step offset relative to the offset
+    assert (
+        _onset_calls
+        == [
+            [[0.1, 20.2, 20.2], [-19.9, 0.2, 0.2, 30.0]],
+            [[0.1, 20.2, 20.2]],
+        ]
+        * 2
+    )
+
+    # the offsets are cached, so they aren't calculated again when the bounds are changed
+    result = _get_windows(bounds=[0, 50])
+
+    assert result.df[OFFSET].tolist() == [110.0, 130.0, 110.0] * 2
+    assert len(_onset_calls) == 4
+
+    # the offsets are calculated again when the initial_offset is changed
+    result = _get_windows(bounds=[0, 50], initial_offset=200)
+
+    assert result.df[OFFSET].tolist() == [210.0, 230.0, 210.0] * 2
+    assert len(_onset_calls) == 8
+
+    # the offsets are calculated again when the spikes file is modified
+    stat = mock_simulation.spikes_file.stat()
+    os.utime(mock_simulation.spikes_file, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000))
+    result = _get_windows(bounds=[0, 50], initial_offset=200)
+
+    assert result.df[OFFSET].tolist() == [210.0, 230.0, 210.0] * 2
+    assert len(_onset_calls) == 12
+
+    # the offsets aren't cached when the node ids are selected randomly
+    for n_calls in [16, 20]:
+        with patch.object(
+            test_module, "_load_dynamic_gids", wraps=test_module._load_dynamic_gids
+        ) as load_dynamic_gids:
+            result = _get_windows(bounds=[0, 50], initial_offset=200, limit=1)
+        assert len(_onset_calls) == n_calls
+        # the node ids are selected randomly for each simulation and window
+        assert load_dynamic_gids.call_count == 4
+
+
+def _get_windows_df():
+    return pd.DataFrame(
+        [
+            {
+                SIMULATION_ID: simulation_id,
+                CIRCUIT_ID: 0,
+                WINDOW: window,
+                TRIAL: trial,
+                OFFSET: 1000 * simulation_id + offset + 10 * trial,
+                T_START: t_start,
+                T_STOP: t_stop,
+                T_STEP: 0,
+                DURATION: t_stop - t_start,
+                WINDOW_TYPE: "",
+            }
+            for simulation_id in [3, 1]
+            for window, n_trials, offset, t_start, t_stop in [
+                ("w1", 1, 0, 20, 90),
+                ("w2", 3, 10, 10, 70),
+            ]
+            for trial in range(n_trials)
+        ]
+    )
+
+
+def test_windows_window_index():
+    windows = test_module.Windows.from_pandas(_get_windows_df())
+
+    result = windows.window_index
+
+    assert list(result) == ["w1", "w2"]
+    index = result["w2"]
+    assert (index.t_start, index.t_stop, index.duration, index.n_trials) == (10, 70, 60, 3)
+    assert index.simulation_ids.tolist() == [1, 3]
+    assert index.offsets.tolist() == [[1010, 1020, 1030], [3010, 3020, 3030]]
+    # the index is built only once
+    assert windows.window_index is result
+
+    assert windows.get_bounds("w1") == (20, 90)
+    assert windows.get_bounds("w2") == (10, 70)
+    assert windows.get_duration("w1") == 70
+    assert windows.get_duration("w2") == 60
+    assert windows.get_number_of_trials("w1") == 1
+    assert windows.get_number_of_trials("w2") == 3
+
+    with pytest.raises(KeyError):
+        windows.get_bounds("w3")
+
+
+@pytest.mark.parametrize(
+    "window, simulation_ids, trials, expected",
+    [
+        ("w1", 1, 0, 1000),
+        ("w1", [3, 1, 3], 0, [3000, 1000, 3000]),
+        ("w2", 3, [2, 0, 1], [3030, 3010, 3020]),
+        ("w2", [1, 3], [2, 0], [1030, 3010]),
+        ("w2", [[1], [3]], [0, 1], [[1010, 1020], [3010, 3020]]),
+        ("w2", [], [], []),
+    ],
+)
+def test_windows_get_offsets(window, simulation_ids, trials, expected):
+    windows = test_module.Windows.from_pandas(_get_windows_df())
+
+    result = windows.get_offsets(window, np.array(simulation_ids), np.array(trials))
+
+    assert result.tolist() == expected
+
+
+@pytest.mark.parametrize(
+    "window, simulation_ids, trials",
+    [
+        ("w1", 2, 0),
+        ("w1", 4, 0),
+        ("w1", 0, 0),
+        ("w1", 1, 1),
+        ("w2", [1, 3], [0, -1]),
+        ("w3", 1, 0),
+    ],
+)
+def test_windows_get_offsets_raises(window, simulation_ids, trials):
+    windows = test_module.Windows.from_pandas(_get_windows_df())
+
+    with pytest.raises(KeyError):
+        windows.get_offsets(window, np.array(simulation_ids), np.array(trials))
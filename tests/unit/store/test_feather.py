@@ -22,3 +22,19 @@ def test_dump_load_roundtrip(tmp_path, df, lazy_fixture):
     result = store.load(name)
 
     assert_frame_equal(result, df)
+
+
+def test_checksum_with_footer_mode_not_supported(tmp_path):
+    with pytest.raises(ValueError, match="Unsupported checksum mode 'footer' for FeatherStore"):
+        test_module.FeatherStore(tmp_path, checksum_mode="footer")
+
+
+def test_dump_load_roundtrip_with_unsorted_unnamed_index(tmp_path, storable_df_with_unnamed_index):
+    df = storable_df_with_unnamed_index.iloc[::-1]
+    name = "myname"
+    store = test_module.FeatherStore(tmp_path)
+
+    store.dump(df, name)
+    result = store.load(name)
+
+    assert_frame_equal(result, df)
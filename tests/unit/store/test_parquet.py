@@ -1,3 +1,6 @@
+from unittest.mock import patch
+
+import pandas as pd
 import pytest
 from pandas.testing import assert_frame_equal
 
@@ -63,3 +66,145 @@ def test_dump_load_roundtrip(tmp_path, df, dump_options, load_options, lazy_fixt
     result = store.load(name)
 
     assert_frame_equal(result, df)
+
+
+@pytest.mark.parametrize(
+    "df",
+    [
+        "storable_df_with_unnamed_index",
+        "storable_df_with_named_index",
+        "storable_df_with_named_multiindex",
+    ],
+)
+@pytest.mark.parametrize("partition_cols", [["a"], ["f", "a"], ["missing"]])
+def test_dump_load_roundtrip_partitioned(tmp_path, df, partition_cols, lazy_fixture):
+    df = lazy_fixture(df)
+    name = "myname"
+    store = test_module.ParquetStore(tmp_path, partition_cols=partition_cols)
+
+    store.dump(df, name)
+    result = store.load(name)
+
+    assert store.path(name).is_dir()
+    assert store.checksum(name) is not None
+    assert_frame_equal(result, df)
+
+    store.delete(name)
+    assert not store.path(name).exists()
+    assert store.load(name) is None
+    assert store.checksum(name) is None
+
+
+def test_dump_partitioned_layout(tmp_path):
+    df = pd.DataFrame({"simulation_id": [1, 0, 1, 0], "value": [10, 20, 30, 40]})
+    name = "myname"
+    store = test_module.ParquetStore(tmp_path, partition_cols=["simulation_id"])
+
+    store.dump(df, name)
+    result = store.load(name)
+
+    files = sorted(str(f.relative_to(tmp_path)) for f in tmp_path.glob("**/*.parquet"))
+    assert files == [
+        "myname/simulation_id=0/part.parquet",
+        "myname/simulation_id=1/part.parquet",
+    ]
+    # the original order is restored
+    assert_frame_equal(result, df)
+
+
+@pytest.mark.parametrize(
+    "filters, columns, expected_partitions",
+    [
+        (None, None, 3),
+        ({"simulation_id": 1}, None, 1),
+        ({"simulation_id": [0, 2]}, None, 2),
+        ({"simulation_id": {"isin": [0, 2]}}, None, 2),
+        ({"simulation_id": {"ge": 1}}, None, 3),
+        ({"value": {"lt": 30}}, None, 3),
+        ({"simulation_id": 2, "value": 50}, ["value"], 1),
+        ({"simulation_id": 2, "name": {"regex": "^a"}}, ["name", "value"], 1),
+        # the first partition is read anyway to get the schema
+        ({"simulation_id": 3}, None, 1),
+    ],
+)
+def test_load_partitioned_with_filters(tmp_path, filters, columns, expected_partitions):
+    df = pd.DataFrame(
+        {
+            "simulation_id": [0, 0, 1, 1, 2, 2],
+            "name": ["a0", "b0", "a1", "b1", "a2", "b2"],
+            "value": [10, 20, 30, 40, 50, 60],
+        }
+    )
+    name = "myname"
+    store = test_module.ParquetStore(tmp_path, partition_cols=["simulation_id"])
+    store.dump(df, name)
+    expected = df.etl.q(filters or {})
+    if columns is not None:
+        expected = expected[columns]
+
+    with patch.object(store, "_read", wraps=store._read) as mock_read:
+        result = store.load(name, filters=filters, columns=columns)
+
+    assert mock_read.call_count == expected_partitions
+    assert_frame_equal(result, expected, check_index_type=False)
+
+
+@pytest.mark.parametrize(
+    "filters, columns",
+    [
+        ({"simulation_id": 1}, None),
+        ({"value": {"ge": 20, "lt": 50}}, ["value"]),
+        ({"name": ["a0", "b2"]}, ["simulation_id", "name"]),
+        ({"name": {"regex": "^b"}}, None),
+    ],
+)
+def test_load_not_partitioned_with_filters(tmp_path, filters, columns):
+    df = pd.DataFrame(
+        {
+            "simulation_id": [0, 0, 1, 1, 2, 2],
+            "name": ["a0", "b0", "a1", "b1", "a2", "b2"],
+            "value": [10, 20, 30, 40, 50, 60],
+        }
+    )
+    name = "myname"
+    store = test_module.ParquetStore(tmp_path)
+    store.dump(df, name)
+    expected = df.etl.q(filters)
+    if columns is not None:
+        expected = expected[columns]
+
+    result = store.load(name, filters=filters, columns=columns)
+
+    # the labels of the RangeIndex are not preserved when the filters are pushed down
+    assert_frame_equal(result.reset_index(drop=True), expected.reset_index(drop=True))
+
+
+@pytest.mark.parametrize("partition_cols", [None, ["simulation_id"]])
+@pytest.mark.parametrize("checksum_mode", ["full", "stat", "footer"])
+def test_checksum_and_verify(tmp_path, checksum_mode, partition_cols):
+    df = pd.DataFrame({"simulation_id": [0, 0, 1], "value": [10, 20, 30]})
+    name = "myname"
+    store = test_module.ParquetStore(
+        tmp_path, checksum_mode=checksum_mode, partition_cols=partition_cols
+    )
+    assert store.checksum(name) is None
+    assert store.verify(name, None) is False
+
+    store.dump(df, name)
+    result = store.checksum(name)
+
+    assert result == store.checksum(name)
+    assert (":" in result) is (checksum_mode != "full")
+    assert store.verify(name, result) is True
+    # the checksums written with any mode can be verified, unless full is required
+    for mode in ["full", "stat", "footer"]:
+        expected = checksum_mode != "full" or mode == "full"
+        assert store.verify(name, store.checksum(name, mode=mode)) is expected
+
+    store.dump(df.assign(value=[10, 20, 40]), name)
+    assert store.verify(name, result) is False
+
+
+def test_checksum_with_unsupported_mode(tmp_path):
+    with pytest.raises(ValueError, match="Unsupported checksum mode 'invalid' for ParquetStore"):
+        test_module.ParquetStore(tmp_path, checksum_mode="invalid")
@@ -1,12 +1,15 @@
 import pickle
 import shutil
+import threading
+from copy import deepcopy
 from pathlib import Path
-from unittest.mock import patch
+from unittest.mock import Mock, patch
 
 import pytest
 
 from blueetl import analysis as test_module
 from blueetl.config.analysis_model import MultiAnalysisConfig
+from blueetl.utils import load_yaml
 from tests.unit.utils import TEST_DATA_PATH
 
 
@@ -68,3 +71,115 @@ def test_multi_analyzer_from_file(tmp_path):
         loaded = pickle.loads(dumped)
 
         assert isinstance(loaded, test_module.MultiAnalyzer)
+
+
+@pytest.mark.parametrize("persistent_workers", [True, False])
+def test_multi_analyzer_calculate_features_with_pool(tmp_path, persistent_workers):
+    path = _prepare_env(tmp_path)
+    config = {**load_yaml(path), "persistent_workers": persistent_workers}
+    with test_module.MultiAnalyzer.from_config(config, base_path=path.parent) as ma:
+        active = []
+        with patch.object(test_module.Analyzer, "calculate_features") as calculate_features:
+            calculate_features.side_effect = lambda: active.append(test_module.WorkerPool.active())
+            ma.calculate_features()
+
+        assert active == [ma._pool]
+        assert (ma._pool is not None) == persistent_workers
+        assert test_module.WorkerPool.active() is None
+
+    if persistent_workers:
+        assert ma._pool.modules == ("blueetl.external.bnac.calculate_features",)
+        assert ma._pool.closed
+
+
+def test_multi_analyzer_concurrent_analyses_without_persistent_workers(tmp_path):
+    path = _prepare_env(tmp_path)
+    config = {**load_yaml(path), "persistent_workers": False, "concurrent_analyses": True}
+    with test_module.MultiAnalyzer.from_config(config, base_path=path.parent) as ma:
+        active = []
+        with patch.object(test_module.Analyzer, "calculate_features") as calculate_features:
+            calculate_features.side_effect = lambda: active.append(test_module.WorkerPool.active())
+            ma.calculate_features()
+
+        assert ma._pool is None
+        # the subprocesses are shared by the concurrent analyses, and shut down on exit
+        assert len(active) == 1
+        assert isinstance(active[0], test_module.WorkerPool)
+        assert active[0].closed
+        assert test_module.WorkerPool.active() is None
+
+
+def test_multi_analyzer_extract_repo_with_circuit_registry(tmp_path):
+    path = _prepare_env(tmp_path)
+    with test_module.MultiAnalyzer.from_config(load_yaml(path), base_path=path.parent) as ma:
+        registry = ma._circuit_registry
+        active = []
+        with patch.object(test_module.Analyzer, "extract_repo") as extract_repo:
+            extract_repo.side_effect = lambda: active.append(test_module.CircuitRegistry.active())
+            with patch.object(registry, "clear_nodes_cache") as clear_nodes_cache:
+                ma.extract_repo()
+
+        # the circuits are shared by the analyses, and the nodes are released at the end
+        assert active == [registry]
+        clear_nodes_cache.assert_called_once_with()
+        assert test_module.CircuitRegistry.active() is None
+
+
+def test_run_with_dependencies():
+    barrier = threading.Barrier(2, timeout=10)
+    calls = []
+
+    def func(name, wait=False):
+        if wait:
+            # the independent functions must be running concurrently
+            barrier.wait()
+        calls.append(name)
+
+    funcs = {
+        "a": lambda: func("a", wait=True),
+        "b": lambda: func("b", wait=True),
+        "c": lambda: func("c"),
+        "d": lambda: func("d"),
+    }
+    dependencies = {"c": {"a", "b", "c", "other"}, "d": {"c"}}
+
+    test_module._run_with_dependencies(funcs, dependencies=dependencies)
+
+    assert sorted(calls[:2]) == ["a", "b"]
+    assert calls[2:] == ["c", "d"]
+
+
+def test_run_with_dependencies_circular():
+    funcs = {"a": lambda: None, "b": lambda: None, "c": lambda: None}
+    dependencies = {"a": {"b"}, "b": {"a"}}
+    with pytest.raises(RuntimeError, match=r"Circular dependencies between analyses: \['a', 'b'\]"):
+        test_module._run_with_dependencies(funcs, dependencies=dependencies)
+
+
+def test_run_with_dependencies_raises():
+    def fail():
+        raise ValueError("Failed")
+
+    func = Mock()
+    with pytest.raises(ValueError, match="Failed"):
+        test_module._run_with_dependencies({"a": fail, "b": func}, dependencies={"b": {"a"}})
+    func.assert_not_called()
+
+
+@pytest.mark.parametrize("concurrent_analyses", [True, False])
+def test_multi_analyzer_concurrent_analyses(tmp_path, concurrent_analyses):
+    path = _prepare_env(tmp_path)
+    config = load_yaml(path)
+    spikes = config["analysis"]["spikes"]
+    other = deepcopy(spikes)
+    other["extraction"]["windows"]["w3"] = "spikes.extraction.windows.w1"
+    config["analysis"] = {"other": other, "spikes": spikes}
+    config["concurrent_analyses"] = concurrent_analyses
+    with test_module.MultiAnalyzer.from_config(config, base_path=path.parent) as ma:
+        assert ma._dependencies() == {"other": {"spikes"}, "spikes": set()}
+        calls = []
+        with patch.object(test_module.Analyzer, "extract_repo", autospec=True) as extract_repo:
+            extract_repo.side_effect = lambda a: calls.append(a)
+            ma.extract_repo()
+
+    assert calls == [ma.spikes, ma.other] if concurrent_analyses else [ma.other, ma.spikes]
@@ -2,10 +2,11 @@ from pathlib import Path
 
 import pandas as pd
 import pytest
+from pandas.testing import assert_frame_equal
 
 from blueetl import cache as test_module
-from blueetl.config.analysis_model import SingleAnalysisConfig
 from blueetl.campaign.config import SimulationCampaign
+from blueetl.config.analysis_model import SingleAnalysisConfig
 
 
 def _get_analysis_config(path):
@@ -150,3 +151,68 @@ def test_cache_manager_clear_cache(tmp_path):
     instance.close()
     assert output.exists() is True
     assert sentinel.exists() is False
+
+
+def test_cache_manager_dump_and_load_repo_partitions(tmp_path):
+    analysis_config = _get_analysis_config(path=tmp_path)
+    simulations_config = _get_simulations_config()
+    df = pd.DataFrame(
+        {
+            "simulation_id": [0, 0, 1, 2],
+            "window": pd.Categorical(["w1", "w2", "w1", "w1"]),
+            "time": [0.1, 0.2, 0.3, 0.4],
+        }
+    )
+    partitions_dir = tmp_path / "repo" / "report"
+
+    instance = test_module.CacheManager(
+        analysis_config=analysis_config,
+        simulations_config=simulations_config,
+    )
+    assert instance.load_repo("report") is None
+    with pytest.raises(AssertionError, match="Partition keys are required for report"):
+        instance.dump_repo(df, "report")
+    instance.dump_repo(df, "report", partition_keys={0: "k0", 1: "k1", 2: "k2", 3: "k3"})
+    assert sorted(p.name for p in partitions_dir.iterdir()) == [
+        "simulation_id=0",
+        "simulation_id=1",
+        "simulation_id=2",
+        "simulation_id=3",
+    ]
+    assert instance.is_repo_cached("report") is True
+    assert_frame_equal(instance.load_repo("report"), df)
+    # the query is pushed down, and only the selected partitions are loaded
+    assert_frame_equal(
+        instance.load_repo("report", query={"simulation_id": [1, 2], "window": "w1"}),
+        df.iloc[2:].reset_index(drop=True),
+        check_categorical=False,
+    )
+    instance.close()
+
+    # simulate a change in the simulations config, and reopen the cache
+    simulations_config.attrs["circuit_config"] = "/tmp/path/to/another/circuit_sonata.json"
+    instance = test_module.CacheManager(
+        analysis_config=analysis_config,
+        simulations_config=simulations_config,
+    )
+    assert instance.is_repo_cached("report") is False
+    assert instance.load_repo("report") is None
+    # only the partitions with the same key are loaded
+    partitions = instance.load_repo_partitions(
+        "report", partition_keys={0: "k0", 1: "changed", 3: "k3", 4: "k4"}
+    )
+    assert list(partitions) == [0, 3]
+    assert_frame_equal(partitions[0], df.iloc[:2])
+    assert len(partitions[3]) == 0
+
+    mtime = (partitions_dir / "simulation_id=0" / "part.parquet").stat().st_mtime_ns
+    new_df = pd.concat([df.iloc[:2], df.iloc[2:3].assign(time=0.5)], ignore_index=True)
+    instance.dump_repo(new_df, "report", partition_keys={0: "k0", 1: "changed"})
+    # the unchanged partition isn't written again, and the obsolete partitions are deleted
+    assert (partitions_dir / "simulation_id=0" / "part.parquet").stat().st_mtime_ns == mtime
+    assert sorted(p.name for p in partitions_dir.iterdir()) == [
+        "simulation_id=0",
+        "simulation_id=1",
+    ]
+    assert_frame_equal(instance.load_repo("report"), new_df)
+    instance.close()
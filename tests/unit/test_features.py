@@ -1,12 +1,16 @@
 import re
 from copy import deepcopy
-from unittest.mock import MagicMock
+from unittest.mock import MagicMock, patch
 
+import numpy as np
 import pandas as pd
+import pytest
+from blueetl_core.utils import smart_concat
 
 from blueetl import features as test_module
 from blueetl.config.analysis_model import FeaturesConfig
-from blueetl.extract.feature import Feature
+from blueetl.extract.feature import Feature, FeaturesSink, LazyFeature
+from blueetl.parallel import WorkerPool
 from blueetl.utils import ensure_dtypes
 from tests.unit.utils import assert_frame_equal
 
@@ -126,6 +130,133 @@ def test_calculate_features(repo):
     }
 
 
+@patch.object(test_module, "CHUNK_ROWS", 1)
+def test_calculate_features_with_chunks_written_to_disk(repo):
+    groupby = ["simulation_id", "circuit_id", "neuron_class", "window"]
+    features_configs_key = test_module.FeaturesConfigKey(
+        groupby=groupby,
+        neuron_classes=[],
+        windows=[],
+    )
+    features_configs_list = [
+        FeaturesConfig(
+            type="multi",
+            groupby=groupby,
+            function="blueetl.external.bnac.calculate_features.calculate_features_multi",
+        ),
+    ]
+
+    result = test_module.calculate_features(repo, features_configs_key, features_configs_list)
+    with patch.object(test_module, "CHUNK_ROWS", 10**9):
+        expected = test_module.calculate_features(repo, features_configs_key, features_configs_list)
+
+    assert len(result) == len(expected) == 1
+    assert set(result[0]) == set(expected[0])
+    for name, df in expected[0].items():
+        assert_frame_equal(result[0][name], df)
+
+
+def _sink_partial_dfs(kind):
+    def _index(n, start):
+        return pd.MultiIndex.from_arrays(
+            [np.full(n, start // 10), np.arange(start, start + n)], names=["simulation_id", "gid"]
+        )
+
+    sizes = [3, 0, 4, 2, 5]
+    starts = np.cumsum([0, *sizes[:-1]])
+    if kind == "numeric":
+        return [
+            pd.DataFrame(
+                {"a": np.arange(n, dtype=float), "b": np.arange(n, dtype=np.int32), "c": ["x"] * n},
+                index=_index(n, start),
+            )
+            for n, start in zip(sizes, starts)
+        ]
+    if kind == "range_index":
+        return [pd.DataFrame({"a": np.arange(n, dtype=float)}) for n in sizes]
+    if kind == "lists":
+        return [
+            pd.DataFrame({"a": [[i, i + 1] for i in range(n)]}, index=_index(n, start))
+            for n, start in zip(sizes, starts)
+        ]
+    if kind == "categories":
+        return [
+            pd.DataFrame({"a": pd.Categorical([f"c{start}"] * n)}, index=_index(n, start))
+            for n, start in zip(sizes, starts)
+        ]
+    if kind == "different_dtypes":
+        return [
+            pd.DataFrame({"a": np.arange(n, dtype=int if i < 2 else float)}, index=_index(n, s))
+            for i, (n, s) in enumerate(zip(sizes, starts))
+        ]
+    if kind == "empty":
+        return [pd.DataFrame({"a": []}, index=_index(0, 0)) for _ in sizes]
+    raise ValueError(kind)
+
+
+@pytest.mark.parametrize(
+    "kind, chunk_rows, spilled",
+    [
+        ("numeric", 1, True),
+        ("numeric", 4, True),
+        ("numeric", 100, False),
+        # a single DataFrame with RangeIndex isn't spilled, since the index would be lost
+        ("range_index", 1, False),
+        ("range_index", 4, True),
+        ("lists", 4, False),
+        # the categories are converted to object when concatenating different categories
+        ("categories", 1, False),
+        ("categories", 4, True),
+        # the second chunk with different dtypes is kept in memory
+        ("different_dtypes", 4, True),
+        ("empty", 1, False),
+    ],
+)
+def test_features_sink(tmp_path, kind, chunk_rows, spilled):
+    dfs = _sink_partial_dfs(kind)
+    path = tmp_path / "features.arrow"
+    sink = FeaturesSink(path, chunk_rows=chunk_rows)
+    for df in dfs:
+        sink.append(df)
+
+    result = sink.to_pandas()
+
+    expected = ensure_dtypes(smart_concat(dfs))
+    assert_frame_equal(result, expected)
+    assert path.exists() == spilled
+
+
+@pytest.mark.parametrize(
+    "kind, chunk_rows, spilled",
+    [
+        ("numeric", 1, True),
+        ("numeric", 4, True),
+        ("numeric", 100, False),
+        # the first chunk is a single DataFrame with RangeIndex
+        ("range_index", 4, False),
+        ("lists", 4, False),
+        # the first chunk contains a single category
+        ("categories", 4, False),
+        ("different_dtypes", 4, True),
+        ("empty", 1, False),
+    ],
+)
+def test_features_sink_with_keys(tmp_path, kind, chunk_rows, spilled):
+    dfs = _sink_partial_dfs(kind)
+    path = tmp_path / "features.arrow"
+    sink = FeaturesSink(path, chunk_rows=chunk_rows)
+    # append the DataFrames in a different order
+    order = [2, 0, 3, 1, 4]
+    for key in order:
+        sink.append(dfs[key], key=key)
+
+    result = sink.to_pandas()
+
+    expected = ensure_dtypes(smart_concat(dfs))
+    assert_frame_equal(result, expected)
+    assert path.exists() == spilled
+
+
 def test_features_collection_init(repo, features):
     assert isinstance(features, test_module.FeaturesCollection)
     assert features.cache_manager is repo.cache_manager
@@ -158,6 +289,46 @@ def test_features_collection_calculate(repo, features, capsys):
     assert isinstance(filtered, test_module.FilteredFeaturesCollection)
 
 
+def _features_in_groups(repo):
+    features_configs = [
+        FeaturesConfig(
+            type="multi",
+            groupby=["simulation_id", "circuit_id", "neuron_class", "window"],
+            function="blueetl.external.bnac.calculate_features.calculate_features_multi",
+            params={"export_all_neurons": export_all_neurons},
+            neuron_classes=neuron_classes,
+            windows=["w0", "w1"],
+            suffix=suffix,
+        )
+        for suffix, neuron_classes, export_all_neurons in [
+            ("_0", ["L2_X"], True),
+            ("_1", ["L6_Y"], False),
+            ("_2", [], True),
+        ]
+    ]
+    return test_module.FeaturesCollection(
+        features_configs=features_configs,
+        repo=repo,
+        cache_manager=repo.cache_manager,
+    )
+
+
+def test_features_collection_calculate_with_worker_pool(repo):
+    expected = _features_in_groups(repo)
+    expected.calculate()
+    features = _features_in_groups(repo)
+    pool = WorkerPool(max_concurrent_calls=2)
+
+    with pool.activate():
+        # the groups are calculated concurrently
+        features.calculate()
+    pool.close()
+
+    assert features.names == expected.names
+    for name in expected.names:
+        assert_frame_equal(getattr(features, name).df, getattr(expected, name).df)
+
+
 def test_features_collection_calculate_with_suffixes(repo, features_with_suffixes):
     assert features_with_suffixes.names == [
         "by_gid",
@@ -227,3 +398,53 @@ def test_features_collection_calculate_with_suffixes(repo, features_with_suffixe
     assert_frame_equal(features_with_suffixes.by_gid_0.df, expected_df_0)
     assert_frame_equal(features_with_suffixes.by_gid_1.df, expected_df_1)
     assert_frame_equal(features_with_suffixes.by_gid.df, expected_df)
+
+
+def test_features_collection_calculate_lazy(repo):
+    features_config = FeaturesConfig(
+        type="multi",
+        groupby=["simulation_id", "circuit_id", "neuron_class", "window"],
+        function="blueetl.external.bnac.calculate_features.calculate_features_multi",
+    )
+    df = ensure_dtypes(
+        pd.DataFrame(
+            {"simulation_id": [0, 0, 1], "value": [1.0, 2.0, 3.0]},
+            index=pd.Index([10, 11, 12], name="gid"),
+        )
+    )
+    cache_manager = repo.cache_manager
+    cache_manager.get_cached_features_checksums.return_value = {"f1": "c1", "f2": "c2"}
+    cache_manager.features_cache_needs_filter.return_value = False
+    cache_manager.load_feature.side_effect = lambda name, query=None, columns=None: (
+        df.etl.q(query or {})[columns or df.columns]
+    )
+    features = test_module.FeaturesCollection(
+        features_configs=[features_config],
+        repo=repo,
+        cache_manager=cache_manager,
+        lazy=True,
+        memory_budget=1,
+    )
+
+    features.calculate()
+
+    assert features.names == ["f1", "f2"]
+    assert isinstance(features.f1, LazyFeature)
+    assert cache_manager.load_feature.call_count == 0
+    cache_manager.dump_features.assert_not_called()
+
+    pd.testing.assert_frame_equal(features.f1.df, df)
+    assert features.f1.df.attrs["config"] == features_config.dict()
+    assert features.f1.loaded is True
+    assert cache_manager.load_feature.call_count == 1
+
+    # f1 is evicted because the memory budget is exceeded
+    pd.testing.assert_frame_equal(features.f2.df, df)
+    assert features.f1.loaded is False
+    assert features.f2.loaded is True
+    assert cache_manager.load_feature.call_count == 2
+
+    result = features.f1.load(query={"simulation_id": 1}, columns=["value"])
+    pd.testing.assert_frame_equal(result, df.iloc[2:][["value"]])
+    assert features.f1.loaded is False
+    assert cache_manager.load_feature.call_count == 3
@@ -1,5 +1,10 @@
 import itertools
 import os
+import pickle
+import sys
+import threading
+import time
+from collections import namedtuple
 from collections.abc import Iterator
 from functools import partial
 from types import SimpleNamespace
@@ -8,7 +13,8 @@ from unittest.mock import Mock, patch
 
 import pandas as pd
 import pytest
-from blueetl_core.constants import BLUEETL_JOBLIB_JOBS
+from blueetl_core.constants import BLUEETL_JOBLIB_BACKEND, BLUEETL_JOBLIB_JOBS
+from blueetl_core.utils import CachedDataFrame
 from numpy.testing import assert_array_equal
 from pandas.testing import assert_frame_equal
 
@@ -206,3 +212,309 @@ def test_call_by_simulation(how):
     )
 
     assert result == [[0, 333, 1, 2], [1, 777, 1, 2], [2, 1221, 1, 2], [3, 1665, 1, 2]]
+
+
+def _merge_filter_dataframes():
+    return [
+        pd.DataFrame(
+            [
+                {"circuit_id": 0, "neuron_class": "L2_INH", "gid": 0, "neuron_class_index": 0},
+                {"circuit_id": 0, "neuron_class": "L2_INH", "gid": 1, "neuron_class_index": 1},
+                {"circuit_id": 0, "neuron_class": "L2_EXC", "gid": 2, "neuron_class_index": 0},
+                {"circuit_id": 1, "neuron_class": "L2_EXC", "gid": 3, "neuron_class_index": 0},
+            ]
+        ).astype({"neuron_class": "category"}),
+        # the index isn't a RangeIndex starting from 0
+        pd.DataFrame(
+            [
+                {"simulation_id": 0, "circuit_id": 0, "neuron_class": "L2_INH", "f1": 111},
+                {"simulation_id": 1, "circuit_id": 0, "neuron_class": "L2_EXC", "f1": 222},
+                {"simulation_id": 0, "circuit_id": 0, "neuron_class": "L2_EXC", "f1": 333},
+                {"simulation_id": 1, "circuit_id": 0, "neuron_class": "L2_INH", "f1": 444},
+                {"simulation_id": 0, "circuit_id": 1, "neuron_class": "L2_EXC", "f1": 555},
+            ],
+            index=pd.Index([10, 11, 12, 13, 14], name="idx"),
+        ),
+        # with MultiIndex
+        pd.DataFrame(
+            [
+                {"simulation_id": 0, "circuit_id": 0, "f2": [1, 2]},
+                {"simulation_id": 1, "circuit_id": 0, "f2": [3]},
+                {"simulation_id": 0, "circuit_id": 1, "f2": []},
+            ]
+        ).set_index(["simulation_id", "circuit_id"]),
+        # not serializable to Arrow, so it should be pickled
+        pd.DataFrame(
+            [
+                {"simulation_id": 0, "circuit_id": 0, "simulation": Mock()},
+                {"simulation_id": 1, "circuit_id": 0, "simulation": Mock()},
+            ]
+        ),
+    ]
+
+
+@pytest.mark.parametrize("parallel", [True, False])
+@patch.dict(os.environ, {BLUEETL_JOBLIB_JOBS: "1"})
+def test_merge_filter_transport_shared(parallel):
+    def func(key, df_list):
+        return key, df_list
+
+    df_list = _merge_filter_dataframes()
+    groupby = ["simulation_id", "circuit_id", "neuron_class"]
+
+    result = list(
+        test_module.merge_filter(
+            df_list, groupby=groupby, func=func, parallel=parallel, transport="shared"
+        )
+    )
+    expected = list(test_module.merge_filter(df_list, groupby=groupby, func=func, parallel=False))
+
+    assert len(result) == len(expected) == 5
+    for (result_key, result_dfs), (expected_key, expected_dfs) in zip(result, expected):
+        assert result_key == expected_key
+        assert len(result_dfs) == len(expected_dfs)
+        for result_df, expected_df in zip(result_dfs, expected_dfs):
+            assert_frame_equal(result_df, expected_df)
+            if "f2" in result_df:
+                assert all(isinstance(value, list) for value in result_df["f2"])
+
+
+def test_merge_filter_invalid_transport():
+    with pytest.raises(ValueError, match="Invalid transport: invalid"):
+        list(
+            test_module.merge_filter(
+                _merge_filter_dataframes(),
+                groupby=["simulation_id"],
+                func=Mock(),
+                transport="invalid",
+            )
+        )
+
+
+def _key_and_dfs(key, df_list):
+    return key, df_list
+
+
+@pytest.mark.parametrize(
+    "parallel, transport, jobs",
+    [
+        (True, "pickle", "1"),
+        (True, "pickle", "2"),
+        (True, "shared", "2"),
+        (False, "pickle", "1"),
+    ],
+)
+def test_merge_filter_unordered(parallel, transport, jobs):
+    func = _key_and_dfs
+    # the mocks cannot be pickled to be sent to the subprocesses
+    df_list = _merge_filter_dataframes()[:3]
+    groupby = ["simulation_id", "circuit_id", "neuron_class"]
+
+    with patch.dict(os.environ, {BLUEETL_JOBLIB_JOBS: jobs}):
+        result = list(
+            test_module.merge_filter(
+                df_list,
+                groupby=groupby,
+                func=func,
+                parallel=parallel,
+                transport=transport,
+                ordered=False,
+                window=2,
+            )
+        )
+    expected = list(test_module.merge_filter(df_list, groupby=groupby, func=func, parallel=False))
+
+    assert sorted(position for position, _ in result) == list(range(len(expected)))
+    result = [value for _, value in sorted(result, key=lambda item: item[0])]
+    for (result_key, result_dfs), (expected_key, expected_dfs) in zip(result, expected):
+        assert result_key == expected_key
+        for result_df, expected_df in zip(result_dfs, expected_dfs):
+            assert_frame_equal(result_df, expected_df)
+
+
+def _wait(event):
+    assert event.wait(timeout=10)
+    return "slow"
+
+
+@patch.dict(os.environ, {BLUEETL_JOBLIB_JOBS: "2", BLUEETL_JOBLIB_BACKEND: "threading"})
+def test_run_tasks_unordered():
+    # the first task is completed only after the results of the other tasks have been received
+    event = threading.Event()
+    funcs = [partial(_wait, event), *(partial(int, i) for i in range(1, 4))]
+
+    result = []
+    for item in test_module.run_tasks_unordered(funcs, window=2):
+        result.append(item)
+        if len(result) == 3:
+            event.set()
+
+    assert sorted(result[:3]) == [(1, 1), (2, 2), (3, 3)]
+    assert result[3] == (0, "slow")
+
+
+def test_shared_object(tmp_path, monkeypatch):
+    monkeypatch.setattr(test_module.SharedObject, "_loaded", {})
+    obj = {"a": [1, 2, 3]}
+    path = tmp_path / "obj.pkl"
+
+    shared = test_module.SharedObject.from_object(obj, path=path)
+    assert shared.get() is obj
+    assert path.exists()
+
+    dumped = pickle.dumps(shared)
+    assert len(dumped) < path.stat().st_size + 200
+    loaded_1 = pickle.loads(dumped).get()
+    loaded_2 = pickle.loads(dumped).get()
+    assert loaded_1 == obj
+    assert loaded_1 is not obj
+    # the object is loaded only once in the same process
+    assert loaded_2 is loaded_1
+
+    # the objects used by concurrent tasks are kept in memory at the same time
+    other = test_module.SharedObject.from_object([4], path=tmp_path / "other.pkl")
+    assert pickle.loads(pickle.dumps(other)).get() == [4]
+    assert set(test_module.SharedObject._loaded) == {path, tmp_path / "other.pkl"}
+    assert pickle.loads(dumped).get() is loaded_1
+
+    # the object is released when its file is removed
+    path.unlink()
+    assert pickle.loads(pickle.dumps(other)).get() == [4]
+    assert list(test_module.SharedObject._loaded) == [tmp_path / "other.pkl"]
+
+
+def _get_pid():
+    time.sleep(0.01)
+    return os.getpid()
+
+
+@patch.dict(os.environ, {BLUEETL_JOBLIB_JOBS: "2"})
+def test_worker_pool():
+    pool = test_module.WorkerPool()
+    assert test_module.WorkerPool.active() is None
+    with pool.activate():
+        assert test_module.WorkerPool.active() is pool
+        pids_1 = set(test_module.run_tasks([_get_pid] * 4))
+        pids_2 = set(test_module.run_tasks([_get_pid] * 4))
+    assert test_module.WorkerPool.active() is None
+    # the subprocesses are reused
+    assert os.getpid() not in pids_1
+    assert pids_2.issubset(pids_1)
+
+    pool.close()
+    assert pool.closed
+    with pytest.raises(RuntimeError, match="The pool has been closed"):
+        with pool.activate():
+            pass
+
+
+def _get_loaded_paths(shared):
+    shared.get()
+    return sorted(test_module.SharedObject._loaded)
+
+
+@patch.dict(os.environ, {BLUEETL_JOBLIB_JOBS: "2"})
+def test_worker_pool_releases_shared_objects(tmp_path):
+    pool = test_module.WorkerPool()
+    with pool.activate():
+        for n in range(2):
+            path = tmp_path / f"obj{n}.pkl"
+            shared = test_module.SharedObject.from_object([n], path=path)
+            funcs = [partial(_get_loaded_paths, shared)] * 4
+            results = test_module.run_tasks(funcs)
+            # the object used by the previous call is released by the subprocesses
+            assert all(result == [path] for result in results)
+            path.unlink()
+    pool.close()
+
+
+def _is_imported(module):
+    return module in sys.modules
+
+
+@patch.dict(os.environ, {BLUEETL_JOBLIB_JOBS: "2"})
+def test_worker_pool_imports_modules():
+    # module not imported by the tasks, nor by this test module
+    module = "wave"
+    for pool, expected in [
+        (test_module.WorkerPool(), False),
+        (test_module.WorkerPool(modules=[module]), True),
+    ]:
+        with pool.activate():
+            results = test_module.run_tasks([partial(_is_imported, module)] * 4)
+        pool.close()
+        assert results == [expected] * 4
+
+
+def test_worker_pool_run_concurrently():
+    started = threading.Event()
+
+    def _first():
+        # completed only if the second function is started before the end of the first one
+        return started.wait(timeout=10)
+
+    def _second():
+        started.set()
+        return "second"
+
+    pool = test_module.WorkerPool(max_concurrent_calls=2)
+    result = list(pool.run_concurrently([_first, _second, lambda: "third"]))
+
+    assert result == [True, "second", "third"]
+
+
+def merge_filter_classic(
+    df_list: list[pd.DataFrame], groupby: list[str]
+) -> Iterator[tuple[NamedTuple, list[pd.DataFrame]]]:
+    """Yield keys and DataFrames filtered with one query per key, as done before GroupIndex."""
+    groups = test_module._groups(df_list, groupby=groupby)
+    caches = [CachedDataFrame(df) for df in df_list]
+    for _, key in groups.etl.iter():
+        yield key, [df.query(key._asdict(), ignore_unknown_keys=True) for df in caches]
+
+
+def _assert_merge_filter_equal(result, expected):
+    assert len(result) == len(expected)
+    for (result_key, result_dfs), (expected_key, expected_dfs) in zip(result, expected):
+        assert result_key == expected_key
+        assert len(result_dfs) == len(expected_dfs)
+        for result_df, expected_df in zip(result_dfs, expected_dfs):
+            assert_frame_equal(result_df, expected_df)
+
+
+def test_merge_filter_same_as_classic():
+    def func(key, df_list):
+        return key, df_list
+
+    df_list = _merge_filter_dataframes()
+    groupby = ["simulation_id", "circuit_id", "neuron_class"]
+
+    result = list(test_module.merge_filter(df_list, groupby=groupby, func=func, parallel=False))
+    expected = list(merge_filter_classic(df_list, groupby=groupby))
+
+    _assert_merge_filter_equal(result, expected)
+
+
+@pytest.mark.parametrize(
+    "groupby, expected",
+    [
+        (["a"], {(1,): slice(0, 3), (0,): slice(3, 5)}),
+        (["a", "b"], {(1, "x"): slice(0, 2), (1, "y"): slice(2, 3), (0, "x"): slice(3, 4)}),
+        (["c"], {}),
+    ],
+)
+def test_group_index(groupby, expected):
+    df = pd.DataFrame(
+        {"a": [1, 0, 1, 0, 1], "b": ["x", "x", "y", None, "x"], "v": [10, 11, 12, 13, 14]}
+    )
+    index = test_module.GroupIndex(df, groupby=groupby)
+    Key = namedtuple("Key", ["a", "b", "c"])
+
+    assert index._bounds == expected
+    for group, rows in expected.items():
+        key = Key(*group, *[None] * (3 - len(group)))
+        expected_df = df.query(" and ".join(f"{k} == @key.{k}" for k in groupby))
+        assert index.rows(key) == rows
+        assert_frame_equal(index.get(key), expected_df)
+    # missing key
+    assert index.rows(Key(2, "z", 0)) == (slice(0, 0) if expected else slice(0, len(df)))
@@ -134,6 +134,27 @@ def test_repository_extract_report(repo):
     assert len(result.df) == 16
 
 
+def test_repository_extract_report_with_partitions(repo):
+    expected = repo.report.df
+    partition_keys = repo._mapping["report"](repo).partition_keys
+    assert list(partition_keys) == repo.simulation_ids
+    # simulate a cached partition
+    partitions = {0: expected.etl.q(simulation_id=0)}
+    repo.cache_manager.load_repo_partitions.return_value = partitions
+    repo.cache_manager.load_repo_partitions.reset_mock()
+    repo.cache_manager.dump_repo.reset_mock()
+    del repo.report
+
+    result = repo.report
+
+    repo.cache_manager.load_repo_partitions.assert_called_once_with(
+        "report", partition_keys=partition_keys
+    )
+    repo.cache_manager.dump_repo.assert_called_once()
+    assert repo.cache_manager.dump_repo.call_args.kwargs["partition_keys"] == partition_keys
+    assert_frame_equal(result.df, expected)
+
+
 def test_repository_pickle_roundtrip(repo):
     dumped = pickle.dumps(repo)
     loaded = pickle.loads(dumped)
@@ -145,6 +166,30 @@ def test_repository_pickle_roundtrip(repo):
     assert loaded.names == repo.names
 
 
+def test_repository_context_pickle_roundtrip(repo):
+    context = test_module.RepositoryContext(repo)
+    dumped = pickle.dumps(context)
+    loaded = pickle.loads(dumped)
+
+    assert isinstance(loaded, test_module.RepositoryContext)
+    assert_frame_equal(loaded.simulations.to_pandas(), repo.simulations.to_pandas())
+    assert_frame_equal(loaded.neurons.df, repo.neurons.df)
+    assert_frame_equal(loaded.neuron_classes.df, repo.neuron_classes.df)
+    assert_frame_equal(loaded.windows.df, repo.windows.df)
+    assert loaded.neurons.neuron_class_offsets == repo.neurons.neuron_class_offsets
+    # the window index is built before pickling
+    assert "window_index" in loaded.windows.__dict__
+    assert loaded.windows.window_index.keys() == repo.windows.window_index.keys()
+    assert loaded.simulation_ids == repo.simulation_ids
+    # the other attributes are looked up in the wrapped repository
+    assert loaded.extraction_config == repo.extraction_config
+    assert loaded.names == repo.names
+    assert "report" not in loaded._repo.__dict__
+    assert_frame_equal(loaded.report.df, repo.report.df)
+    with pytest.raises(AttributeError, match="_missing"):
+        _ = loaded._missing
+
+
 def test_repository_apply_filter(repo):
     filtered = repo.apply_filter({})
     assert isinstance(filtered, test_module.FilteredRepository)
@@ -1,4 +1,5 @@
 import json
+import threading
 from pathlib import Path
 
 import numpy as np
@@ -278,3 +279,31 @@ def test_copy_config(tmp_path):
     assert src_sim_campaign_path.is_absolute() is False
     assert dst_sim_campaign_path.is_absolute() is True
     assert (src.parent / src_sim_campaign_path).resolve() == dst_sim_campaign_path.resolve()
+
+
+def test_unlocked_cached_property():
+    barrier = threading.Barrier(2, timeout=10)
+
+    class Obj:
+        def __init__(self, value):
+            self.value = value
+            self.calls = 0
+
+        @test_module.unlocked_cached_property
+        def prop(self):
+            self.calls += 1
+            # wait for the other instance, that would be blocked with a class level lock
+            barrier.wait()
+            return self.value
+
+    objects = [Obj(1), Obj(2)]
+    threads = [threading.Thread(target=lambda obj=obj: obj.prop) for obj in objects]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert [obj.prop for obj in objects] == [1, 2]
+    assert [obj.calls for obj in objects] == [1, 1]
+    assert [obj.__dict__["prop"] for obj in objects] == [1, 2]
+    assert isinstance(Obj.prop, test_module.cached_property)